@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'grocery_app.settings')
 
 application = get_asgi_application()
+
+# Start loading the product name autocomplete index in the background, the worker does not wait for
+# it and a failure only means the first suggestions are read from the database.
+from mysite.autocomplete import prefix_index  # noqa: E402
+
+prefix_index.warm_up()
@@ -74,6 +74,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'mysite.authentication.GroceryAuthMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -156,3 +157,158 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Catalog pagination
+# Number of products returned per page by the catalog endpoints when the client
+# does not send a page_size, and the largest page_size a client may ask for.
+
+CATALOG_PAGE_SIZE = 50
+
+CATALOG_MAX_PAGE_SIZE = 500
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='grocery'),
+    }
+}
+
+# Cache alias holding the pre-serialized public catalog pages and the catalog version,
+# and the number of seconds a cached page is kept. The catalog version, and the product text version
+# the search and autocomplete indexes of every worker are rebuilt from, are only bumped in this
+# cache, so it must be shared by all the workers (e.g. Redis or Memcached). With the per-process local memory
+# cache the catalog pages and their ETags are not cached at all and search and autocomplete do not use
+# the in-process indexes but query the database, unless CATALOG_CACHE_SINGLE_PROCESS
+# is set because a single process serves the application (e.g. runserver).
+
+CATALOG_CACHE_ALIAS = 'default'
+
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+CATALOG_CACHE_SINGLE_PROCESS = config('CATALOG_CACHE_SINGLE_PROCESS', default=False, cast=bool)
+
+
+# Product name autocomplete
+# Number of suggestions returned when the client does not send a limit, and the largest limit allowed.
+
+AUTOCOMPLETE_LIMIT = 10
+
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+
+# Largest number of products a single bulk price/stock update request may change.
+
+BULK_UPDATE_MAX_PRODUCTS = 5000
+
+
+# Largest number of items a single batch add-to-cart request may hold.
+
+CART_BATCH_MAX_ITEMS = 100
+
+
+# Cart storage
+# 'database' writes every cart change to the Order/Orderitem tables. 'cache' keeps the carts in the
+# CART_CACHE_ALIAS cache and writes them to the database only at checkout or when the 'flush_carts'
+# management command runs, which should then be scheduled periodically. Carts with unflushed
+# changes never expire, so the cache must be shared by all the workers and large enough not to
+# evict them (e.g. Redis, not the per-process local memory cache). Flushed carts expire after
+# CART_CACHE_TIMEOUT seconds and are reloaded from the database when needed.
+
+CART_STORE = config('CART_STORE', default='database')
+
+CART_CACHE_ALIAS = 'default'
+
+CART_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Changes to a cached cart are serialized with a per-user lock kept in the same cache. A request
+# waits at most CART_LOCK_WAIT seconds for it, a lock whose holder died expires after CART_LOCK_TIMEOUT seconds.
+
+CART_LOCK_WAIT = 5
+
+CART_LOCK_TIMEOUT = 10
+
+# A journal position of a dirty cart whose entry is still not written after CART_JOURNAL_ENTRY_WAIT
+# seconds is considered lost and skipped by 'flush_carts'.
+
+CART_JOURNAL_ENTRY_WAIT = 60
+
+
+# Customer order history
+# Number of product names kept in every order summary, and the default and largest page sizes.
+
+ORDER_SUMMARY_PRODUCT_NAMES = 3
+
+ORDER_HISTORY_PAGE_SIZE = 20
+
+ORDER_HISTORY_MAX_PAGE_SIZE = 100
+
+
+# Sales reports
+# Number of days covered by a sales report when the client does not send a date range.
+
+SALES_REPORT_DAYS = 90
+
+
+# Checkout
+# 'sync' places orders inside the update_order request. 'queued' hands the placement to a pool of
+# CHECKOUT_WORKERS threads per process through a queue of at most CHECKOUT_QUEUE_SIZE jobs, the
+# request returns 202 with a job id and the client polls the checkout job (waiting at most
+# CHECKOUT_MAX_WAIT seconds per poll). Job states are kept CHECKOUT_JOB_TIMEOUT seconds in the
+# CHECKOUT_CACHE_ALIAS cache, which must be shared by the web workers.
+
+CHECKOUT_MODE = config('CHECKOUT_MODE', default='sync')
+
+CHECKOUT_WORKERS = 4
+
+CHECKOUT_QUEUE_SIZE = 100
+
+CHECKOUT_CACHE_ALIAS = 'default'
+
+CHECKOUT_JOB_TIMEOUT = 60 * 60
+
+CHECKOUT_MAX_WAIT = 30
+
+CHECKOUT_POLL_INTERVAL = 0.2
+
+
+# Idempotency keys
+# Responses to requests sent with an 'Idempotency-Key' header are kept IDEMPOTENCY_KEY_TIMEOUT
+# seconds in the IDEMPOTENCY_CACHE_ALIAS cache and replayed to retries. A request still running
+# holds its key at most IDEMPOTENCY_LOCK_TIMEOUT seconds.
+
+IDEMPOTENCY_CACHE_ALIAS = 'default'
+
+IDEMPOTENCY_KEY_TIMEOUT = 60 * 60 * 24
+
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+
+# Authentication
+# Number of verified JWT tokens, with their claims, each process keeps so a token sent again is
+# not decoded and verified again. A token is kept at most until it expires.
+
+AUTH_TOKEN_CACHE_SIZE = 10000
+
+# Tokens carry the role of the user and a role version that 'update_role' bumps. The current role
+# versions are kept AUTH_ROLE_VERSION_TIMEOUT seconds in the AUTH_CACHE_ALIAS cache, which should be
+# shared by the workers: with a per-process cache other workers may trust a stale role for that long.
+
+AUTH_CACHE_ALIAS = 'default'
+
+AUTH_ROLE_VERSION_TIMEOUT = 60 * 5
+
+
+# Reference data
+# Roles, categories, countries, states and cities are loaded once per worker. Their version stamp
+# is kept in the REFDATA_CACHE_ALIAS cache, which should be shared by the workers, and a worker
+# checks it at most every REFDATA_CHECK_INTERVAL seconds (and whenever a lookup finds nothing).
+# With a cache that is not shared, a lookup that finds nothing is confirmed against the database.
+
+REFDATA_CACHE_ALIAS = 'default'
+
+REFDATA_CHECK_INTERVAL = 30
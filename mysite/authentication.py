@@ -0,0 +1,211 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.functional import SimpleLazyObject
+from rest_framework_jwt.settings import api_settings
+
+from .models import User
+from .utils.jwt_utils import verify_jwt_claims
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of the tokens already verified by this process and their claims.
+
+    Verifying a token decodes it and checks its HMAC, a client sends the same token with every
+    request so the result is kept for the next ones. At most AUTH_TOKEN_CACHE_SIZE tokens are
+    kept, the least recently used ones are dropped first. A token is only served from the cache
+    until its 'exp' claim (plus the JWT leeway), after that it goes through the full verification
+    again, which rejects it. Only valid tokens are cached.
+    """
+
+    def __init__(self):
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._tokens[token]
+                return None
+            self._tokens.move_to_end(token)
+            return claims
+
+    def set(self, token, claims):
+        expires_at = None
+        if api_settings.JWT_VERIFY_EXPIRATION and isinstance(claims.get('exp'), (int, float)):
+            leeway = api_settings.JWT_LEEWAY
+            if isinstance(leeway, timedelta):
+                leeway = leeway.total_seconds()
+            expires_at = claims['exp'] + leeway
+        with self._lock:
+            self._tokens[token] = (claims, expires_at)
+            self._tokens.move_to_end(token)
+            while len(self._tokens) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._tokens.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+
+
+verified_tokens = VerifiedTokenCache()
+
+
+def verify_token(token):
+    """
+    Verify a JWT token, answering from the cache of verified tokens when possible.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either the claims of the token
+               or an error message, like 'verify_jwt_claims'.
+    """
+    claims = verified_tokens.get(token)
+    if claims is not None:
+        return (True, claims)
+    token_info = verify_jwt_claims(token)
+    if token_info[0]:
+        verified_tokens.set(token, token_info[1])
+    return token_info
+
+
+def _auth_cache():
+    return caches[settings.AUTH_CACHE_ALIAS]
+
+
+def _role_version_key(user_id):
+    return f'auth:role_version:{user_id}'
+
+
+def add_role_claims(payload, user):
+    """
+    Add the role of a user and its version to the payload of a new token.
+    """
+    payload['role'] = user.role.name
+    payload['role_version'] = user.role_version
+    return payload
+
+
+def set_role_version(user_id, role_version):
+    """
+    Record the current role version of a user, called once a role change is committed.
+    """
+    _auth_cache().set(_role_version_key(user_id), role_version, settings.AUTH_ROLE_VERSION_TIMEOUT)
+
+
+def get_role_version(user_id):
+    """
+    Get the current role version of a user from the cache, reading it from the database only
+    when it is not cached.
+
+    Returns:
+        int or None: The role version, or None if the user does not exist.
+    """
+    cache = _auth_cache()
+    role_version = cache.get(_role_version_key(user_id))
+    if role_version is None:
+        role_version = User.objects.filter(id=user_id).values_list('role_version', flat=True).first()
+        if role_version is not None:
+            cache.add(_role_version_key(user_id), role_version, settings.AUTH_ROLE_VERSION_TIMEOUT)
+    return role_version
+
+
+def get_grocery_user(request):
+    """
+    Load the user of an authenticated request with its role, once per request.
+
+    Returns:
+        User or None: The user, or None if the request has no valid token or the user does not exist.
+    """
+    if not hasattr(request, '_cached_grocery_user'):
+        user = None
+        if request.grocery_user_id is not None:
+            user = User.objects.select_related('role').filter(id=request.grocery_user_id).first()
+        request._cached_grocery_user = user
+    return request._cached_grocery_user
+
+
+def authenticate_request(request):
+    """
+    Verify the Bearer token of a request and attach the result to it.
+
+    Sets:
+        request.grocery_auth: A tuple containing a boolean indicating success and either the
+                              claims of the token or the error message to answer with.
+        request.grocery_user_id: The ID of the user from the token, or None.
+        request.grocery_user: The user with its role, loaded from the database on first use.
+
+    Does nothing if the request was already authenticated, e.g. by the middleware.
+    """
+    if hasattr(request, 'grocery_auth'):
+        return
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        request.grocery_auth = verify_token(auth_header.split(' ')[1])
+    else:
+        # No token provided in the header
+        request.grocery_auth = (False, "Unauthorized")
+    request.grocery_user_id = request.grocery_auth[1]['user_id'] if request.grocery_auth[0] else None
+    request.grocery_user = SimpleLazyObject(lambda: get_grocery_user(request))
+
+
+class GroceryAuthMiddleware:
+    """
+    Authenticate the Bearer token of every request once, before the views run.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        authenticate_request(request)
+        return self.get_response(request)
+
+
+def token_required(view):
+    """
+    Answer 401 to requests without a valid Bearer token, the view reads the user from
+    'request.grocery_user_id' or 'request.grocery_user'.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        authenticate_request(request)
+        if not request.grocery_auth[0]:
+            return JsonResponse({"message": request.grocery_auth[1]}, status=401)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def has_role(request, role_name):
+    """
+    Check whether the user of an authenticated request has a role.
+
+    The role is read from the verified claims of the token, only its version is checked against
+    the cached current version of the user, so a token issued before 'update_role' changed the
+    role is not trusted any more. Tokens issued without role claims fall back to loading the user.
+    """
+    claims = request.grocery_auth[1] if request.grocery_auth[0] else None
+    if claims is None:
+        return False
+    if 'role' in claims and 'role_version' in claims:
+        return claims['role'] == role_name and claims['role_version'] == get_role_version(claims['user_id'])
+    user = get_grocery_user(request)
+    return user is not None and user.role.name == role_name
+
+
+def is_admin(request):
+    """
+    Check whether the user of an authenticated request has the admin role.
+    """
+    return has_role(request, 'admin')
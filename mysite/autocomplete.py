@@ -0,0 +1,205 @@
+import logging
+import threading
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models.functions import Lower
+
+from .models import Product
+from .catalog_cache import (
+    catalog_cache_enabled, get_product_text_version, get_product_text_changes_key, bump_product_text_version
+)
+from .utils.pagination import get_page_size
+
+
+logger = logging.getLogger(__name__)
+
+# A worker further behind than this many product text versions reloads the index instead of catching up.
+MAX_CATCH_UP_VERSIONS = 1000
+
+
+class PrefixIndex:
+    """
+    In-memory type-ahead index over product names.
+
+    Names are kept as (lowercase name, product id, name) entries in a sorted list, so all the names
+    starting with a prefix are one contiguous run found with a binary search. Every worker starts
+    loading the index in the background when it starts. Afterwards it is kept current without
+    reading the products again: every change of the product text version stores the names added,
+    renamed or deleted with it in the shared catalog cache, and a lookup first applies the changes
+    of the versions it has not seen yet, which costs one cache read. Only a worker that can not
+    catch up (too far behind, changes expired from the cache) reloads the whole index, in the
+    background, while its lookups keep being answered from the previous content.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._entry_by_id = {}
+        self._version = None
+        # Held for the in-memory changes and lookups only, never while the database is read.
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def build(self):
+        """
+        Load the names of all the live products and swap them in as the content of the index.
+
+        The version is read before the products, so the changes committed while the index is built
+        are applied again by the next lookup. Adding and removing a name are idempotent.
+        """
+        version = get_product_text_version()
+        entries = []
+        live_products = Product.objects.filter(datedeleted__isnull=True).values_list('id', 'name')
+        for product_id, name in live_products.iterator(chunk_size=5000):
+            entries.append((name.lower(), product_id, name))
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._entry_by_id = {entry[1]: entry for entry in entries}
+            self._version = version
+
+    def rebuild_in_background(self):
+        """
+        Build the index in a background thread, unless a build is already running.
+        """
+        if not self._build_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.build()
+            except Exception:
+                logger.exception("Could not load the product name autocomplete index.")
+            finally:
+                self._build_lock.release()
+                connections.close_all()
+
+        threading.Thread(target=run, name='autocomplete-index', daemon=True).start()
+
+    def warm_up(self):
+        """
+        Start loading the index when the worker starts, so the first lookups do not have to.
+        """
+        if catalog_cache_enabled():
+            self.rebuild_in_background()
+
+    def catch_up(self):
+        """
+        Apply the name changes of the product text versions this index has not seen yet.
+        """
+        version = get_product_text_version()
+        start_version = self._version
+        if start_version is None or start_version == version:
+            return
+        if not 0 < version - start_version <= MAX_CATCH_UP_VERSIONS:
+            self.rebuild_in_background()
+            return
+
+        keys = [get_product_text_changes_key(number) for number in range(start_version + 1, version + 1)]
+        changes = caches[settings.CATALOG_CACHE_ALIAS].get_many(keys)
+        if len(changes) != len(keys):
+            # Some changes expired from the cache or are not written yet.
+            self.rebuild_in_background()
+            return
+
+        with self._lock:
+            # Another thread caught up or swapped in a new build in the meantime.
+            if self._version != start_version:
+                return
+            for key in keys:
+                for product_id, name in changes[key]:
+                    self._remove(product_id)
+                    if name is not None:
+                        entry = (name.lower(), product_id, name)
+                        insort(self._entries, entry)
+                        self._entry_by_id[product_id] = entry
+            self._version = version
+
+    def _remove(self, product_id):
+        entry = self._entry_by_id.pop(product_id, None)
+        if entry is not None:
+            position = bisect_left(self._entries, entry)
+            del self._entries[position]
+
+    def complete(self, prefix, limit):
+        """
+        Get the products whose name starts with the prefix, case-insensitively.
+
+        Returns:
+            list or None: At most 'limit' products in alphabetical order of name, or None while
+                          the index of this worker has not been loaded yet.
+        """
+        if self._version is None:
+            self.rebuild_in_background()
+            return None
+        self.catch_up()
+        prefix = prefix.lower()
+        suggestions = []
+        with self._lock:
+            entries = self._entries
+            position = bisect_left(entries, (prefix,))
+            while position < len(entries) and len(suggestions) < limit:
+                normalized_name, product_id, name = entries[position]
+                if not normalized_name.startswith(prefix):
+                    break
+                suggestions.append({"id": product_id, "name": name})
+                position += 1
+        return suggestions
+
+
+prefix_index = PrefixIndex()
+
+
+def index_product_names(name_changes):
+    """
+    Publish added, renamed or deleted product names once the current transaction commits.
+
+    Args:
+        name_changes (list): (product ID, name) pairs, with a None name for deleted products.
+
+    The product text version is bumped with the changes, the index of this worker applies them
+    straight away and the other workers on their next lookup.
+    """
+    def publish():
+        bump_product_text_version(name_changes)
+        prefix_index.catch_up()
+
+    transaction.on_commit(publish)
+
+
+def _complete_from_database(prefix, limit):
+    products = Product.objects.filter(datedeleted__isnull=True, name__istartswith=prefix).order_by(Lower('name'), 'id')
+    return list(products.values('id', 'name')[:limit])
+
+
+def get_autocomplete_suggestions(prefix, limit=None):
+    """
+    Get autocomplete suggestions for a partially typed product name.
+
+    Args:
+        prefix (str): The characters typed so far.
+        limit (str or int, optional): The largest number of suggestions wanted.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either the list of suggestions
+               or an error message.
+
+    The suggestions come from the in-memory index. They are read from the database instead while
+    the index of the worker is loading, and when the catalog cache is not shared by the workers,
+    since the index of a worker would then never see the changes made by the others.
+    """
+    prefix = (prefix or '').strip()
+    if not prefix:
+        return (False, "Please enter a search term.")
+
+    try:
+        limit = get_page_size(limit, settings.AUTOCOMPLETE_LIMIT, settings.AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        return (False, "limit must be a positive integer.")
+
+    suggestions = prefix_index.complete(prefix, limit) if catalog_cache_enabled() else None
+    if suggestions is None:
+        suggestions = _complete_from_database(prefix, limit)
+    return (True, suggestions)
@@ -0,0 +1,308 @@
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, Orderitem
+from .order_history import refresh_order_summaries
+
+
+JOURNAL_KEY = 'cart:journal'
+JOURNAL_FLUSHED_KEY = 'cart:journal:flushed'
+
+logger = logging.getLogger(__name__)
+
+
+def cart_store_enabled():
+    """
+    Check whether carts are kept in the cache (write-behind) instead of being written to the database.
+    """
+    return settings.CART_STORE == 'cache'
+
+
+def _cart_cache():
+    return caches[settings.CART_CACHE_ALIAS]
+
+
+def _cart_key(user_id):
+    return f'cart:{user_id}'
+
+
+class CartBusy(Exception):
+    """
+    Raised when the cart of a user stays locked by another request for longer than CART_LOCK_WAIT seconds.
+    """
+
+
+@contextmanager
+def _cart_lock(user_id):
+    """
+    Hold the lock of a user's cached cart, so concurrent changes to it are applied one after the other.
+
+    The lock is a key added to the cart cache with 'cache.add', which only one request can do. It
+    expires after CART_LOCK_TIMEOUT seconds in case its holder died, and is only released by its holder.
+    """
+    cache = _cart_cache()
+    key = f'{_cart_key(user_id)}:lock'
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + settings.CART_LOCK_WAIT
+    while not cache.add(key, token, settings.CART_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise CartBusy("Your cart is being changed by another request, please try again.")
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def _journal(user_id):
+    """
+    Append a user to the journal of dirty carts that 'flush_dirty_carts' persists.
+    """
+    cache = _cart_cache()
+    cache.add(JOURNAL_KEY, 0, timeout=None)
+    position = cache.incr(JOURNAL_KEY)
+    cache.set(f'{JOURNAL_KEY}:{position}', user_id, timeout=None)
+
+
+def _load_cart(user_id):
+    """
+    Build the cached copy of a user's cart from the 'In Cart' order in the database, in one query.
+    """
+    order_id = None
+    items = {}
+    for order_item in Orderitem.objects.filter(order__user_id=user_id, order__status='In Cart').values(
+        'id', 'order_id', 'product_id', 'product__name', 'qty', 'price', 'total_amount'
+    ):
+        order_id = order_item['order_id']
+        items[order_item['product_id']] = {
+            "orderitem_id": order_item['id'],
+            "product_name": order_item['product__name'],
+            "qty": order_item['qty'],
+            "price": order_item['price'],
+            "total_amount": order_item['total_amount'],
+        }
+    return {"order_id": order_id, "items": items, "version": 0, "flushed_version": 0}
+
+
+def _save_cart(user_id, cart):
+    # A cart holding changes that are not in the database yet must not expire.
+    dirty = cart["version"] != cart["flushed_version"]
+    timeout = None if dirty else settings.CART_CACHE_TIMEOUT
+    _cart_cache().set(_cart_key(user_id), cart, timeout)
+
+
+def get_cart(user_id):
+    """
+    Get the cached cart of a user, loading it from the database on a miss.
+
+    Returns:
+        dict: The cart, holding the 'order_id' it is persisted to (None until it is) and its
+              'items' by product ID, each with the 'orderitem_id', 'product_name', 'qty', 'price'
+              and 'total_amount'.
+    """
+    cache = _cart_cache()
+    cart = cache.get(_cart_key(user_id))
+    if cart is None:
+        cart = _load_cart(user_id)
+        # Only added, a cart changed by a concurrent request in the meantime is not overwritten.
+        if not cache.add(_cart_key(user_id), cart, settings.CART_CACHE_TIMEOUT):
+            cart = cache.get(_cart_key(user_id)) or cart
+    return cart
+
+
+def set_cart_items(user_id, items):
+    """
+    Add products to the cached cart of a user, or replace their quantities.
+
+    Args:
+        user_id (int): The ID of the user.
+        items (list): Dictionaries holding the 'product_id', 'product_name', 'qty', 'price' and
+                      'total_amount' of the items.
+
+    Returns:
+        dict: The updated cart.
+
+    Raises:
+        CartBusy: If another request kept the cart locked for too long.
+
+    Nothing is written to the database. The cart is read, changed and saved under the user's cart
+    lock, so two concurrent adds (two tabs, a retry) both end up in it. The first change to a clean
+    cart adds the user to the journal of dirty carts that 'flush_dirty_carts' persists.
+    """
+    with _cart_lock(user_id):
+        cart = get_cart(user_id)
+        if cart["version"] == cart["flushed_version"]:
+            _journal(user_id)
+
+        for item in items:
+            cart_item = cart["items"].setdefault(item['product_id'], {"orderitem_id": None})
+            cart_item.update(
+                product_name=item['product_name'], qty=item['qty'], price=item['price'], total_amount=item['total_amount']
+            )
+        cart["version"] += 1
+        _save_cart(user_id, cart)
+    return cart
+
+
+def get_cart_total(cart):
+    return sum((item["total_amount"] for item in cart["items"].values()), Decimal('0'))
+
+
+@transaction.atomic
+def persist_cart(user_id):
+    """
+    Write the cached cart of a user to its 'In Cart' order, creating the order if needed.
+
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        int or None: The ID of the 'In Cart' order, or None if the user has no cart.
+
+    The whole cart is written, items and total, so persisting twice is harmless. Does nothing when
+    carts are kept in the database or the cached cart has no pending changes.
+    """
+    if not cart_store_enabled():
+        return None
+    cart = _cart_cache().get(_cart_key(user_id))
+    if cart is None or cart["version"] == cart["flushed_version"]:
+        return cart["order_id"] if cart else None
+
+    order = Order.objects.select_for_update().filter(user_id=user_id, status='In Cart').first()
+    if order is None:
+        if not cart["items"]:
+            return None
+        order = Order.objects.create(user_id=user_id, total_amount=0, status='In Cart')
+
+    existing_items = {order_item.product_id: order_item for order_item in Orderitem.objects.filter(order=order)}
+    now = timezone.now()
+    items_to_update = []
+    items_to_create = []
+    for product_id, item in cart["items"].items():
+        order_item = existing_items.pop(product_id, None)
+        if order_item is None:
+            items_to_create.append(Orderitem(
+                order=order,
+                product_id=product_id,
+                qty=item["qty"],
+                price=item["price"],
+                total_amount=item["total_amount"]
+            ))
+        elif (order_item.qty, order_item.price, order_item.total_amount) != (item["qty"], item["price"], item["total_amount"]):
+            order_item.qty = item["qty"]
+            order_item.price = item["price"]
+            order_item.total_amount = item["total_amount"]
+            order_item.dateupdate = now
+            items_to_update.append(order_item)
+
+    if existing_items:
+        Orderitem.objects.filter(id__in=[order_item.id for order_item in existing_items.values()]).delete()
+    if items_to_update:
+        Orderitem.objects.bulk_update(items_to_update, ['qty', 'price', 'total_amount', 'dateupdate'])
+    if items_to_create:
+        Orderitem.objects.bulk_create(items_to_create)
+    Order.objects.filter(id=order.id).update(total_amount=get_cart_total(cart), dateupdate=now)
+    refresh_order_summaries([order.id])
+
+    flushed_version = cart["version"]
+    orderitem_ids = {order_item.product_id: order_item.id for order_item in items_to_create}
+
+    def mark_flushed():
+        try:
+            with _cart_lock(user_id):
+                # The cart may have changed while it was written, only what was written is marked flushed.
+                current = _cart_cache().get(_cart_key(user_id)) or cart
+                current["order_id"] = order.id
+                for product_id, orderitem_id in orderitem_ids.items():
+                    if product_id in current["items"]:
+                        current["items"][product_id]["orderitem_id"] = orderitem_id
+                current["flushed_version"] = max(current["flushed_version"], flushed_version)
+                _save_cart(user_id, current)
+                still_dirty = current["version"] != current["flushed_version"]
+        except CartBusy:
+            still_dirty = True
+        # Changes made while the cart was written did not journal it again, as it was already
+        # dirty, and the flush drops the journal entry it read. Journal it for the next flush.
+        if still_dirty:
+            _journal(user_id)
+
+    transaction.on_commit(mark_flushed)
+    return order.id
+
+
+def discard_cart(user_id):
+    """
+    Drop the cached cart of a user once the current transaction commits, e.g. after its order left 'In Cart'.
+    """
+    if cart_store_enabled():
+        transaction.on_commit(lambda: _cart_cache().delete(_cart_key(user_id)))
+
+
+def _journal_entry_lost(position):
+    """
+    Check whether a journal position without entry has been missing for more than CART_JOURNAL_ENTRY_WAIT seconds.
+
+    '_journal' takes a position and writes its entry right after, a position seen without entry is
+    normally being written. One still missing after the wait was lost (its writer died, the entry
+    was evicted) and is skipped so that it does not hold the journal back forever.
+    """
+    cache = _cart_cache()
+    key = f'{JOURNAL_KEY}:{position}:missing'
+    cache.add(key, time.time(), timeout=None)
+    missing_since = cache.get(key)
+    return missing_since is not None and time.time() - missing_since > settings.CART_JOURNAL_ENTRY_WAIT
+
+
+def flush_dirty_carts():
+    """
+    Persist every cached cart changed since the last flush.
+
+    Returns:
+        int: The number of carts written to the database.
+
+    The carts to write are read from the journal that 'set_cart_items' appends to, so a flush never
+    has to scan the cache. The journal is only consumed up to the first position whose entry is not
+    written yet. A cart that can not be written is logged and journaled again for the next flush,
+    the other carts are still written. Meant to be run periodically, see the 'flush_carts' management command.
+    """
+    cache = _cart_cache()
+    last_position = cache.get(JOURNAL_KEY, 0)
+    flushed_position = cache.get(JOURNAL_FLUSHED_KEY, 0)
+    if last_position <= flushed_position:
+        return 0
+
+    entries = cache.get_many([f'{JOURNAL_KEY}:{position}' for position in range(flushed_position + 1, last_position + 1)])
+    consumed_position = flushed_position
+    for position in range(flushed_position + 1, last_position + 1):
+        if f'{JOURNAL_KEY}:{position}' not in entries and not _journal_entry_lost(position):
+            break
+        consumed_position = position
+    if consumed_position == flushed_position:
+        return 0
+
+    consumed_keys = [f'{JOURNAL_KEY}:{position}' for position in range(flushed_position + 1, consumed_position + 1)]
+    user_ids = {entries[key] for key in consumed_keys if key in entries}
+    flushed = 0
+    failed_user_ids = []
+    for user_id in user_ids:
+        try:
+            persist_cart(user_id)
+            flushed += 1
+        except Exception:
+            logger.exception("Could not write the cached cart of user %s to the database.", user_id)
+            failed_user_ids.append(user_id)
+
+    cache.set(JOURNAL_FLUSHED_KEY, consumed_position, timeout=None)
+    cache.delete_many(consumed_keys + [f'{key}:missing' for key in consumed_keys])
+    for user_id in failed_user_ids:
+        _journal(user_id)
+    return flushed
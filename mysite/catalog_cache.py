@@ -0,0 +1,236 @@
+import gzip
+import hashlib
+import json
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+
+VERSION_KEY = 'catalog:version'
+HITS_KEY = 'catalog:hits'
+MISSES_KEY = 'catalog:misses'
+MODIFIED_KEY = 'catalog:modified'
+TEXT_VERSION_KEY = 'catalog:text_version'
+TEXT_CHANGES_KEY = 'catalog:text_changes'
+
+
+def _catalog_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def catalog_cache_enabled():
+    """
+    Check whether the catalog pages and their validators can be served from the catalog cache.
+
+    The catalog version is bumped in the CATALOG_CACHE_ALIAS cache, so the cache must be shared by
+    all the workers: with a per-process local memory cache only the worker that changed a product
+    would see the new version and every other one would keep serving its stale pages. Catalog
+    caching is therefore turned off for the local memory and dummy backends, unless
+    CATALOG_CACHE_SINGLE_PROCESS says that a single process serves the application.
+    """
+    cache = _catalog_cache()
+    if isinstance(cache, DummyCache):
+        return False
+    return settings.CATALOG_CACHE_SINGLE_PROCESS or not isinstance(cache, LocMemCache)
+
+
+def _increment(cache, key, initial):
+    """
+    Increment a counter in the cache, creating it with the given initial value if it was evicted.
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, timeout=None)
+        return cache.incr(key)
+
+
+def _fresh_version():
+    # A counter that was evicted restarts from the current time in milliseconds, so it can not
+    # fall back onto a version some still cached pages were stored under.
+    return int(time.time() * 1000)
+
+
+def get_catalog_version():
+    """
+    Get the current catalog version.
+
+    Returns:
+        int: The version the cached catalog pages are stored under. It changes every time a
+             product, its categories or its stock change.
+    """
+    cache = _catalog_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _fresh_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Move the catalog to a new version so that none of the already cached pages are served again.
+    """
+    cache = _catalog_cache()
+    cache.set(MODIFIED_KEY, int(time.time()), timeout=None)
+    return _increment(cache, VERSION_KEY, _fresh_version())
+
+
+def get_catalog_last_modified():
+    """
+    Get when the catalog version was last bumped.
+
+    Returns:
+        datetime: The time of the last change to the catalog. If it is not known anymore (the cache
+                  was flushed) the current time is recorded, which only makes clients fetch again.
+    """
+    cache = _catalog_cache()
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        cache.add(MODIFIED_KEY, int(time.time()), timeout=None)
+        modified = cache.get(MODIFIED_KEY)
+    return datetime.fromtimestamp(modified, tz=dt_timezone.utc)
+
+
+def invalidate_catalog():
+    """
+    Bump the catalog version once the current transaction commits.
+
+    Bumping after the commit guarantees that a page built right after the bump reads the new data.
+    Outside of a transaction the version is bumped straight away.
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+def get_product_text_version():
+    """
+    Get the current version of the product names and descriptions.
+
+    Returns:
+        int: The version the in-process search and autocomplete indexes are built from. Unlike the
+             catalog version it does not move on price and stock changes, only when a product is
+             added or deleted or its name or description changes.
+    """
+    cache = _catalog_cache()
+    version = cache.get(TEXT_VERSION_KEY)
+    if version is None:
+        cache.add(TEXT_VERSION_KEY, _fresh_version(), timeout=None)
+        version = cache.get(TEXT_VERSION_KEY)
+    return version
+
+
+def get_product_text_changes_key(version):
+    return f'{TEXT_CHANGES_KEY}:{version}'
+
+
+def bump_product_text_version(name_changes=()):
+    """
+    Move the product names and descriptions to a new version so that every worker updates its indexes.
+
+    Args:
+        name_changes (iterable, optional): (product ID, name) pairs of the products added or
+                                           renamed, with a None name for deleted products.
+
+    The name changes are stored with the new version, so the autocomplete index of a worker can
+    catch up by applying them instead of reading all the products again.
+    """
+    cache = _catalog_cache()
+    version = _increment(cache, TEXT_VERSION_KEY, _fresh_version())
+    cache.set(get_product_text_changes_key(version), list(name_changes), settings.CATALOG_CACHE_TIMEOUT)
+    return version
+
+
+def invalidate_product_text():
+    """
+    Bump the product text version once the current transaction commits, like 'invalidate_catalog'.
+    For changes to the product names use 'autocomplete.index_product_names', which bumps it as well.
+    """
+    transaction.on_commit(bump_product_text_version)
+
+
+def get_catalog_page(key_parts, build_response_data):
+    """
+    Get a pre-serialized catalog page, building and caching it on a miss.
+
+    Args:
+        key_parts (tuple): The request parameters that select the page, e.g. cursor and page size.
+        build_response_data (callable): Called on a miss, returns a tuple of a boolean indicating
+                                        success and either the response data or an error message.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either the cached page or an
+               error message. The cached page is a dictionary holding the JSON body ('body'), its
+               gzipped copy ('gzip') and whether it was served from the cache ('hit').
+
+    Pages are stored under the current catalog version, so a bumped version makes every older
+    page unreachable and they simply expire from the cache backend. Error responses are not cached.
+    When 'catalog_cache_enabled' is False every page is built again.
+    """
+    if not catalog_cache_enabled():
+        response_data = build_response_data()
+        if not response_data[0]:
+            return response_data
+        body = json.dumps(response_data[1], cls=DjangoJSONEncoder).encode('utf-8')
+        return (True, {"body": body, "gzip": gzip.compress(body), "hit": False})
+
+    cache = _catalog_cache()
+    raw_key = json.dumps([get_catalog_version(), *key_parts])
+    key = 'catalog:page:' + hashlib.md5(raw_key.encode('utf-8')).hexdigest()
+
+    page = cache.get(key)
+    if page is not None:
+        _increment(cache, HITS_KEY, 0)
+        return (True, dict(page, hit=True))
+
+    _increment(cache, MISSES_KEY, 0)
+    response_data = build_response_data()
+    if not response_data[0]:
+        return response_data
+
+    body = json.dumps(response_data[1], cls=DjangoJSONEncoder).encode('utf-8')
+    page = {"body": body, "gzip": gzip.compress(body)}
+    cache.set(key, page, settings.CATALOG_CACHE_TIMEOUT)
+    return (True, dict(page, hit=False))
+
+
+def catalog_page_response(request, page):
+    """
+    Build the HTTP response for a cached catalog page, sending the gzipped body when the client accepts it.
+    """
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(page["gzip"], content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(page["body"], content_type='application/json')
+    response['X-Cache'] = 'HIT' if page["hit"] else 'MISS'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def get_catalog_cache_stats():
+    """
+    Get the hit and miss counters of the catalog cache.
+
+    Returns:
+        dict: Whether the catalog cache is enabled, the current catalog version, the number of
+              hits and misses and the hit ratio.
+    """
+    cache = _catalog_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        "enabled": catalog_cache_enabled(),
+        "version": get_catalog_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / lookups, 4) if lookups else None,
+    }
@@ -0,0 +1,133 @@
+import math
+import queue
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+
+from .orders import update_orders
+
+
+def queued_checkout_enabled():
+    """
+    Check whether orders are placed by the checkout workers instead of inside the request.
+    """
+    return settings.CHECKOUT_MODE == 'queued'
+
+
+def _job_cache():
+    return caches[settings.CHECKOUT_CACHE_ALIAS]
+
+
+def _job_key(job_id):
+    return f'checkout:job:{job_id}'
+
+
+def _save_job(job):
+    _job_cache().set(_job_key(job["id"]), job, settings.CHECKOUT_JOB_TIMEOUT)
+
+
+class CheckoutQueue:
+    """
+    Bounded queue of order placements run by a fixed pool of worker threads.
+
+    At most CHECKOUT_WORKERS placements run at the same time whatever the number of requests, so
+    the number of transactions competing for the product and order locks is capped and the HTTP
+    workers return as soon as the job is queued. The queue holds at most CHECKOUT_QUEUE_SIZE
+    jobs, a full queue is reported to the client instead of growing without bound. Job states are
+    kept in the CHECKOUT_CACHE_ALIAS cache so any web worker sharing the cache can answer a poll.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=settings.CHECKOUT_QUEUE_SIZE)
+                for number in range(settings.CHECKOUT_WORKERS):
+                    worker = threading.Thread(target=self._work, name=f'checkout-worker-{number}', daemon=True)
+                    worker.start()
+        return self._queue
+
+    def submit(self, user_id, order_id, address_id=None, use_default_address=False):
+        """
+        Queue the placement of an order.
+
+        Returns:
+            tuple: A tuple containing a boolean indicating success and either the queued job or
+                   an error message when the queue is full.
+        """
+        job = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "order_id": order_id,
+            "status": "queued",
+            "message": None,
+            "queued_at": time.time(),
+        }
+        _save_job(job)
+        try:
+            self._start().put_nowait((job, address_id, use_default_address))
+        except queue.Full:
+            _job_cache().delete(_job_key(job["id"]))
+            return (False, "Too many orders are being placed right now. Please try again in a few seconds.")
+        return (True, job)
+
+    def _work(self):
+        while True:
+            job, address_id, use_default_address = self._queue.get()
+            try:
+                job["status"] = "running"
+                _save_job(job)
+                close_old_connections()
+                placed = update_orders(job["order_id"], "place order", address_id, use_default_address)
+                job["status"] = "succeeded" if placed[0] else "failed"
+                job["message"] = placed[1]
+            except Exception as e:
+                job["status"] = "failed"
+                job["message"] = f"Error updating order: {e}"
+            finally:
+                close_old_connections()
+                job["finished_at"] = time.time()
+                _save_job(job)
+                self._queue.task_done()
+
+
+checkout_queue = CheckoutQueue()
+
+
+def get_checkout_job(user_id, job_id, wait=None):
+    """
+    Get the state of a queued order placement, optionally waiting for it to finish.
+
+    Args:
+        user_id (int): The ID of the user asking, only the user who placed the order can see the job.
+        job_id (str): The ID returned when the job was queued.
+        wait (str or int, optional): Number of seconds to wait for the job to finish (long polling),
+                                     capped at CHECKOUT_MAX_WAIT.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either the job or an error message.
+               The job's 'status' is 'queued', 'running', 'succeeded' or 'failed', and its 'message'
+               holds the result of the placement once it finished.
+    """
+    try:
+        wait = float(wait or 0)
+    except (TypeError, ValueError):
+        wait = None
+    if wait is None or not math.isfinite(wait):
+        return (False, "wait must be a number of seconds.")
+
+    deadline = time.monotonic() + min(max(wait, 0), settings.CHECKOUT_MAX_WAIT)
+    while True:
+        job = _job_cache().get(_job_key(job_id))
+        if job is None or job["user_id"] != user_id:
+            return (False, "Checkout job not found.")
+        if job["status"] in ("succeeded", "failed") or time.monotonic() >= deadline:
+            return (True, job)
+        time.sleep(settings.CHECKOUT_POLL_INTERVAL)
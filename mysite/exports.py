@@ -0,0 +1,66 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from .models import Product, Order, Orderitem
+from .utils.dates import parse_date_filter
+
+
+# For every export: the model, the exported fields and the (created, updated) date fields 'since' filters on.
+EXPORTS = {
+    "products": (
+        Product,
+        ['id', 'name', 'description', 'price', 'stock_count', 'createdby', 'updateby', 'deletedby',
+         'datecreated', 'dateupdated', 'datedeleted'],
+        ('datecreated', 'dateupdated'),
+    ),
+    "orders": (
+        Order,
+        ['id', 'user_id', 'address_id', 'total_amount', 'order_date', 'status',
+         'datecreate', 'dateupdate', 'datedeleted'],
+        ('datecreate', 'dateupdate'),
+    ),
+    "orderitems": (
+        Orderitem,
+        ['id', 'order_id', 'product_id', 'qty', 'price', 'total_amount',
+         'datecreate', 'dateupdate', 'datedeleted'],
+        ('datecreate', 'dateupdate'),
+    ),
+}
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def get_export_rows(kind, since=None):
+    """
+    Get a lazy NDJSON export of the products, orders or order items.
+
+    Args:
+        kind (str): 'products', 'orders' or 'orderitems'.
+        since (str, optional): Only export rows created or updated at or after this date/datetime.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either an iterator of NDJSON
+               lines (bytes) or an error message.
+
+    Rows are read in id order through 'iterator()', which uses a server-side cursor on PostgreSQL,
+    so only one chunk of rows is in memory at a time whatever the size of the table.
+    """
+    if kind not in EXPORTS:
+        return (False, f"Unknown export '{kind}', choose one of: {', '.join(EXPORTS)}.")
+    model, fields, (created_field, updated_field) = EXPORTS[kind]
+
+    queryset = model.objects.order_by('id')
+    if since:
+        try:
+            since = parse_date_filter(since, 'since')
+        except ValueError as e:
+            return (False, str(e))
+        queryset = queryset.filter(Q(**{f"{created_field}__gte": since}) | Q(**{f"{updated_field}__gte": since}))
+
+    def lines():
+        for row in queryset.values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield (json.dumps(row, cls=DjangoJSONEncoder) + "\n").encode('utf-8')
+
+    return (True, lines())
@@ -0,0 +1,87 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+from .authentication import authenticate_request
+
+
+IN_PROGRESS = 'in progress'
+COMPLETED = 'completed'
+
+
+def _idempotency_cache():
+    return caches[settings.IDEMPOTENCY_CACHE_ALIAS]
+
+
+def _store_key(user_id, request, idempotency_key):
+    # Keys are scoped to the user and the endpoint, so two clients can not collide on a key.
+    raw_key = f'{user_id}:{request.method}:{request.path}:{idempotency_key}'
+    return 'idempotency:' + hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+
+def _replay(stored):
+    response = HttpResponse(stored["content"], status=stored["status"], content_type=stored["content_type"])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Make a mutating view safe to retry with an 'Idempotency-Key' header.
+
+    The first request with a key runs the view and stores its response for
+    IDEMPOTENCY_KEY_TIMEOUT seconds. A retry with the same key and body is answered from the
+    store without running the view again, a retry while the first request is still running gets
+    409 and the same key sent with a different body gets 422. Requests without the header, or
+    without a valid token, run the view as usual. Server errors are not stored so they can be
+    retried.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            return view(request, *args, **kwargs)
+        authenticate_request(request)
+        if request.grocery_user_id is None:
+            return view(request, *args, **kwargs)
+        if len(idempotency_key) > 255:
+            return JsonResponse({"message": "Idempotency-Key must be at most 255 characters."}, status=400)
+
+        cache = _idempotency_cache()
+        key = _store_key(request.grocery_user_id, request, idempotency_key)
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+
+        if not cache.add(key, {"state": IN_PROGRESS, "fingerprint": fingerprint}, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            stored = cache.get(key)
+            if stored is not None:
+                if stored["fingerprint"] != fingerprint:
+                    return JsonResponse({"message": "This Idempotency-Key was already used with a different request."}, status=422)
+                if stored["state"] == COMPLETED:
+                    return _replay(stored)
+                return JsonResponse({"message": "A request with this Idempotency-Key is still being processed."}, status=409)
+            # The stored entry expired in between, take the key over unless another request just did.
+            if not cache.add(key, {"state": IN_PROGRESS, "fingerprint": fingerprint}, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                return JsonResponse({"message": "A request with this Idempotency-Key is still being processed."}, status=409)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            cache.delete(key)
+            raise
+
+        if response.status_code >= 500 or response.streaming:
+            cache.delete(key)
+        else:
+            cache.set(key, {
+                "state": COMPLETED,
+                "fingerprint": fingerprint,
+                "status": response.status_code,
+                "content": response.content,
+                "content_type": response['Content-Type'],
+            }, settings.IDEMPOTENCY_KEY_TIMEOUT)
+        return response
+
+    return wrapper
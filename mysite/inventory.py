@@ -0,0 +1,174 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum, Max, F, Q
+
+from .models import Product, Inventorymovement
+from .utils.pagination import encode_cursor, decode_cursor, cursor_datetime, cursor_int, get_page_size
+
+
+def record_movements(movements):
+    """
+    Append movements to the inventory ledger with a single insert.
+
+    Args:
+        movements (list): Unsaved Inventorymovement instances. The caller changes the stock counts
+                          of the products in the same transaction.
+    """
+    if movements:
+        Inventorymovement.objects.bulk_create(movements, batch_size=1000)
+
+
+def change_stock(product_id, quantity, kind, user_id=None, order_id=None):
+    """
+    Add a signed quantity to the stock of a product and record the movement.
+
+    Args:
+        product_id (int): The ID of the product.
+        quantity (int or Decimal): The change, negative to take stock out.
+        kind (str): The kind of movement, see Inventorymovement.KIND.
+        user_id (int, optional): The ID of the user making the change.
+        order_id (int, optional): The ID of the order causing the change.
+
+    Returns:
+        bool: False if the product does not exist or does not have enough stock for a negative change.
+
+    The stock is changed with one 'UPDATE ... SET stock_count = stock_count + quantity', guarded by
+    'stock_count >= -quantity' when stock is taken out, so concurrent changes never overwrite each
+    other and the balance can not go negative. The product row is never read.
+    """
+    if not quantity:
+        return Product.objects.filter(id=product_id).exists()
+    products = Product.objects.filter(id=product_id)
+    if quantity < 0:
+        products = products.filter(stock_count__gte=-quantity)
+    if not products.update(stock_count=F('stock_count') + quantity):
+        return False
+    Inventorymovement.objects.create(
+        product_id=product_id, kind=kind, quantity=quantity, order_id=order_id, createdby=user_id
+    )
+    return True
+
+
+def set_stock_count(product_id, stock_count, user_id=None):
+    """
+    Set the stock of a product to an absolute count, e.g. after a stocktake, and record the difference as an adjustment.
+
+    Returns:
+        bool: False if the product does not exist.
+
+    The product row is locked while the difference is computed so a concurrent sale can not be lost.
+    """
+    current = (
+        Product.objects.select_for_update().filter(id=product_id).values_list('stock_count', flat=True).first()
+    )
+    if current is None:
+        return False
+    return change_stock(product_id, stock_count - current, 'adjustment', user_id=user_id)
+
+
+@transaction.atomic
+def compact_inventory_ledger(before):
+    """
+    Fold the movements older than a date into one snapshot movement per product.
+
+    Args:
+        before (datetime): The movements created before this date are compacted.
+
+    Returns:
+        tuple: The number of movements removed and of snapshots written.
+
+    The snapshots carry the cutoff as their date, so the balances and the history after the
+    cutoff are unchanged, only the detail of the older movements is dropped.
+    """
+    old_movements = Inventorymovement.objects.filter(datecreate__lt=before)
+    # Movements inserted while compacting are left alone.
+    last_id = old_movements.aggregate(last_id=Max('id'))['last_id']
+    if last_id is None:
+        return (0, 0)
+    old_movements = old_movements.filter(id__lte=last_id)
+
+    balances = list(old_movements.values('product_id').annotate(quantity=Sum('quantity')).order_by('product_id'))
+    removed, _ = old_movements.delete()
+    record_movements([
+        Inventorymovement(product_id=balance['product_id'], kind='snapshot', quantity=balance['quantity'], datecreate=before)
+        for balance in balances
+    ])
+    return (removed, len(balances))
+
+
+def audit_inventory():
+    """
+    Compare the stock count of every product with the balance of its ledger.
+
+    Returns:
+        list: A dictionary for every product whose 'stock_count' differs from its 'ledger_balance'.
+    """
+    ledger_balances = dict(
+        Inventorymovement.objects.values('product_id').annotate(balance=Sum('quantity')).order_by()
+        .values_list('product_id', 'balance')
+    )
+    mismatches = []
+    for product_id, stock_count in Product.objects.order_by('id').values_list('id', 'stock_count').iterator(chunk_size=2000):
+        ledger_balance = ledger_balances.get(product_id, 0)
+        if ledger_balance != stock_count:
+            mismatches.append({"product_id": product_id, "stock_count": stock_count, "ledger_balance": ledger_balance})
+    return mismatches
+
+
+def get_stock_history(product_id, cursor=None, page_size=None):
+    """
+    Get one page of the stock movements of a product, newest first.
+
+    Args:
+        product_id (int): The ID of the product.
+        cursor (str, optional): The opaque cursor returned with the previous page.
+        page_size (str or int, optional): The number of movements wanted on the page.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either a dictionary with the
+               current 'stock_count', the 'movements' on the page and the 'next_cursor', or an
+               error message. Every movement holds the stock balance right after it.
+
+    The balances are computed walking back from the current stock count, the balance reached at
+    the end of a page is carried in the cursor of the next one.
+    """
+    try:
+        stock_count = Product.objects.filter(id=product_id).values_list('stock_count', flat=True).first()
+        if stock_count is None:
+            return (False, "Product not found.")
+
+        page_size = get_page_size(page_size, settings.CATALOG_PAGE_SIZE, settings.CATALOG_MAX_PAGE_SIZE)
+
+        movements = Inventorymovement.objects.filter(product_id=product_id).order_by('-datecreate', '-id')
+        balance = Decimal(stock_count).quantize(Decimal('0.01'))
+        if cursor:
+            position = decode_cursor(cursor)
+            last_datecreate = cursor_datetime(position.get('datecreate'))
+            last_id = cursor_int(position.get('id'))
+            try:
+                balance = Decimal(position.get('balance'))
+            except (TypeError, InvalidOperation):
+                raise ValueError("Invalid cursor.")
+            movements = movements.filter(Q(datecreate__lt=last_datecreate) | Q(datecreate=last_datecreate, id__lt=last_id))
+
+        rows = list(movements.values('id', 'kind', 'quantity', 'order_id', 'createdby', 'datecreate')[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        for row in rows:
+            row['balance_after'] = balance
+            balance -= row['quantity']
+
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor({'datecreate': rows[-1]['datecreate'], 'id': rows[-1]['id'], 'balance': str(balance)})
+
+        return (True, {"stock_count": stock_count, "movements": rows, "next_cursor": next_cursor})
+
+    except ValueError as e:
+        return (False, str(e))
+
+    except Exception as e:
+        return (False, f"Error retrieving stock history: {e}")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from mysite.inventory import audit_inventory
+
+
+class Command(BaseCommand):
+    help = "Check that the stock count of every product equals the balance of its inventory ledger."
+
+    def handle(self, *args, **options):
+        mismatches = audit_inventory()
+        for mismatch in mismatches:
+            self.stdout.write(
+                f"Product {mismatch['product_id']}: stock count {mismatch['stock_count']}, ledger balance {mismatch['ledger_balance']}"
+            )
+
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f"{len(mismatches)} product(s) do not match their ledger."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Every stock count matches its ledger."))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from mysite.inventory import compact_inventory_ledger
+
+
+class Command(BaseCommand):
+    help = "Fold the inventory movements older than a number of days into one snapshot movement per product."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help="Keep the detail of the movements of the last DAYS days.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError("--days can not be negative.")
+        before = timezone.now() - timedelta(days=options['days'])
+        removed, snapshots = compact_inventory_ledger(before)
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted {removed} movements older than {before:%Y-%m-%d %H:%M} into {snapshots} snapshots."
+        ))
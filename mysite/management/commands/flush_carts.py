@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from mysite.cart_store import cart_store_enabled, flush_dirty_carts
+
+
+class Command(BaseCommand):
+    help = "Write the carts changed in the cache cart store since the last flush to the database."
+
+    def handle(self, *args, **options):
+        if not cart_store_enabled():
+            self.stdout.write("Carts are stored in the database, there is nothing to flush.")
+            return
+        flushed = flush_dirty_carts()
+        self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} cart(s)."))
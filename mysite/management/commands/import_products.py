@@ -0,0 +1,121 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from mysite.models import User
+from mysite.products import bulk_create_products
+
+
+def read_csv_rows(stream):
+    """
+    Yield (row number, product data) pairs from a CSV file with a header row.
+
+    Expected columns: name, description, price, stock_count and category_ids, where
+    category_ids holds one or more ids separated by '|' or ';'.
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield (reader.line_num, row)
+
+
+def read_jsonl_rows(stream):
+    """
+    Yield (row number, product data) pairs from a file holding one JSON object per line.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            row = {"_error": f"Invalid JSON: {e}"}
+        if not isinstance(row, dict):
+            row = {"_error": "Each line must be a JSON object."}
+        yield (line_number, row)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import products from a CSV or JSONL file. The file is streamed and written in chunks, "
+        "each chunk in its own transaction, so memory stays flat whatever the file size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, '-' reads from standard input.")
+        parser.add_argument('--user', type=int, required=True, help="ID of the admin the products are created by.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format, guessed from the file extension by default.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Number of rows validated and written per transaction.")
+        parser.add_argument('--errors', help="Write the rejected rows to this file instead of standard error.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.select_related('role').get(id=options['user'])
+        except User.DoesNotExist:
+            raise CommandError("User does not exist.")
+        if user.role.name != 'admin':
+            raise CommandError("You do not have permission to create products.")
+
+        if options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size must be a positive integer.")
+
+        path = options['path']
+        input_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv')
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        error_stream = open(options['errors'], 'w', encoding='utf-8') if options['errors'] else self.stderr
+
+        rows = read_jsonl_rows(stream) if input_format == 'jsonl' else read_csv_rows(stream)
+
+        created_total = 0
+        error_total = 0
+        started = time.monotonic()
+        try:
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == options['chunk_size']:
+                    created, errors = self.import_chunk(user.id, chunk, error_stream)
+                    created_total += created
+                    error_total += errors
+                    self.report_progress(created_total, error_total, started)
+                    chunk = []
+            if chunk:
+                created, errors = self.import_chunk(user.id, chunk, error_stream)
+                created_total += created
+                error_total += errors
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if options['errors']:
+                error_stream.close()
+
+        elapsed = time.monotonic() - started
+        rate = created_total / elapsed if elapsed else created_total
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created_total} products, rejected {error_total} rows in {elapsed:.1f}s ({rate:.0f} rows/s)."
+        ))
+
+    def import_chunk(self, user_id, chunk, error_stream):
+        # Rows the reader could not parse are rejected without reaching the database.
+        errors = [(row_number, row["_error"]) for row_number, row in chunk if "_error" in row]
+        valid_rows = [(row_number, row) for row_number, row in chunk if "_error" not in row]
+
+        try:
+            created, chunk_errors = bulk_create_products(user_id, valid_rows)
+        except DatabaseError as e:
+            # The chunk's transaction was rolled back, its rows are reported and the import goes on.
+            created = 0
+            chunk_errors = [(row_number, f"Chunk rejected by the database: {e}") for row_number, _ in valid_rows]
+        errors.extend(chunk_errors)
+        for row_number, message in sorted(errors):
+            error_stream.write(f"Row {row_number}: {message}\n")
+        return (created, len(errors))
+
+    def report_progress(self, created_total, error_total, started):
+        elapsed = time.monotonic() - started
+        rate = created_total / elapsed if elapsed else created_total
+        self.stdout.write(f"{created_total} imported, {error_total} rejected, {rate:.0f} rows/s")
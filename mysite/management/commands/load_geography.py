@@ -0,0 +1,82 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mysite.users import bulk_load_geography
+
+
+REQUIRED_COLUMNS = ('country', 'state', 'city')
+
+
+class Command(BaseCommand):
+    help = (
+        "Load countries, states and cities from a CSV file with a country, state and city column "
+        "(other columns such as pincode are ignored). The file is streamed and written in chunks, "
+        "each chunk in its own transaction, and the rows that already exist are skipped, so the "
+        "same file can be loaded again, e.g. after an interrupted run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file to load, '-' reads from standard input.")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Number of rows written per transaction.")
+        parser.add_argument('--errors', help="Write the rejected rows to this file instead of standard error.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size must be a positive integer.")
+
+        path = options['path']
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        error_stream = open(options['errors'], 'w', encoding='utf-8') if options['errors'] else self.stderr
+
+        # Country and state IDs resolved by a chunk are reused by the next ones.
+        known_ids = {}
+        totals = {"rows": 0, "countries": 0, "states": 0, "cities": 0, "rejected": 0}
+        started = time.monotonic()
+        try:
+            reader = csv.DictReader(stream)
+            columns = {column.strip().lower() for column in reader.fieldnames or []}
+            missing_columns = [column for column in REQUIRED_COLUMNS if column not in columns]
+            if missing_columns:
+                raise CommandError(f"Missing column(s): {', '.join(missing_columns)}.")
+
+            chunk = []
+            for row in reader:
+                row = {(key or '').strip().lower(): value for key, value in row.items()}
+                chunk.append((reader.line_num, row))
+                if len(chunk) == options['chunk_size']:
+                    self.load_chunk(chunk, known_ids, totals, error_stream)
+                    self.report_progress(totals, started)
+                    chunk = []
+            if chunk:
+                self.load_chunk(chunk, known_ids, totals, error_stream)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if options['errors']:
+                error_stream.close()
+
+        elapsed = time.monotonic() - started
+        rate = totals["rows"] / elapsed if elapsed else totals["rows"]
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {totals['rows']} rows in {elapsed:.1f}s ({rate:.0f} rows/s): added {totals['countries']} "
+            f"countries, {totals['states']} states and {totals['cities']} cities, rejected {totals['rejected']} rows."
+        ))
+
+    def load_chunk(self, chunk, known_ids, totals, error_stream):
+        inserted, errors = bulk_load_geography(chunk, known_ids)
+        for row_number, message in errors:
+            error_stream.write(f"Row {row_number}: {message}\n")
+        totals["rows"] += len(chunk)
+        totals["rejected"] += len(errors)
+        for level, count in inserted.items():
+            totals[level] += count
+
+    def report_progress(self, totals, started):
+        elapsed = time.monotonic() - started
+        rate = totals["rows"] / elapsed if elapsed else totals["rows"]
+        self.stdout.write(
+            f"{totals['rows']} rows read, {totals['cities']} cities added, {totals['rejected']} rejected, {rate:.0f} rows/s"
+        )
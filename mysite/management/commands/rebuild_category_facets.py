@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from mysite.products import rebuild_category_facets
+
+
+class Command(BaseCommand):
+    help = "Recount the live products of every category into the category facet table."
+
+    def handle(self, *args, **options):
+        recounted = rebuild_category_facets()
+        self.stdout.write(self.style.SUCCESS(f"Recounted {recounted} categories."))
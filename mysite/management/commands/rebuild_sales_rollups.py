@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from mysite.sales import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollups by product, by category and in total from the orders."
+
+    def handle(self, *args, **options):
+        written = rebuild_sales_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written['product']} product, {written['category']} category and {written['day']} daily rows."
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from mysite.models import Order
+from mysite.orders import reconcile_order_totals
+
+
+class Command(BaseCommand):
+    help = "Check that every order total equals the sum of its item totals, and optionally repair them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--status', action='append', choices=[status for status, _ in Order.STATUS],
+            help="Only check orders with this status. Can be given more than once."
+        )
+        parser.add_argument('--fix', action='store_true', help="Overwrite the wrong totals with the sum of the item totals.")
+
+    def handle(self, *args, **options):
+        # Every order is fixed in its own transaction, the run as a whole is not one.
+        mismatches = reconcile_order_totals(options['status'], fix=options['fix'])
+
+        for mismatch in mismatches:
+            self.stdout.write(
+                f"Order {mismatch['order_id']}: recorded {mismatch['recorded']}, items add up to {mismatch['actual']}"
+            )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("All order totals are correct."))
+        elif options['fix']:
+            fixed = sum(1 for mismatch in mismatches if mismatch['fixed'])
+            self.stdout.write(self.style.SUCCESS(f"Fixed {fixed} order total(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(mismatches)} order total(s) are wrong, run with --fix to repair them."))
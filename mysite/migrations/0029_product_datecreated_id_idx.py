@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mysite', '0028_alter_product_stock_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['datecreated', 'id'], name='product_datecreated_id_idx'),
+        ),
+    ]
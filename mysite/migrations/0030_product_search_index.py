@@ -0,0 +1,34 @@
+# Generated by Django 4.2.5 on 2026-10-18 03:05
+
+from django.db import migrations
+
+
+# Must stay identical to mysite.search.SEARCH_DOCUMENT_SQL.
+SEARCH_DOCUMENT_SQL = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    # The full-text index only exists on PostgreSQL, other databases search the in-process index.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS product_search_idx ON mysite_product USING GIN (({SEARCH_DOCUMENT_SQL}))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS product_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mysite', '0029_product_datecreated_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
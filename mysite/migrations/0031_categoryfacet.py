@@ -0,0 +1,39 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_category_facets(apps, schema_editor):
+    Category = apps.get_model('mysite', 'Category')
+    Categoryfacet = apps.get_model('mysite', 'Categoryfacet')
+    Productcategory = apps.get_model('mysite', 'Productcategory')
+
+    counts = dict(
+        Productcategory.objects.filter(datedeleted__isnull=True, product__datedeleted__isnull=True)
+        .values_list('category_id')
+        .annotate(product_count=models.Count('product_id', distinct=True))
+    )
+    Categoryfacet.objects.bulk_create([
+        Categoryfacet(category_id=category_id, product_count=counts.get(category_id, 0))
+        for category_id in Category.objects.values_list('id', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mysite', '0030_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Categoryfacet',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, primary_key=True, serialize=False, to='mysite.category')),
+                ('product_count', models.IntegerField(default=0)),
+                ('dateupdate', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_category_facets, migrations.RunPython.noop),
+    ]
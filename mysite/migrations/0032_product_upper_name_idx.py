@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:34
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mysite', '0031_categoryfacet'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='product_upper_name_idx'),
+        ),
+    ]
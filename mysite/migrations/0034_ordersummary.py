@@ -0,0 +1,71 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_order_summaries(apps, schema_editor):
+    Order = apps.get_model('mysite', 'Order')
+    Orderitem = apps.get_model('mysite', 'Orderitem')
+    Ordersummary = apps.get_model('mysite', 'Ordersummary')
+
+    orders = Order.objects.annotate(item_count=models.Count('orderitem')).order_by('id').values(
+        'id', 'user_id', 'status', 'order_date', 'datecreate', 'total_amount', 'item_count'
+    )
+    chunk = []
+    for order in orders.iterator(chunk_size=1000):
+        chunk.append(order)
+        if len(chunk) == 1000:
+            _create_summaries(Orderitem, Ordersummary, chunk)
+            chunk = []
+    if chunk:
+        _create_summaries(Orderitem, Ordersummary, chunk)
+
+
+def _create_summaries(Orderitem, Ordersummary, orders):
+    product_names = {}
+    items = Orderitem.objects.filter(order_id__in=[order['id'] for order in orders]).order_by('order_id', 'id')
+    for order_id, name in items.values_list('order_id', 'product__name'):
+        names = product_names.setdefault(order_id, [])
+        if len(names) < settings.ORDER_SUMMARY_PRODUCT_NAMES:
+            names.append(name)
+    Ordersummary.objects.bulk_create([
+        Ordersummary(
+            order_id=order['id'],
+            user_id=order['user_id'],
+            status=order['status'],
+            order_date=order['order_date'] or order['datecreate'],
+            total_amount=order['total_amount'],
+            item_count=order['item_count'],
+            product_names=product_names.get(order['id'], []),
+        )
+        for order in orders
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mysite', '0033_orderitem_product_order_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ordersummary',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, primary_key=True, serialize=False, to='mysite.order')),
+                ('status', models.CharField(choices=[('In Cart', 'In Cart'), ('Placed', 'Placed'), ('Cancelled', 'Cancelled'), ('Delivered', 'Delivered')], max_length=20)),
+                ('order_date', models.DateTimeField()),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=80, null=True)),
+                ('item_count', models.IntegerField(default=0)),
+                ('product_names', models.JSONField(default=list)),
+                ('dateupdate', models.DateTimeField(null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'order_date', 'order'], name='ordersummary_user_date_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_order_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mysite', '0034_ordersummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Dailysales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('units', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('dateupdate', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Productsales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('dateupdate', models.DateTimeField(null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='mysite.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Categorysales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('dateupdate', models.DateTimeField(null=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='mysite.category')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='productsales',
+            constraint=models.UniqueConstraint(fields=('day', 'product'), name='productsales_day_product_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='categorysales',
+            constraint=models.UniqueConstraint(fields=('day', 'category'), name='categorysales_day_category_uniq'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_opening_balances(apps, schema_editor):
+    # Every product starts the ledger with a snapshot of its current stock.
+    Product = apps.get_model('mysite', 'Product')
+    Inventorymovement = apps.get_model('mysite', 'Inventorymovement')
+
+    now = django.utils.timezone.now()
+    movements = []
+    for product_id, stock_count in Product.objects.order_by('id').values_list('id', 'stock_count').iterator(chunk_size=2000):
+        movements.append(Inventorymovement(product_id=product_id, kind='snapshot', quantity=stock_count, datecreate=now))
+        if len(movements) == 2000:
+            Inventorymovement.objects.bulk_create(movements)
+            movements = []
+    Inventorymovement.objects.bulk_create(movements)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mysite', '0035_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Inventorymovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('receipt', 'Receipt'), ('sale', 'Sale'), ('cancellation_restock', 'Cancellation restock'), ('adjustment', 'Adjustment'), ('snapshot', 'Snapshot')], max_length=20)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('createdby', models.IntegerField(blank=True, null=True)),
+                ('datecreate', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='mysite.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='mysite.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'datecreate', 'id'], name='inventory_product_date_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_opening_balances, migrations.RunPython.noop),
+    ]
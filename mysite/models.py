@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
@@ -30,6 +31,14 @@ class Product(models.Model):
     dateupdated = models.DateTimeField(null=True,blank=True)
     datedeleted = models.DateTimeField(null=True,blank=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the catalog walks products in (datecreated, id) order.
+            models.Index(fields=['datecreated', 'id'], name='product_datecreated_id_idx'),
+            # Case-insensitive name lookups ('name__iexact' on PostgreSQL compares UPPER(name)).
+            models.Index(Upper('name'), name='product_upper_name_idx'),
+        ]
+
     def clean(self):
         if self.stock_count < 0:
             raise ValidationError(
@@ -75,6 +84,8 @@ class User(AbstractBaseUser): #abstractuser, abstractbaseuser
     print("phone number",phone_no)
     #hashed_password = models.CharField(max_length=500)
     role = models.ForeignKey('Role', on_delete = models.PROTECT)
+    # Bumped every time the role changes, tokens carrying an older version lose their role.
+    role_version = models.PositiveIntegerField(default=0)
     datecreate=  models.DateTimeField(auto_now_add=True)
     dateupdate = models.DateTimeField(null=True, blank =True)
     datedeleted = models.DateTimeField(null=True, blank = True)
@@ -156,6 +167,17 @@ class Productcategory(models.Model):
 
 
 
+class Categoryfacet(models.Model):
+    # Number of live products linked to the category. Kept current by the product service
+    # functions so browsing facets never has to count the Productcategory table.
+    category = models.OneToOneField('Category', primary_key=True, on_delete=models.PROTECT)
+    product_count = models.IntegerField(default=0)
+    dateupdate = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.category_id}: {self.product_count}"
+
+
 class Address(models.Model):
     user = models.ForeignKey('User', on_delete = models.PROTECT)
     country = models.ForeignKey('Country', on_delete= models.PROTECT)
@@ -189,6 +211,29 @@ class Order(models.Model):
     def __str__(self):
         return str(self.id)
 
+class Ordersummary(models.Model):
+    # Denormalized copy of an order for the customer order history, kept current by the order
+    # service functions so a page of history is a single indexed query. 'order_date' is when the
+    # order was placed, or when it was created while it is still in the cart.
+    order = models.OneToOneField('Order', primary_key=True, on_delete=models.PROTECT)
+    user = models.ForeignKey('User', on_delete=models.PROTECT)
+    status = models.CharField(max_length=20, choices=Order.STATUS)
+    order_date = models.DateTimeField()
+    total_amount = models.DecimalField(max_digits=80, decimal_places=2, null=True)
+    item_count = models.IntegerField(default=0)
+    product_names = models.JSONField(default=list)
+    dateupdate = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # The history of a user is paged through in (order_date, order_id) order.
+            models.Index(fields=['user', 'order_date', 'order'], name='ordersummary_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.order_id)
+
+
 class Orderitem(models.Model):
     order = models.ForeignKey('Order',on_delete=models.PROTECT)
     product = models.ForeignKey('Product',on_delete= models.PROTECT)
@@ -199,5 +244,91 @@ class Orderitem(models.Model):
     dateupdate = models.DateTimeField(blank=True, null=True)
     datedeleted = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # The orders of a product are paged through in order_id order.
+            models.Index(fields=['product', 'order'], name='orderitem_product_order_idx'),
+        ]
+
     def __str__(self):
         return str(self.id)
+
+
+# Daily sales rollups of the placed and delivered orders, by product, by category and in total.
+# 'day' is the day the order was placed. Kept current by the order service functions and
+# rebuilt from the orders by the 'rebuild_sales_rollups' management command.
+
+class Productsales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey('Product', on_delete=models.PROTECT)
+    units = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    dateupdate = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='productsales_day_product_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id}"
+
+
+class Categorysales(models.Model):
+    day = models.DateField()
+    category = models.ForeignKey('Category', on_delete=models.PROTECT)
+    units = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    dateupdate = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='categorysales_day_category_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category_id}"
+
+
+class Dailysales(models.Model):
+    day = models.DateField(unique=True)
+    units = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    dateupdate = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return str(self.day)
+
+
+class Inventorymovement(models.Model):
+    # Append-only ledger of the stock changes of the products. Product.stock_count is the
+    # materialized balance of a product's movements and is changed together with every insert.
+    KIND = [
+    ("receipt", "Receipt"),
+    ("sale", "Sale"),
+    ("cancellation_restock", "Cancellation restock"),
+    ("adjustment", "Adjustment"),
+    ("snapshot", "Snapshot")]
+    product = models.ForeignKey('Product', on_delete=models.PROTECT)
+    kind = models.CharField(max_length=20, choices=KIND)
+    # Signed change of the stock, negative for sales.
+    quantity = models.DecimalField(max_digits=20, decimal_places=2)
+    order = models.ForeignKey('Order', null=True, blank=True, on_delete=models.PROTECT)
+    createdby = models.IntegerField(null=True, blank=True)
+    # Not auto_now_add, the snapshots written by the ledger compaction carry the compaction cutoff.
+    datecreate = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # The history of a product is read newest first in (datecreate, id) order.
+            models.Index(fields=['product', 'datecreate', 'id'], name='inventory_product_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.kind} {self.quantity}"
@@ -0,0 +1,125 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Order, Orderitem, Ordersummary
+from .utils.pagination import encode_cursor, decode_cursor, cursor_datetime, cursor_int, get_page_size
+
+
+def refresh_order_summaries(order_ids):
+    """
+    Rebuild the summaries of some orders from the orders and their items.
+
+    Args:
+        order_ids (list): The IDs of the orders.
+
+    Used when items are added to an order, when a whole cart is written and to repair totals.
+    Reads the orders with two queries and writes all the summaries with a single upsert.
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    orders = Order.objects.filter(id__in=order_ids).annotate(item_count=Count('orderitem')).values(
+        'id', 'user_id', 'status', 'order_date', 'datecreate', 'total_amount', 'item_count'
+    )
+
+    product_names = {}
+    items = Orderitem.objects.filter(order_id__in=order_ids).order_by('order_id', 'id')
+    for order_id, name in items.values_list('order_id', 'product__name'):
+        names = product_names.setdefault(order_id, [])
+        if len(names) < settings.ORDER_SUMMARY_PRODUCT_NAMES:
+            names.append(name)
+
+    now = timezone.now()
+    Ordersummary.objects.bulk_create(
+        [
+            Ordersummary(
+                order_id=order['id'],
+                user_id=order['user_id'],
+                status=order['status'],
+                order_date=order['order_date'] or order['datecreate'],
+                total_amount=order['total_amount'],
+                item_count=order['item_count'],
+                product_names=product_names.get(order['id'], []),
+                dateupdate=now,
+            )
+            for order in orders
+        ],
+        update_conflicts=True,
+        unique_fields=['order'],
+        update_fields=['status', 'order_date', 'total_amount', 'item_count', 'product_names', 'dateupdate'],
+    )
+
+
+def apply_summary_total_change(order_id, change):
+    """
+    Add the change of an item total to the total of the order's summary, like 'apply_order_total_change'.
+    """
+    if change:
+        Ordersummary.objects.filter(order_id=order_id).update(
+            total_amount=Coalesce(F('total_amount'), Value(Decimal('0'))) + change,
+            dateupdate=timezone.now()
+        )
+
+
+def update_summary_status(order):
+    """
+    Copy the status and the placing date of an order to its summary after it was placed or cancelled.
+
+    Args:
+        order (Order): The order, already saved.
+    """
+    changes = {"status": order.status, "dateupdate": timezone.now()}
+    if order.order_date:
+        changes["order_date"] = order.order_date
+    Ordersummary.objects.filter(order_id=order.id).update(**changes)
+
+
+def get_order_history(user_id, cursor=None, page_size=None):
+    """
+    Get one page of a user's orders, newest first.
+
+    Args:
+        user_id (int): The ID of the user.
+        cursor (str, optional): The opaque cursor returned with the previous page.
+        page_size (str or int, optional): The number of orders wanted on the page.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either a dictionary with the
+               'orders' on the page and the 'next_cursor' (None on the last page), or an error message.
+
+    Every page is a single range scan of the (user, order_date, order) index of the summary table,
+    whatever the number of orders the user has and however deep the client has paged.
+    """
+    try:
+        page_size = get_page_size(page_size, settings.ORDER_HISTORY_PAGE_SIZE, settings.ORDER_HISTORY_MAX_PAGE_SIZE)
+
+        summaries = Ordersummary.objects.filter(user_id=user_id).order_by('-order_date', '-order_id')
+        if cursor:
+            position = decode_cursor(cursor)
+            last_order_date = cursor_datetime(position.get('order_date'))
+            last_order_id = cursor_int(position.get('order_id'))
+            summaries = summaries.filter(
+                Q(order_date__lt=last_order_date) | Q(order_date=last_order_date, order_id__lt=last_order_id)
+            )
+
+        orders = list(
+            summaries.values('order_id', 'status', 'order_date', 'total_amount', 'item_count', 'product_names')
+            [:page_size + 1]
+        )
+
+        next_cursor = None
+        if len(orders) > page_size:
+            orders = orders[:page_size]
+            next_cursor = encode_cursor({'order_date': orders[-1]['order_date'], 'order_id': orders[-1]['order_id']})
+
+        return (True, {"orders": orders, "next_cursor": next_cursor})
+
+    except ValueError as e:
+        return (False, str(e))
+
+    except Exception as e:
+        return (False, f"Error retrieving orders: {e}")
@@ -1,8 +1,16 @@
 from  .models import *
-from decimal import Decimal  # Import Decimal for precision
+from decimal import Decimal, ROUND_HALF_UP  # Import Decimal for precision
 from django.db import transaction
-from django.db.models import Sum 
-from django.core.exceptions import PermissionDenied
+from django.db.models import Sum, F, Q, Value, DecimalField
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from .catalog_cache import invalidate_catalog
+from .cart_store import cart_store_enabled, get_cart, set_cart_items, discard_cart, CartBusy
+from .order_history import refresh_order_summaries, apply_summary_total_change, update_summary_status
+from .sales import record_order_sales
+from .inventory import record_movements, set_stock_count
+from .utils.pagination import encode_cursor, decode_cursor, cursor_int, get_page_size
+from .utils.dates import parse_date_filter
 
 
 def calculate_total_amount(qty, price):
@@ -16,12 +24,31 @@ def calculate_total_amount(qty, price):
     Returns:
         Decimal: The total amount calculated by multiplying the quantity and unit price.
 
-    This function takes the quantity and unit price of an item, converts them to floating-point numbers,
-    and calculates the total amount by multiplying them. The result is returned as a Decimal for precision.
+    This function takes the quantity and unit price of an item, converts them to Decimals and
+    multiplies them. The result is rounded to cents, exactly like the stored 'total_amount', so that
+    adding and subtracting item totals keeps the order total exact.
     """
-    qty_float = float(qty)
-    price_float = float(price)
-    return Decimal(qty_float * price_float)
+    qty_decimal = Decimal(str(qty))
+    price_decimal = Decimal(str(price))
+    return (qty_decimal * price_decimal).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def apply_order_total_change(order_id, change):
+    """
+    Add the change of an item total to the total of its order and of the order's summary.
+
+    Args:
+        order_id (int): The ID of the order.
+        change (Decimal): The new item total minus the old one (the whole total for a new item).
+
+    The total is updated with a single UPDATE using an F() expression, so a cart change costs the
+    same whatever the number of items in the cart. 'reconcile_order_totals' verifies the result.
+    """
+    if change:
+        Order.objects.filter(id=order_id).update(
+            total_amount=Coalesce(F('total_amount'), Value(Decimal('0'))) + change
+        )
+        apply_summary_total_change(order_id, change)
 
 @transaction.atomic
 def create_order_item(order_id, product_id, qty, price):
@@ -98,14 +125,35 @@ def fetch_stock_count_price(product_id):
     except Product.DoesNotExist:
         return None    
 
+def order_qty_error(qty):
+    """
+    Check a quantity against the 'qty' column of the order items, which holds values below 100.
+
+    Returns:
+        str or None: The error message, or None if the quantity fits.
+    """
+    qty_field = Orderitem._meta.get_field('qty')
+    max_qty = 10 ** (qty_field.max_digits - qty_field.decimal_places)
+    if qty >= max_qty:
+        return f"Entered quantity must be less than {max_qty}."
+    return None
+
+
 @transaction.atomic
 def add_or_update_order_item(user_id, product_id, qty):
     try:
         if qty <= 0:
             error_message = "Entered quantity cannot be negative or 0."
             return (False, error_message)        
-        # Check if there is an existing 'In Cart' order for the user
-        order = Order.objects.filter(user_id=user_id, status='In Cart').first()
+        # Checked for both cart stores, a cached cart is only written to the database later.
+        if order_qty_error(qty):
+            return (False, order_qty_error(qty))
+        if cart_store_enabled():
+            return add_to_cached_cart(user_id, product_id, qty)
+        # Check if there is an existing 'In Cart' order for the user. It is locked like in
+        # 'add_items_to_cart', so concurrent updates of the same item compute their total change
+        # from the item total left by the previous one.
+        order = Order.objects.select_for_update().filter(user_id=user_id, status='In Cart').first()
 
         if order:
             # Check if the product is already in the cart
@@ -116,15 +164,18 @@ def add_or_update_order_item(user_id, product_id, qty):
                 stock_count = stock_price_data['stock_count']
 
                 if float(stock_count) >= float(qty):
+                    # Like the batch and cached cart paths, a quantity update reprices the item at
+                    # the current product price, the stored price and the total always agree.
                     price = stock_price_data['price']
                     total_amount = calculate_total_amount(qty, price)
+                    total_change = total_amount - order_item.total_amount
 
                     order_item.qty = qty
+                    order_item.price = price
                     order_item.total_amount = total_amount
                     order_item.save()
 
-                    order.total_amount = Orderitem.objects.filter(order=order).aggregate(Sum('total_amount'))['total_amount__sum']
-                    order.save()
+                    apply_order_total_change(order.id, total_change)
                     message = f"Order updated, product qty updated: {qty} and orderitem_id is {order_item.id}"
                     return (True, message)
                 else:
@@ -145,8 +196,9 @@ def add_or_update_order_item(user_id, product_id, qty):
                     )
 
                     if order_item:
-                        order.total_amount = Orderitem.objects.filter(order=order).aggregate(Sum('total_amount'))['total_amount__sum']
-                        order.save()
+                        apply_order_total_change(order.id, order_item.total_amount)
+                        # The item count and product names of the summary changed as well.
+                        refresh_order_summaries([order.id])
                         message = f"Order updated, product added: {product_id} and orderitem_id is {order_item.id}"
                         return (True, message)
                     else:
@@ -179,8 +231,8 @@ def add_or_update_order_item(user_id, product_id, qty):
                     )
 
                     if order_item:
-                        order.total_amount = Orderitem.objects.filter(order=order).aggregate(Sum('total_amount'))['total_amount__sum']
-                        order.save()
+                        # The order was created with the total of its only item.
+                        refresh_order_summaries([order.id])
                         message = f"Order is created with order_id as: {order.id} and order item created with id as {order_item.id}"
                         return (True, message)
                     else:
@@ -197,6 +249,248 @@ def add_or_update_order_item(user_id, product_id, qty):
         return (False, error_message)                
 
 
+def add_to_cached_cart(user_id, product_id, qty):
+    """
+    Add a product to the user's cart, or update its quantity, in the cache backed cart store.
+
+    Args:
+        user_id (int): The ID of the user.
+        product_id (int): The ID of the product.
+        qty (int or float): The quantity wanted.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success or failure and a message.
+
+    Only the stock and price of the product are read, the cart is written to the database at
+    checkout or by the periodic flush (see 'cart_store'). The caller checks the quantity with
+    'order_qty_error', deleted products are rejected like in 'add_items_to_cart'.
+    """
+    product = Product.objects.filter(id=product_id, datedeleted__isnull=True).values('name', 'stock_count', 'price').first()
+    if product is None:
+        return (False, "Product does not exist")
+    if float(product['stock_count']) < float(qty):
+        return (False, "Selected product quantity out of stock. Select a lesser quantity.")
+
+    qty = Decimal(str(qty))
+    price = product['price']
+    in_cart = product_id in get_cart(user_id)["items"]
+    try:
+        set_cart_items(user_id, [{
+            "product_id": product_id,
+            "product_name": product['name'],
+            "qty": qty,
+            "price": price,
+            "total_amount": calculate_total_amount(qty, price),
+        }])
+    except CartBusy as e:
+        return (False, str(e))
+    if in_cart:
+        return (True, f"Cart updated, product qty updated: {qty}")
+    return (True, f"Cart updated, product added: {product_id}")
+
+
+
+@transaction.atomic
+def add_items_to_cart(user_id, items):
+    """
+    Add many products to the user's cart, or update their quantities, in one go.
+
+    Args:
+        user_id (int): The ID of the user.
+        items (list): Dictionaries holding a 'product_id' and the 'qty' wanted.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either a dictionary with the
+               cart's order ID and the per-item results, or an error message. Every result holds
+               the 'product_id', a 'status' of 'added', 'updated' or 'error', and a 'message'
+               for rejected items.
+
+    Items already in the cart are repriced at the current product price, like 'add_or_update_order_item'.
+    Whatever the number of items, the stock and price of all the products are read with one query,
+    the cart items are written with one 'bulk_update' and one 'bulk_create', and the order total is
+    updated once with the sum of the item changes. Items that fail validation are reported and the others are still applied.
+    """
+    if not isinstance(items, list) or not items:
+        return (False, "Please send a non-empty list of items.")
+    if len(items) > settings.CART_BATCH_MAX_ITEMS:
+        return (False, f"At most {settings.CART_BATCH_MAX_ITEMS} items can be added at once.")
+
+    try:
+        results = []
+        quantities = {}
+        for item in items:
+            product_id = item.get('product_id') if isinstance(item, dict) else None
+            qty = item.get('qty') if isinstance(item, dict) else None
+            if isinstance(product_id, bool) or not isinstance(product_id, int):
+                results.append({"product_id": product_id, "status": "error", "message": "Invalid product id."})
+            elif product_id in quantities:
+                results.append({"product_id": product_id, "status": "error", "message": "Duplicate product id in the request."})
+            elif isinstance(qty, bool) or not isinstance(qty, (int, float)) or qty <= 0:
+                results.append({"product_id": product_id, "status": "error", "message": "Entered quantity cannot be negative or 0."})
+            elif order_qty_error(qty):
+                results.append({"product_id": product_id, "status": "error", "message": order_qty_error(qty)})
+            else:
+                quantities[product_id] = Decimal(str(qty))
+                results.append({"product_id": product_id, "status": "pending"})
+
+        # Stock and price of every product of the request, in a single query.
+        products = {
+            product['id']: product
+            for product in Product.objects.filter(id__in=quantities, datedeleted__isnull=True)
+            .values('id', 'name', 'stock_count', 'price')
+        }
+        for result in results:
+            if result["status"] != "pending":
+                continue
+            product = products.get(result["product_id"])
+            if product is None:
+                result.update(status="error", message="Product does not exist")
+                del quantities[result["product_id"]]
+            elif product['stock_count'] < quantities[result["product_id"]]:
+                result.update(status="error", message="Selected product quantity out of stock. Select a lesser quantity.")
+                del quantities[result["product_id"]]
+
+        if not quantities:
+            return (True, {"order_id": None, "results": results})
+
+        if cart_store_enabled():
+            cart_items = get_cart(user_id)["items"]
+            cached_items = []
+            for result in results:
+                if result["status"] != "pending":
+                    continue
+                product_id = result["product_id"]
+                price = products[product_id]['price']
+                result["status"] = "updated" if product_id in cart_items else "added"
+                cached_items.append({
+                    "product_id": product_id,
+                    "product_name": products[product_id]['name'],
+                    "qty": quantities[product_id],
+                    "price": price,
+                    "total_amount": calculate_total_amount(quantities[product_id], price),
+                })
+            try:
+                cart = set_cart_items(user_id, cached_items)
+            except CartBusy as e:
+                return (False, str(e))
+            return (True, {"order_id": cart["order_id"], "results": results})
+
+        order = Order.objects.select_for_update().filter(user_id=user_id, status='In Cart').first()
+        if order is None:
+            order = Order.objects.create(user_id=user_id, total_amount=0, status='In Cart')
+
+        existing_items = {
+            order_item.product_id: order_item
+            for order_item in Orderitem.objects.filter(order=order, product_id__in=quantities)
+        }
+
+        now = timezone.now()
+        items_to_update = []
+        items_to_create = []
+        total_change = Decimal('0')
+        for result in results:
+            if result["status"] != "pending":
+                continue
+            product_id = result["product_id"]
+            qty = quantities[product_id]
+            price = products[product_id]['price']
+            order_item = existing_items.get(product_id)
+            if order_item:
+                total_change -= order_item.total_amount
+                order_item.qty = qty
+                order_item.price = price
+                order_item.total_amount = calculate_total_amount(qty, price)
+                total_change += order_item.total_amount
+                order_item.dateupdate = now
+                items_to_update.append(order_item)
+                result["status"] = "updated"
+            else:
+                total_amount = calculate_total_amount(qty, price)
+                items_to_create.append(Orderitem(
+                    order=order,
+                    product_id=product_id,
+                    qty=qty,
+                    price=price,
+                    total_amount=total_amount
+                ))
+                total_change += total_amount
+                result["status"] = "added"
+
+        if items_to_update:
+            Orderitem.objects.bulk_update(items_to_update, ['qty', 'price', 'total_amount', 'dateupdate'])
+        if items_to_create:
+            Orderitem.objects.bulk_create(items_to_create)
+
+        apply_order_total_change(order.id, total_change)
+        if items_to_create:
+            refresh_order_summaries([order.id])
+
+        return (True, {"order_id": order.id, "results": results})
+
+    except Exception as e:
+        transaction.set_rollback(True)
+        return (False, f"Error: {e}")
+
+
+def reconcile_order_totals(statuses=None, fix=False):
+    """
+    Verify that the stored order totals equal the sum of their item totals.
+
+    Args:
+        statuses (list, optional): Only check the orders with these statuses, all orders by default.
+        fix (bool, optional): If True, overwrite the wrong totals with the sum of the item totals.
+
+    Returns:
+        list: A dictionary for every order whose total is wrong, with the 'order_id', the
+              'recorded' total and the 'actual' sum of its items. When fixing, 'fixed' tells
+              whether the total was still wrong once the order was locked and was overwritten.
+
+    Totals are maintained incrementally by the cart functions, this is the periodic/on-demand
+    check that they have not drifted, e.g. after items were edited outside of this module.
+
+    When fixing, every mismatched order is locked in its own short transaction and its items are
+    summed again before the total is overwritten, so a cart change committed since the check is not
+    lost: its F() delta either committed before the lock and is part of the new sum, or is applied
+    on top of the fixed total. Must not be called inside a transaction, the locks would be held
+    until it ends.
+    """
+    orders = Order.objects.all()
+    if statuses:
+        orders = orders.filter(status__in=statuses)
+
+    items_total = Coalesce(Sum('orderitem__total_amount'), Value(Decimal('0')), output_field=DecimalField())
+    totals = orders.annotate(items_total=items_total).values('id', 'total_amount', 'items_total').order_by('id')
+
+    # The sums are compared in Python, rounded to cents, because some backends (SQLite) add
+    # decimals up as floats and would report totals that are off by a rounding error.
+    def to_cents(total):
+        return Decimal(str(total)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    mismatches = []
+    for order in totals.iterator(chunk_size=2000):
+        actual = to_cents(order['items_total'])
+        if order['total_amount'] != actual:
+            mismatches.append({"order_id": order['id'], "recorded": order['total_amount'], "actual": actual})
+
+    if fix:
+        fixed_order_ids = []
+        for mismatch in mismatches:
+            with transaction.atomic():
+                recorded = Order.objects.select_for_update().filter(
+                    id=mismatch["order_id"]
+                ).values_list('total_amount', flat=True).first()
+                actual = to_cents(Orderitem.objects.filter(order_id=mismatch["order_id"]).aggregate(
+                    total=Coalesce(Sum('total_amount'), Value(Decimal('0')), output_field=DecimalField())
+                )['total'])
+                fixed = recorded is not None and recorded != actual
+                if fixed:
+                    Order.objects.filter(id=mismatch["order_id"]).update(total_amount=actual)
+                    fixed_order_ids.append(mismatch["order_id"])
+                mismatch.update(recorded=recorded, actual=actual, fixed=fixed)
+        refresh_order_summaries(fixed_order_ids)
+
+    return mismatches
+
 
 def update_product_stock_count(updated_stock_count, product_id):
     """
@@ -209,17 +503,85 @@ def update_product_stock_count(updated_stock_count, product_id):
     Returns:
         None
 
-    This function updates the stock count of a product in the 'Product' model with the specified
-    updated stock count and product ID. It then saves the changes to the database using Django's ORM.
-    The function does not return any values.
+    This function sets the stock count of a product to the specified updated stock count. The
+    difference with the current count is recorded as an adjustment in the inventory ledger and
+    applied with an F() expression, the product row is not saved.
     """
-    try:
-        product = Product.objects.get(id=product_id)
-        product.stock_count = updated_stock_count
-        product.save()
+    with transaction.atomic():
+        if not set_stock_count(product_id, updated_stock_count):
+            return(f"Product not found with ID: {product_id}")
+        invalidate_catalog()
         return("Product stock count updated for product ID:", product_id)
-    except Product.DoesNotExist:
-        return(f"Product not found with ID: {product_id}")       
+
+
+def get_order_quantities(order_id):
+    """
+    Get the total quantity ordered of every product of an order, in product ID order.
+
+    Args:
+        order_id (int): The ID of the order.
+
+    Returns:
+        list: Dictionaries holding a 'product_id' and the 'qty' ordered.
+    """
+    return list(
+        Orderitem.objects.filter(order_id=order_id)
+        .values('product_id')
+        .annotate(qty=Sum('qty'))
+        .order_by('product_id')
+    )
+
+
+def reserve_stock(quantities, order_id=None):
+    """
+    Take the ordered quantities out of the stock of their products.
+
+    Args:
+        quantities (list): Dictionaries holding a 'product_id' and the 'qty' to reserve, as returned
+                           by 'get_order_quantities'.
+        order_id (int, optional): The ID of the order, recorded with the sale movements of the inventory ledger.
+
+    Returns:
+        list: The IDs of the products that did not have enough stock or were deleted since they
+              were added to the cart. Must be called inside a transaction that is rolled back
+              when the list is not empty.
+
+    Each product costs one 'UPDATE ... SET stock_count = stock_count - qty WHERE stock_count >= qty
+    AND datedeleted IS NULL', so the check and the decrement are a single atomic statement, two
+    concurrent checkouts can not both take the last units and a deleted product can not be sold. Products are updated in ID order so concurrent checkouts lock
+    their rows in the same order and can not deadlock.
+    """
+    failed_product_ids = []
+    for quantity in quantities:
+        reserved = Product.objects.filter(
+            id=quantity['product_id'], stock_count__gte=quantity['qty'], datedeleted__isnull=True
+        ).update(stock_count=F('stock_count') - quantity['qty'])
+        if not reserved:
+            failed_product_ids.append(quantity['product_id'])
+    if not failed_product_ids:
+        record_movements([
+            Inventorymovement(product_id=quantity['product_id'], kind='sale', quantity=-quantity['qty'], order_id=order_id)
+            for quantity in quantities
+        ])
+    return failed_product_ids
+
+
+def release_stock(quantities, order_id=None):
+    """
+    Put the quantities of a cancelled order back into the stock of their products.
+
+    Args:
+        quantities (list): Dictionaries holding a 'product_id' and the 'qty' to give back.
+        order_id (int, optional): The ID of the order, recorded with the restock movements of the inventory ledger.
+    """
+    for quantity in quantities:
+        Product.objects.filter(id=quantity['product_id']).update(
+            stock_count=F('stock_count') + quantity['qty']
+        )
+    record_movements([
+        Inventorymovement(product_id=quantity['product_id'], kind='cancellation_restock', quantity=quantity['qty'], order_id=order_id)
+        for quantity in quantities
+    ])
 
 
 def place_order(address_id, order_id):
@@ -244,6 +606,8 @@ def place_order(address_id, order_id):
         order.order_date = timezone.now()
         order.dateupdate = timezone.now()
         order.save()
+        update_summary_status(order)
+        record_order_sales(order)
         return("Order placed for order ID:", order_id)
     except Order.DoesNotExist:
         return("Order not found with ID:", order_id)   
@@ -272,7 +636,8 @@ def update_orders(order_id, status, address_id=None, use_default_address=False):
     It returns a tuple containing a boolean indicating success or failure and a message.
     """
     try:
-        order = Order.objects.get(id=order_id)
+        # Lock the order so that two concurrent requests can not both place or cancel it.
+        order = Order.objects.select_for_update().get(id=order_id)
         order_status = order.status
 
         if status == "place order" and order_status == 'In Cart':
@@ -280,51 +645,50 @@ def update_orders(order_id, status, address_id=None, use_default_address=False):
                 return (False, "Please enter an address or choose the default address to proceed.")
             elif address_id:
                 try:
-                    address = Address.objects.get(id=address_id, user=order.user)
+                    address = Address.objects.get(id=address_id, user_id=order.user_id)
                 except Address.DoesNotExist:
                     return (False, "Please enter a correct address ID.")
             elif use_default_address:
                 try:
-                    address = Address.objects.get(user=order.user, isdefault=True)
+                    address = Address.objects.get(user_id=order.user_id, isdefault=True)
                 except Address.DoesNotExist:
                     return (False, "No default address found for the user.")
             
-            order_items = Orderitem.objects.filter(order=order)
-            for order_item in order_items:
-                product = order_item.product
-
-                if product.stock_count < order_item.qty:
-                    print("stock count exceeds qty")
-                    return (False, f"Quantity of product {product.id} in your order exceeds available stock. Please select lesser quantity and try again")
-
-            # Update stock counts and place order
-            for order_item in order_items:
-                product = order_item.product
-                product.stock_count -= order_item.qty
-                product.save()
+            # Reserve the stock of every product with a conditional UPDATE, no product rows are read.
+            failed_product_ids = reserve_stock(get_order_quantities(order.id), order.id)
+            if failed_product_ids:
+                # Give back the stock already reserved for the other products of the order.
+                transaction.set_rollback(True)
+                product_list = ", ".join(str(product_id) for product_id in failed_product_ids)
+                return (False, f"Product(s) {product_list} in your order are no longer available or the quantity exceeds available stock. Please remove them or select lesser quantity and try again")
+            invalidate_catalog()
+            discard_cart(order.user_id)
             order.status = 'Placed'
             order.address = address
             order.order_date = timezone.now()
             order.dateupdate = timezone.now()
             order.save()
+            update_summary_status(order)
+            record_order_sales(order)
 
             return (True, "Order placed successfully.")
 
         elif status == "cancel order":
             if order_status == 'In Cart':
+                discard_cart(order.user_id)
                 order.status = 'Cancelled'
                 order.dateupdate = timezone.now()
                 order.save()
+                update_summary_status(order)
                 return (True, "Order in cart cancelled successfully.")
             elif order_status == 'Placed':
-                order_items = Orderitem.objects.filter(order=order)
-                for order_item in order_items:
-                    product = order_item.product
-                    product.stock_count += order_item.qty
-                    product.save()
+                release_stock(get_order_quantities(order.id), order.id)
+                invalidate_catalog()
                 order.status = 'Cancelled'
                 order.dateupdate = timezone.now()
                 order.save()
+                update_summary_status(order)
+                record_order_sales(order, cancelled=True)
                 return (True, "Placed order cancelled successfully.")
             else:
                 return (False, "Order cannot be cancelled.")
@@ -340,104 +704,136 @@ def update_orders(order_id, status, address_id=None, use_default_address=False):
 
 def get_cart_items(user_id):
     """
-    Get a list of products in the user's existing cart.
+    Get the products in the user's existing cart.
 
     Args:
         user_id (int): The ID of the user.
 
     Returns:
-        tuple: A tuple containing a boolean indicating success or failure and a message.
+        tuple: A tuple containing a boolean indicating success and either the cart or an error
+               message. The cart is a dictionary holding the 'order_id', the 'total_amount' and the
+               list of 'items', each with the product ID and name, quantity, unit price and line total.
 
-    This function retrieves the list of products in the user's existing cart. It returns a tuple containing
-    a boolean indicating success or failure and a message with the cart items.
+    The cart is read with two queries whatever its size, one checking the user and one reading the
+    items joined to their product and order. With the cache cart store the items come from the
+    cache and the second query only runs when the cart is not cached.
     """
     try:
         # Check if the user exists
-        user = User.objects.get(id=user_id)
-        
-        # Get the user's "In Cart" order
-        order = Order.objects.get(user_id=user_id, status='In Cart')
-        
-        # Get the order items associated with the order
-        order_items = Orderitem.objects.filter(order=order)
-        
-        if order_items:
-            order_list = []
-            for order_item in order_items:
-                product = order_item.product
-                order_dict = {
-                    "orderitem_id": order_item.id,
-                    "order_id": order_item.order.id,
-                    "product_id": product.id,
-                    "product_qty": str(order_item.qty),
-                    "price": str(order_item.price),
-                    "subtotal": str(order_item.total_amount)
-                }
-                order_list.append(order_dict)
-            return (True, f'You have the following items in your cart: {order_list}')
+        if not User.objects.filter(id=user_id).exists():
+            return (False, "User not found.")
+
+        if cart_store_enabled():
+            cart = get_cart(user_id)
+            order_id = cart["order_id"]
+            cart_items = [dict(item, product_id=product_id) for product_id, item in cart["items"].items()]
         else:
+            cart_items = list(
+                Orderitem.objects.filter(order__user_id=user_id, order__status='In Cart')
+                .values('order_id', 'product_id', 'qty', 'price', 'total_amount',
+                        orderitem_id=F('id'), product_name=F('product__name'))
+                .order_by('id')
+            )
+            order_id = cart_items[0]['order_id'] if cart_items else None
+
+        if not cart_items:
             return (False, "Your cart is empty.")
 
-    except User.DoesNotExist:
-        return (False, "User not found.")
-
-    except Order.DoesNotExist:
-        return (False, "Your cart is empty.")
+        items = []
+        for item in cart_items:
+            items.append({
+                "orderitem_id": item["orderitem_id"],
+                "product_id": item["product_id"],
+                "product_name": item["product_name"],
+                # Cached quantities are kept as entered, shown with the 2 decimals of the stored ones.
+                "product_qty": str(Decimal(item["qty"]).quantize(Decimal('0.01'))),
+                "price": str(item["price"]),
+                "subtotal": str(item["total_amount"])
+            })
+        total_amount = sum((item["total_amount"] for item in cart_items), Decimal('0'))
+        return (True, {"order_id": order_id, "total_amount": str(total_amount), "items": items})
 
     except Exception as e:
         return (False, f"Error retrieving cart items: {e}")        
 
 
 
-def get_orders_for_product(user_id, product_id):
-    #breakpoint()
-    try:
-        # Check if the product with the specified ID exists
-        product = Product.objects.get(id=product_id)
-
-        # Get the user
-        user = User.objects.get(id=user_id)
-
-        # Check if the user has the role of an admin
-        admin_role = Role.objects.get(name='admin')  
-        if user.role_id == admin_role.id:
-            
-            # Fetch orders for the given product
-            orders = Orderitem.objects.filter(product_id=product_id, order__order_date__isnull=False)
-            print("orders:",orders)
-
-            order_details = []
-            for order_item in orders:
-                order = order_item.order
-                order_detail = {
-                    "order_id": order.id,
-                    "product_id": order_item.product.id,
-                    "user_id": order.user.id,
-                    "address_id": order.address.id,
-                    "order_date": order.order_date.strftime('%Y-%m-%d %H:%M:%S'),
-                    "status": order.status,
-                    "qty": order_item.qty,
-                    "price": order_item.price,
-                    "total_amount": order_item.total_amount,
-                }
-                order_details.append(order_detail)
-
-            return (True, f"Here are the order details for product {product_id}: {order_details}")
-        else:
-            raise PermissionDenied("You do not have permission for this activity.")
+def get_orders_for_product(product_id, date_from=None, date_to=None, statuses=None, cursor=None, page_size=None):
+    """
+    Get one page of the orders placed for a product, for admins. The caller checks the user is an admin.
 
-#To handle when product is not found
-    except Product.DoesNotExist:
-        return (False, "Product not found.")  
+    Args:
+        product_id (int or str): The ID of the product.
+        date_from (str, optional): Only orders placed at or after this date/datetime.
+        date_to (str, optional): Only orders placed at or before this date/datetime, a plain date includes the whole day.
+        statuses (list, optional): Only orders with one of these statuses.
+        cursor (str, optional): The opaque cursor returned with the previous page.
+        page_size (str or int, optional): The number of orders wanted on the page.
 
-#to handle if user id is invalid
-    except User.DoesNotExist:
-        return (False, "User not found.")
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either a dictionary with the
+               'orders' on the page and the 'next_cursor' (None on the last page), or an error message.
 
-#to handle situation where user do not have permission         
-    except PermissionDenied:
-        return (False, "You do not have permission for this activity.")
+    The order items of the product are walked in (order_id, id) order from the composite
+    (product_id, order_id) index, and every page is read with a single query joining the order.
+    """
+    try:
+        # Check if the product with the specified ID exists
+        if not Product.objects.filter(id=product_id).exists():
+            return (False, "Product not found.")
+
+        page_size = get_page_size(page_size, settings.CATALOG_PAGE_SIZE, settings.CATALOG_MAX_PAGE_SIZE)
+
+        orders = Orderitem.objects.filter(product_id=product_id, order__order_date__isnull=False)
+        if date_from:
+            orders = orders.filter(order__order_date__gte=parse_date_filter(date_from, 'from'))
+        if date_to:
+            orders = orders.filter(order__order_date__lte=parse_date_filter(date_to, 'to', end_of_day=True))
+        if statuses:
+            valid_statuses = [choice for choice, _ in Order.STATUS]
+            invalid_statuses = [status for status in statuses if status not in valid_statuses]
+            if invalid_statuses:
+                return (False, f"Invalid status {', '.join(invalid_statuses)}, choose from: {', '.join(valid_statuses)}.")
+            orders = orders.filter(order__status__in=statuses)
+        if cursor:
+            position = decode_cursor(cursor)
+            last_order_id = cursor_int(position.get('order_id'))
+            last_id = cursor_int(position.get('id'))
+            orders = orders.filter(Q(order_id__gt=last_order_id) | Q(order_id=last_order_id, id__gt=last_id))
+
+        rows = list(
+            orders.order_by('order_id', 'id')
+            .values('id', 'order_id', 'product_id', 'qty', 'price', 'total_amount',
+                    user_id=F('order__user_id'), address_id=F('order__address_id'),
+                    order_date=F('order__order_date'), status=F('order__status'))
+            [:page_size + 1]
+        )
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = encode_cursor({'order_id': rows[-1]['order_id'], 'id': rows[-1]['id']})
+
+        order_details = []
+        for row in rows:
+            order_details.append({
+                "order_id": row['order_id'],
+                "product_id": row['product_id'],
+                "user_id": row['user_id'],
+                "address_id": row['address_id'],
+                "order_date": row['order_date'].strftime('%Y-%m-%d %H:%M:%S'),
+                "status": row['status'],
+                "qty": str(row['qty']),
+                "price": str(row['price']),
+                "total_amount": str(row['total_amount']),
+            })
+
+        return (True, {"orders": order_details, "next_cursor": next_cursor})
+
+#to handle an invalid cursor, page size or date filter
+    except ValueError as e:
+        return (False, str(e))
         
 #to handle any other errors
     except Exception as e:
-        return (False, f"Error retrieving order details: {e}")
\ No newline at end of file
+        return (False, f"Error retrieving order details: {e}")
@@ -1,32 +1,37 @@
 from  .models import *
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import permission_required
-from django.db import transaction
+from django.db import transaction, connection
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import ObjectDoesNotExist
-
-
+from django.conf import settings
+from django.db.models import Q, F, Count
+from django.db.models.functions import Upper
+from decimal import Decimal, InvalidOperation
+from .catalog_cache import invalidate_catalog, invalidate_product_text
+from .autocomplete import index_product_names
+from .utils.pagination import encode_cursor, decode_cursor, cursor_datetime, cursor_int, get_page_size
+from .inventory import record_movements, set_stock_count
+from .refdata import refdata, invalidate_refdata
+
+
+#The caller checks that the user is an admin.
 def create_product(user_id, name, description, price, stock_count, category_ids):
     try:
         with transaction.atomic():
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                error_message = "User does not exist."
-                return (False, error_message)
-
-            admin_role = Role.objects.get(name='admin')            
-
-            if user.role != admin_role:
-                error_message = "You do not have permission to create products."
-                return (False, error_message)
-
-            
             # Check if a product with the same name already exists.            
             if Product.objects.filter(name__iexact=name).exists():
                 error_message = "Product with the same name already exists."
                 return (False, error_message)
 
+            # Check that every category exists, from the reference data registry.
+            category_ids = list(dict.fromkeys(category_ids))
+            missing_category_ids = refdata.missing_category_ids(category_ids)
+            if missing_category_ids:
+                # Handle the case where a category with the specified ID does not exist
+                error_message = f"Category with ID {missing_category_ids[0]} does not exist."
+                return (False, error_message)
+
             # Create the product and save it to the database.
             product = Product(
                 name=name,
@@ -35,32 +40,28 @@ def create_product(user_id, name, description, price, stock_count, category_ids)
                 stock_count=stock_count,
                 createdby=user_id
             )
-            #product.save()
+            product.save()
 
-            # Create a list to store ProductCategory instances
-            product_categories = []
+            # The initial stock is the first movement of the product's inventory ledger.
+            record_movements([Inventorymovement(product=product, kind='receipt', quantity=stock_count, createdby=user_id)])
 
             # Associate the product with specified categories.
-            for category_id in category_ids:
-                try:
-                    # Check if the category ID exists in the Category table
-                    category = Category.objects.get(pk=category_id)
-                    product_category = Productcategory(
-                        product=product,
-                        category=category,
-                        createdby=user_id
-                    )
-                    product_categories.append(product_category)
-                    product.save()
-                except Category.DoesNotExist:
-                    # Handle the case where a category with the specified ID does not exist
-                    error_message = f"Category with ID {category_id} does not exist."
-                    return (False, error_message)
+            product_categories = [
+                Productcategory(
+                    product=product,
+                    category_id=category_id,
+                    createdby=user_id
+                )
+                for category_id in category_ids
+            ]
 
             # Save all ProductCategory instances in a single batch
             Productcategory.objects.bulk_create(product_categories)
+            adjust_category_facets({category_id: 1 for category_id in category_ids})
 
             print(f"Product added: {product}")
+            invalidate_catalog()
+            index_product_names([(product.id, product.name)])
             return (True, f"Product created successfully! product id : {product.id}")
 
     except Exception as e:
@@ -68,6 +69,166 @@ def create_product(user_id, name, description, price, stock_count, category_ids)
         return (False, error_message)
 
 
+def _clean_product_row(row):
+    """
+    Validate one product row of a bulk import.
+
+    Returns:
+        tuple: The cleaned product fields and None, or None and the error message.
+    """
+    name = str(row.get('name') or '').strip()
+    if not name:
+        return (None, "Missing product name.")
+    if len(name) > Product._meta.get_field('name').max_length:
+        return (None, "Product name is too long.")
+
+    description = row.get('description') or None
+    if description is not None:
+        description = str(description)
+        if len(description) > Product._meta.get_field('description').max_length:
+            return (None, "Product description is too long.")
+
+    # The upper limits come from the model fields, a value over them would make the whole chunk fail.
+    price_field = Product._meta.get_field('price')
+    try:
+        price = Decimal(str(row.get('price'))).quantize(Decimal(1).scaleb(-price_field.decimal_places))
+    except (InvalidOperation, ValueError):
+        return (None, f"Invalid price: {row.get('price')!r}.")
+    if not price.is_finite() or price < 1:
+        return (None, "Price must be at least 1.")
+    if price >= Decimal(10) ** (price_field.max_digits - price_field.decimal_places):
+        return (None, f"Price must have at most {price_field.max_digits - price_field.decimal_places} digits before the decimal point.")
+
+    try:
+        stock_count = int(row.get('stock_count'))
+    except (TypeError, ValueError):
+        return (None, f"Invalid stock count: {row.get('stock_count')!r}.")
+    if stock_count < 0:
+        return (None, "Stock count can not be negative.")
+    # SQLite does not report a range for its integer columns, they hold 64-bit integers. The initial
+    # stock is also recorded as a decimal quantity of the inventory ledger, which may be smaller.
+    max_stock_count = connection.ops.integer_field_range(
+        Product._meta.get_field('stock_count').get_internal_type()
+    )[1] or 2 ** 63 - 1
+    quantity_field = Inventorymovement._meta.get_field('quantity')
+    max_stock_count = min(max_stock_count, 10 ** (quantity_field.max_digits - quantity_field.decimal_places) - 1)
+    if stock_count > max_stock_count:
+        return (None, f"Stock count can not be more than {max_stock_count}.")
+
+    category_ids = row.get('category_ids')
+    if isinstance(category_ids, str):
+        category_ids = [category_id for category_id in category_ids.replace(';', '|').split('|') if category_id.strip()]
+    try:
+        category_ids = list(dict.fromkeys(int(category_id) for category_id in category_ids or []))
+    except (TypeError, ValueError):
+        return (None, f"Invalid category ids: {row.get('category_ids')!r}.")
+    if not category_ids:
+        return (None, "At least one category id is required.")
+
+    return ({
+        "name": name,
+        "description": description,
+        "price": price,
+        "stock_count": stock_count,
+        "category_ids": category_ids,
+    }, None)
+
+
+def bulk_create_products(user_id, rows):
+    """
+    Validate and insert a chunk of products in a single transaction.
+
+    Args:
+        user_id (int): The ID of the admin importing the products, stored in 'createdby'.
+        rows (list): (row number, product data) pairs. Product data holds the same fields as
+                     'create_product': name, description, price, stock_count and category_ids.
+
+    Returns:
+        tuple: The number of products created and a list of (row number, error message) pairs
+               for the rows that were skipped.
+
+    Unlike calling 'create_product' once per row, the chunk costs a fixed number of queries:
+    one to find the names that already exist, one to resolve every category of the chunk, and
+    one bulk insert each for the products and their category links.
+    """
+    errors = []
+    cleaned_rows = []
+    for row_number, row in rows:
+        cleaned, error = _clean_product_row(row)
+        if error:
+            errors.append((row_number, error))
+        else:
+            cleaned_rows.append((row_number, cleaned))
+
+    with transaction.atomic():
+        # Names are compared in upper case, like 'name__iexact', so the lookup uses product_upper_name_idx.
+        names = {cleaned["name"].upper() for _, cleaned in cleaned_rows}
+        existing_names = set(
+            Product.objects.annotate(upper_name=Upper('name')).filter(upper_name__in=names)
+            .values_list('upper_name', flat=True)
+        )
+        category_ids = {category_id for _, cleaned in cleaned_rows for category_id in cleaned["category_ids"]}
+        existing_category_ids = category_ids.difference(refdata.missing_category_ids(list(category_ids)))
+
+        valid_rows = []
+        for row_number, cleaned in cleaned_rows:
+            upper_name = cleaned["name"].upper()
+            missing_category_ids = [
+                category_id for category_id in cleaned["category_ids"] if category_id not in existing_category_ids
+            ]
+            if upper_name in existing_names:
+                errors.append((row_number, "Product with the same name already exists."))
+            elif missing_category_ids:
+                errors.append((row_number, f"Category with ID {missing_category_ids[0]} does not exist."))
+            else:
+                # Later rows of the chunk with the same name are duplicates too.
+                existing_names.add(upper_name)
+                valid_rows.append(cleaned)
+
+        if not valid_rows:
+            return (0, errors)
+
+        products = Product.objects.bulk_create([
+            Product(
+                name=cleaned["name"],
+                description=cleaned["description"],
+                price=cleaned["price"],
+                stock_count=cleaned["stock_count"],
+                createdby=user_id
+            )
+            for cleaned in valid_rows
+        ])
+
+        if products[0].id is None:
+            # Databases that can not return the ids of bulk inserted rows, the names are unique.
+            ids_by_name = dict(
+                Product.objects.filter(name__in=[product.name for product in products]).values_list('name', 'id')
+            )
+            for product in products:
+                product.id = ids_by_name[product.name]
+
+        Productcategory.objects.bulk_create([
+            Productcategory(product_id=product.id, category_id=category_id, createdby=user_id)
+            for product, cleaned in zip(products, valid_rows)
+            for category_id in cleaned["category_ids"]
+        ])
+        record_movements([
+            Inventorymovement(product_id=product.id, kind='receipt', quantity=product.stock_count, createdby=user_id)
+            for product in products
+        ])
+
+        facet_changes = {}
+        for cleaned in valid_rows:
+            for category_id in cleaned["category_ids"]:
+                facet_changes[category_id] = facet_changes.get(category_id, 0) + 1
+        adjust_category_facets(facet_changes)
+
+        invalidate_catalog()
+        index_product_names([(product.id, product.name) for product in products])
+
+    return (len(products), errors)
+
+
 def create_category(category_name):
     try:
         with transaction.atomic():
@@ -75,13 +236,15 @@ def create_category(category_name):
             normalized_category_name = category_name.lower()
 
             # Check if a category with the same name already exists.
-            if Category.objects.filter(name__iexact=normalized_category_name).exists():
+            if refdata.category_id(normalized_category_name) is not None:
                 error_message = "Category with the same name already exists."
                 return (False, error_message)
 
             # Create the category and save it to the database.
             category = Category(name=category_name)
             category.save()
+            Categoryfacet.objects.create(category=category)
+            invalidate_refdata()
             return (True, category.id)
 
     except Exception as e:
@@ -89,43 +252,226 @@ def create_category(category_name):
         return (False, error_message)
 
 
-def get_added_products(user_id=None):
+def adjust_category_facets(facet_changes):
+    """
+    Apply changes to the live product counts of categories.
+
+    Args:
+        facet_changes (dict): The change of the product count for each category ID, e.g. {3: 1, 5: -1}.
+
+    Categories receiving the same change are updated with a single UPDATE using F() expressions,
+    so concurrent writers never overwrite each other's counts.
+    """
+    categories_by_change = {}
+    for category_id, change in facet_changes.items():
+        if change:
+            categories_by_change.setdefault(change, []).append(category_id)
+
+    for change, category_ids in categories_by_change.items():
+        updated = Categoryfacet.objects.filter(category_id__in=category_ids).update(
+            product_count=F('product_count') + change,
+            dateupdate=timezone.now()
+        )
+        if updated != len(category_ids):
+            # Categories created outside of create_category have no facet row yet.
+            existing_ids = set(
+                Categoryfacet.objects.filter(category_id__in=category_ids).values_list('category_id', flat=True)
+            )
+            Categoryfacet.objects.bulk_create([
+                Categoryfacet(category_id=category_id, product_count=max(change, 0), dateupdate=timezone.now())
+                for category_id in category_ids if category_id not in existing_ids
+            ])
+
+
+def rebuild_category_facets():
+    """
+    Recount the live products of every category from the Productcategory table.
+
+    Returns:
+        int: The number of categories recounted.
+
+    Only needed to repair the counts, e.g. after links were edited outside of the product service functions.
+    """
+    with transaction.atomic():
+        counts = dict(
+            Productcategory.objects.filter(datedeleted__isnull=True, product__datedeleted__isnull=True)
+            .values_list('category_id')
+            .annotate(product_count=Count('product_id', distinct=True))
+        )
+        category_ids = list(Category.objects.values_list('id', flat=True))
+        Categoryfacet.objects.bulk_create(
+            [Categoryfacet(category_id=category_id) for category_id in category_ids],
+            ignore_conflicts=True
+        )
+        facets = list(Categoryfacet.objects.all())
+        for facet in facets:
+            facet.product_count = counts.get(facet.category_id, 0)
+            facet.dateupdate = timezone.now()
+        Categoryfacet.objects.bulk_update(facets, ['product_count', 'dateupdate'], batch_size=1000)
+        return len(facets)
+
+
+def get_category_facets():
+    """
+    Get the number of live products in every category, read from the precomputed facet table.
+    """
+    facets = Categoryfacet.objects.order_by('category__name').values(
+        'category_id', 'category__name', 'product_count'
+    )
+    return [
+        {"category_id": facet['category_id'], "name": facet['category__name'], "product_count": facet['product_count']}
+        for facet in facets
+    ]
+
+
+def get_products_by_category(category=None, cursor=None, page_size=None):
+    """
+    Browse the live products of a category, one keyset paginated page at a time.
+
+    Args:
+        category (str, optional): The ID or the name of the category. All live products are listed when not given.
+        cursor (str, optional): The cursor returned with the previous page.
+        page_size (str or int, optional): The number of products wanted on the page.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either the page of products
+               together with the facet counts of all categories, or an error message.
+    """
+    try:
+        products = Product.objects.filter(datedeleted__isnull=True)
+
+        if category:
+            if category.isdigit():
+                category_id = int(category) if refdata.category_name(int(category)) is not None else None
+            else:
+                category_id = refdata.category_id(category)
+            if category_id is None:
+                return (False, "Category does not exist.")
+
+            linked_product_ids = Productcategory.objects.filter(
+                category_id=category_id, datedeleted__isnull=True
+            ).values('product_id')
+            products = products.filter(id__in=linked_product_ids)
+
+        product_page = paginate_products(products, ['id', 'name', 'price'], cursor, page_size)
+        product_page["facets"] = get_category_facets()
+        return (True, product_page)
+
+    except ValueError as e:
+        return (False, str(e))
+
+    except Exception as e:
+        return (False, f"Error: {e}")
+
+
+def delete_product(user_id, product_id):
+    """
+    Soft delete a product by setting its 'datedeleted' and 'deletedby' fields.
+
+    Args:
+        user_id (int): The ID of the admin deleting the product, the caller checks the user is an admin.
+        product_id (int): The ID of the product to delete.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and a message.
+
+    The product stays in the database for the existing orders, but it is no longer listed,
+    searchable or counted in the category facets.
+    """
     try:
         with transaction.atomic():
+            product = Product.objects.select_for_update().get(id=product_id)
+            if product.datedeleted is not None:
+                return (False, "Product is already deleted.")
 
-            # Common fields to fetch for all users
-            common_fields = ['name', 'price']
-            additional_fields=[]
+            Product.objects.filter(id=product.id).update(datedeleted=timezone.now(), deletedby=user_id)
 
-            # Perform necessary queries to retrieve product data
-            if user_id:
-                try:
-                    user = User.objects.get(id=user_id)
-                except User.DoesNotExist:
-                    return (False, "User does not exist.")
+            category_ids = Productcategory.objects.filter(
+                product_id=product.id, datedeleted__isnull=True
+            ).values_list('category_id', flat=True)
+            adjust_category_facets({category_id: -1 for category_id in category_ids})
 
-                admin_role = Role.objects.get(name="admin")
+            invalidate_catalog()
+            index_product_names([(product.id, None)])
+            return (True, "Product deleted.")
 
+    except Product.DoesNotExist:
+        return (False, "Product not found.")
+    except Exception as e:
+        return (False, f"Error deleting product: {e}")
 
-                if user.role == admin_role:
-                    # Additional fields for admin users
-                    additional_fields = ['id','description', 'stock_count', 'datecreated', 'dateupdated','datedeleted','createdby','updateby','deletedby']
-                    
 
-                else:
-                    return (False, "You do not have permission for this activity.")
-                    # Additional fields for non-admin users
-                    #pass
-                
+def paginate_products(queryset, fields, cursor=None, page_size=None):
+    """
+    Return one keyset paginated page of products.
+
+    Args:
+        queryset (QuerySet): The products to page through.
+        fields (list): The product fields to return for every product.
+        cursor (str, optional): The opaque cursor returned with the previous page.
+        page_size (str or int, optional): The number of products wanted on the page.
+
+    Returns:
+        dict: The products on the page and the cursor of the next page (None on the last page).
+
+    Products are walked in (datecreated, id) order, so the ordering is stable while products
+    are being added and every page is a single indexed range scan no matter how deep the
+    client has paged. Raises ValueError when the cursor or page size is invalid.
+    """
+    page_size = get_page_size(page_size, settings.CATALOG_PAGE_SIZE, settings.CATALOG_MAX_PAGE_SIZE)
+
+    queryset = queryset.order_by('datecreated', 'id')
+    if cursor:
+        position = decode_cursor(cursor)
+        last_datecreated = cursor_datetime(position.get('datecreated'))
+        last_id = cursor_int(position.get('id'))
+        queryset = queryset.filter(
+            Q(datecreated__gt=last_datecreated) | Q(datecreated=last_datecreated, id__gt=last_id)
+        )
+
+    # The keyset columns are always fetched to build the next cursor.
+    keyset_fields = [field for field in ('id', 'datecreated') if field not in fields]
+    rows = list(queryset.values(*fields, *keyset_fields)[:page_size + 1])
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor({'datecreated': rows[-1]['datecreated'], 'id': rows[-1]['id']})
+
+    for row in rows:
+        for field in keyset_fields:
+            del row[field]
+
+    return {"products": rows, "next_cursor": next_cursor}
+
+
+#admin=True is for admins only (checked by the caller), it adds the internal fields and the soft deleted products.
+def get_added_products(admin=False, cursor=None, page_size=None):
+    try:
+        with transaction.atomic():
+
+            # Common fields to fetch for all users
+            common_fields = ['name', 'price']
+            additional_fields=[]
+
+            if admin:
+                # Additional fields for admin users
+                additional_fields = ['id','description', 'stock_count', 'datecreated', 'dateupdated','datedeleted','createdby','updateby','deletedby']
+
             fields_to_fetch = common_fields + additional_fields
 
-                # Fetch products with selected fields
-            products = Product.objects.values(*fields_to_fetch)
+            # Admins also see the soft deleted products.
+            products = Product.objects.all()
+            if not additional_fields:
+                products = products.filter(datedeleted__isnull=True)
 
-                # Convert the result to a list of dictionaries
-            product_list = list(products)
+            # Fetch one page of products with selected fields
+            product_page = paginate_products(products, fields_to_fetch, cursor, page_size)
 
-            return (True, product_list)
+            return (True, product_page)
+
+    except ValueError as e:
+        return (False, str(e))
 
     except Exception as e:
         error_message = f"Error: {e}"
@@ -136,14 +482,16 @@ def view_product(product_id):
     try:        
         with transaction.atomic():  #for the database consistency
             # Fetch the product using Django's model
-            product = Product.objects.get(id=product_id)
+            product = Product.objects.get(id=product_id, datedeleted__isnull=True)
 
             # Create a dictionary containing product details
             product_details = {
                 "id": product.id,
                 "name": product.name,
                 "description": product.description,
-                "price": str(product.price)
+                "price": str(product.price),
+                # Used for the Last-Modified header, not part of the response body.
+                "last_modified": product.dateupdated or product.datecreated
             }
 
             return ( True , product_details)
@@ -159,24 +507,14 @@ def view_product(product_id):
         return ( False, error_message)
 
 
+#The caller checks that the user is an admin.
 def update_products_info(user_id, product_id, **kwargs):
     #breakpoint()
     try:
         with transaction.atomic():
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                error_message = "User does not exist."
-                return (False, error_message)
-
-            admin_role = Role.objects.get(name='admin')            
-
-            if user.role != admin_role:
-                error_message = "You do not have permission to update a product."
-                return (False, error_message)    
-
-            # Retrieve the product using the Django ORM
-            product = get_object_or_404(Product, id=product_id)
+            # Lock the product row, so concurrent edits of its categories are diffed one after the
+            # other and the category facets are not changed twice for the same link.
+            product = Product.objects.select_for_update().get(id=product_id)
             # Check if 'price' is provided and not negative
             if 'price' in kwargs and kwargs['price'] < 0:
                 return (False, "Price cannot be negative.")
@@ -187,62 +525,75 @@ def update_products_info(user_id, product_id, **kwargs):
 
             # Check if 'category_ids' is provided
             if 'category_ids' in kwargs:
-                # Get the current category IDs associated with the product
-                current_category_ids = list(product.productcategory_set.values_list('category_id', flat=True))
-                print("current category_ids", current_category_ids)
+                # Get the category IDs currently linked to the product, soft deleted links are not counted.
+                current_category_ids = set(
+                    product.productcategory_set.filter(datedeleted__isnull=True).values_list('category_id', flat=True)
+                )
 
                 #to check if entered categories exists in the database or not
-                for category_id in kwargs['category_ids']:
-                    try:
-                        category = Category.objects.get(id=category_id)
-                    except Category.DoesNotExist:
-                        return (False,f"Category with ID {category_id} does not exist. Please enter a valid category id to update." ) 
+                missing_category_ids = refdata.missing_category_ids(kwargs['category_ids'])
+                if missing_category_ids:
+                    return (False,f"Category with ID {missing_category_ids[0]} does not exist. Please enter a valid category id to update." ) 
 
                 # Convert 'category_ids' to a set for easy comparison
                 new_category_ids = set(kwargs['category_ids'])
                     
                 # Find categories to delete and insert
-                categories_to_delete = list(set(current_category_ids) - new_category_ids)
-                categories_to_insert = list(new_category_ids - set(current_category_ids))
+                categories_to_delete = list(current_category_ids - new_category_ids)
+                categories_to_insert = list(new_category_ids - current_category_ids)
 
                 # Insert new rows with product_id and category_ids to insert
                 if categories_to_insert:
-                    for category_id in categories_to_insert:
-                        #try:
-                        category = Category.objects.get(id=category_id)
-                        product_category = Productcategory(
+                    Productcategory.objects.bulk_create([
+                        Productcategory(
                             product_id=product.id, 
-                            category_id=category.id,  
+                            category_id=category_id,  
                             datecreate=timezone.now(),
                             createdby=user_id
                         )
-                        #category_insertion_successful = True
-                        #except ObjectDoesNotExist:
-                            #return (False, f"Category with ID {category_id} does not exist.")
-                            #category_insertion_successful = False
-                    product_category.save()
+                        for category_id in categories_to_insert
+                    ])
 
                 # Delete old rows with product_id and category_ids to delete
                 if categories_to_delete:
                     Productcategory.objects.filter(
                         product=product,
-                        category_id__in=categories_to_delete
+                        category_id__in=categories_to_delete,
+                        datedeleted__isnull=True
                     ).update(
                         datedeleted=timezone.now(),
                         deletedby=user_id
                     )
 
+                # A soft deleted product is not counted in the facets.
+                if product.datedeleted is None:
+                    facet_changes = {category_id: 1 for category_id in categories_to_insert}
+                    facet_changes.update({category_id: -1 for category_id in categories_to_delete})
+                    adjust_category_facets(facet_changes)
+
+
+            # The stock goes through the inventory ledger, the difference is recorded as an adjustment.
+            if 'stock_count' in kwargs:
+                set_stock_count(product.id, kwargs['stock_count'], user_id)
 
             # Update the product fields based on the provided POST data
-            for field, value in kwargs.items():        
-                setattr(product, field, value)
+            product_fields = [field for field in kwargs if field not in ('category_ids', 'stock_count')]
+            for field in product_fields:
+                setattr(product, field, kwargs[field])
 
             # Update 'dateupdate' with the current time and 'updatedby' with the user_id
             product.dateupdated = timezone.now()
             product.updateby = user_id
 
-            # Save the updated product to the database
-            product.save()
+            # Save only the changed fields, so the stock count updated above is not overwritten
+            product.save(update_fields=product_fields + ['dateupdated', 'updateby'])
+            invalidate_catalog()
+            # A soft deleted product is not in the search and autocomplete indexes, renaming it
+            # does not change them.
+            if product.datedeleted is None and 'name' in kwargs:
+                index_product_names([(product.id, product.name)])
+            elif product.datedeleted is None and 'description' in kwargs:
+                invalidate_product_text()
 
             return (True, "Product info updated.")
 
@@ -252,11 +603,110 @@ def update_products_info(user_id, product_id, **kwargs):
         return (False,  f"Error updating product data: {str(e)}")
 
 
+def bulk_update_products(user_id, updates):
+    """
+    Update the price and/or stock count of many products in one transaction.
+
+    Args:
+        user_id (int): The ID of the admin making the changes, stored in 'updateby'. The caller checks the user is an admin.
+        updates (list): Dictionaries with the product 'id' and a new 'price' and/or 'stock_count'.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either the per-row results
+               or an error message. Every result holds the product 'id', a 'status' of 'updated'
+               or 'error', and a 'message' for rejected rows.
+
+    The products are locked and read with one query and written back with set-based 'bulk_update'
+    statements, instead of the several queries and full row save 'update_products_info' costs per
+    product. Rejected rows are reported and do not stop the valid ones from being applied.
+    """
+    if not isinstance(updates, list) or not updates:
+        return (False, "Please send a non-empty list of products to update.")
+    if len(updates) > settings.BULK_UPDATE_MAX_PRODUCTS:
+        return (False, f"At most {settings.BULK_UPDATE_MAX_PRODUCTS} products can be updated at once.")
+
+    try:
+        with transaction.atomic():
+            results = []
+            changes = {}
+            for update in updates:
+                product_id = update.get('id') if isinstance(update, dict) else None
+                if isinstance(product_id, bool) or not isinstance(product_id, int):
+                    results.append({"id": product_id, "status": "error", "message": "Invalid product id."})
+                    continue
+                if product_id in changes:
+                    results.append({"id": product_id, "status": "error", "message": "Duplicate product id in the request."})
+                    continue
+                if 'price' not in update and 'stock_count' not in update:
+                    results.append({"id": product_id, "status": "error", "message": "Nothing to update, send a price or a stock_count."})
+                    continue
+
+                change = {}
+                if 'price' in update:
+                    try:
+                        change['price'] = Decimal(str(update['price'])).quantize(Decimal('0.01'))
+                    except (InvalidOperation, ValueError):
+                        change['price'] = None
+                    if change['price'] is None or not change['price'].is_finite() or change['price'] < 1:
+                        results.append({"id": product_id, "status": "error", "message": "Price must be at least 1."})
+                        continue
+                if 'stock_count' in update:
+                    stock_count = update['stock_count']
+                    if isinstance(stock_count, bool) or not isinstance(stock_count, int) or stock_count < 0:
+                        results.append({"id": product_id, "status": "error", "message": "Stock count must be a non-negative integer."})
+                        continue
+                    change['stock_count'] = stock_count
+
+                changes[product_id] = change
+                results.append({"id": product_id, "status": "updated"})
+
+            # Lock the rows in id order so concurrent batches can not deadlock.
+            products = {
+                product.id: product
+                for product in Product.objects.select_for_update().filter(id__in=changes).order_by('id')
+                .only('id', 'price', 'stock_count', 'datedeleted')
+            }
+
+            now = timezone.now()
+            products_to_update = []
+            movements = []
+            for result in results:
+                if result["status"] != "updated":
+                    continue
+                product = products.get(result["id"])
+                if product is None or product.datedeleted is not None:
+                    result.update(status="error", message="Product not found.")
+                    continue
+                # The rows are locked, so the difference recorded in the ledger is exact.
+                if changes[product.id].get('stock_count', product.stock_count) != product.stock_count:
+                    movements.append(Inventorymovement(
+                        product_id=product.id, kind='adjustment', createdby=user_id,
+                        quantity=changes[product.id]['stock_count'] - product.stock_count
+                    ))
+                for field, value in changes[product.id].items():
+                    setattr(product, field, value)
+                product.updateby = user_id
+                product.dateupdated = now
+                products_to_update.append(product)
+
+            if products_to_update:
+                Product.objects.bulk_update(
+                    products_to_update, ['price', 'stock_count', 'updateby', 'dateupdated'], batch_size=1000
+                )
+                record_movements(movements)
+                invalidate_catalog()
+
+            return (True, results)
+
+    except Exception as e:
+        return (False, f"Error updating product data: {e}")
+
+
 def get_product_info(product_id):
     try:
         product = Product.objects.get(id = product_id)
         
-        category_ids = Productcategory.objects.filter(product_id=product_id).values_list('category_id', flat=True)
+        category_ids = Productcategory.objects.filter(product_id=product_id, datedeleted__isnull=True).values_list('category_id', flat=True)
         category_id_list = list(category_ids)
        
         product_info = {
@@ -0,0 +1,242 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Role, Category, Country, State, City
+
+
+VERSION_KEY = 'refdata:version'
+
+
+def _refdata_cache():
+    return caches[settings.REFDATA_CACHE_ALIAS]
+
+
+def _fresh_version():
+    # Like the catalog version, a counter that was evicted restarts from the current time in
+    # milliseconds so it can not fall back onto a version a worker already loaded.
+    return int(time.time() * 1000)
+
+
+def get_refdata_version():
+    """
+    Get the current version stamp of the reference data.
+    """
+    cache = _refdata_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _fresh_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_refdata_version():
+    """
+    Move the reference data to a new version so that every worker reloads it.
+    """
+    cache = _refdata_cache()
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, _fresh_version(), timeout=None)
+        version = cache.incr(VERSION_KEY)
+    refdata.expire()
+    return version
+
+
+def invalidate_refdata():
+    """
+    Bump the reference data version once the current transaction commits, like 'invalidate_catalog'.
+    """
+    transaction.on_commit(bump_refdata_version)
+
+
+def _load_snapshot():
+    """
+    Read the roles, categories, countries, states and cities with one query per table.
+
+    Returns:
+        dict: One dictionary per lookup. Names are keyed in lowercase, state names by country
+              and city names by state since they are only unique within their parent.
+    """
+    snapshot = {
+        "role_id": {}, "role_name": {},
+        "category_id": {}, "category_name": {},
+        "country_id": {}, "country_name": {},
+        "state_id": {}, "state_by_name": {}, "state_name": {}, "state_country": {},
+        "city_id": {}, "city_name": {}, "city_state": {},
+    }
+    for table, model in (("role", Role), ("category", Category), ("country", Country)):
+        for id, name in model.objects.order_by('id').values_list('id', 'name'):
+            snapshot[f"{table}_name"][id] = name
+            snapshot[f"{table}_id"].setdefault(name.lower(), id)
+    for id, name, country_id in State.objects.order_by('id').values_list('id', 'name', 'country_id'):
+        snapshot["state_name"][id] = name
+        snapshot["state_country"][id] = country_id
+        snapshot["state_id"].setdefault((country_id, name.lower()), id)
+        snapshot["state_by_name"].setdefault(name.lower(), id)
+    for id, name, state_id in City.objects.order_by('id').values_list('id', 'name', 'state_id'):
+        snapshot["city_name"][id] = name
+        snapshot["city_state"][id] = state_id
+        snapshot["city_id"].setdefault((state_id, name.lower()), id)
+    return snapshot
+
+
+# For every lookup, the query telling whether its key exists in the database.
+_EXISTS_QUERIES = {
+    "role_id": lambda name: Role.objects.filter(name__iexact=name),
+    "role_name": lambda id: Role.objects.filter(id=id),
+    "category_id": lambda name: Category.objects.filter(name__iexact=name),
+    "category_name": lambda id: Category.objects.filter(id=id),
+    "country_id": lambda name: Country.objects.filter(name__iexact=name),
+    "country_name": lambda id: Country.objects.filter(id=id),
+    "state_id": lambda key: State.objects.filter(country_id=key[0], name__iexact=key[1]),
+    "state_by_name": lambda name: State.objects.filter(name__iexact=name),
+    "state_name": lambda id: State.objects.filter(id=id),
+    "state_country": lambda id: State.objects.filter(id=id),
+    "city_id": lambda key: City.objects.filter(state_id=key[0], name__iexact=key[1]),
+    "city_name": lambda id: City.objects.filter(id=id),
+    "city_state": lambda id: City.objects.filter(id=id),
+}
+
+
+class ReferenceData:
+    """
+    Process-wide registry of the roles, categories, countries, states and cities.
+
+    These tables are small and almost never change, so every worker loads them once into
+    dictionaries and answers id, name and hierarchy lookups from memory. The create_* service
+    functions bump a version stamp kept in the REFDATA_CACHE_ALIAS cache when they commit. A
+    worker compares its loaded version with the stamp at most every REFDATA_CHECK_INTERVAL
+    seconds, and straight away when a lookup finds nothing, so a row just created by another
+    worker is found at once and a reload costs one query per table.
+
+    The stamp only reaches the other workers when that cache is shared by them. A lookup that still
+    finds nothing while the stamp is unchanged is therefore confirmed with one query, and the
+    worker reloads when the row does exist, so a per-process cache makes misses cost a query but
+    never hides a row.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._version = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def expire(self):
+        """
+        Make the next lookup of this process check the version stamp.
+        """
+        self._checked_at = 0
+
+    def _get_snapshot(self, check=False):
+        now = time.monotonic()
+        if self._snapshot is None or check or now - self._checked_at >= settings.REFDATA_CHECK_INTERVAL:
+            with self._lock:
+                version = get_refdata_version()
+                if self._snapshot is None or version != self._version:
+                    self._snapshot = _load_snapshot()
+                    self._version = version
+                self._checked_at = now
+        return self._snapshot
+
+    def _reload(self):
+        with self._lock:
+            version = get_refdata_version()
+            self._snapshot = _load_snapshot()
+            self._version = version
+            self._checked_at = time.monotonic()
+        return self._snapshot
+
+    def _lookup(self, table, key):
+        snapshot = self._get_snapshot()
+        value = snapshot[table].get(key)
+        if value is None:
+            checked_snapshot = self._get_snapshot(check=True)
+            value = checked_snapshot[table].get(key)
+            if value is None and checked_snapshot is snapshot and key is not None:
+                # The stamp did not move, make sure the row was not created by a worker it is not shared with.
+                try:
+                    exists = _EXISTS_QUERIES[table](key).exists()
+                except (TypeError, ValueError):
+                    exists = False
+                if exists:
+                    value = self._reload()[table].get(key)
+        return value
+
+    @staticmethod
+    def _name_key(name):
+        return name.lower() if isinstance(name, str) else None
+
+    def role_id(self, name):
+        return self._lookup("role_id", self._name_key(name))
+
+    def role_name(self, role_id):
+        return self._lookup("role_name", role_id)
+
+    def category_id(self, name):
+        return self._lookup("category_id", self._name_key(name))
+
+    def category_name(self, category_id):
+        return self._lookup("category_name", category_id)
+
+    def missing_category_ids(self, category_ids):
+        """
+        Get the IDs of a list that are not categories, in their order.
+        """
+        snapshot = self._get_snapshot()["category_name"]
+        if all(category_id in snapshot for category_id in category_ids):
+            return []
+        checked_snapshot = self._get_snapshot(check=True)["category_name"]
+        missing = [category_id for category_id in category_ids if category_id not in checked_snapshot]
+        if missing and checked_snapshot is snapshot:
+            # Like in '_lookup', confirm the miss against the database while the stamp did not move.
+            try:
+                found = Category.objects.filter(id__in=missing).exists()
+            except (TypeError, ValueError):
+                found = False
+            if found:
+                checked_snapshot = self._reload()["category_name"]
+                missing = [category_id for category_id in category_ids if category_id not in checked_snapshot]
+        return missing
+
+    def country_id(self, name):
+        return self._lookup("country_id", self._name_key(name))
+
+    def country_name(self, country_id):
+        return self._lookup("country_name", country_id)
+
+    def state_id(self, name, country_id=None):
+        """
+        Get the ID of a state by name, within a country when given.
+        """
+        if country_id is None:
+            return self._lookup("state_by_name", self._name_key(name))
+        return self._lookup("state_id", (country_id, self._name_key(name)))
+
+    def state_name(self, state_id):
+        return self._lookup("state_name", state_id)
+
+    def state_country(self, state_id):
+        """
+        Get the ID of the country of a state, or None if the state does not exist.
+        """
+        return self._lookup("state_country", state_id)
+
+    def city_id(self, name, state_id):
+        return self._lookup("city_id", (state_id, self._name_key(name)))
+
+    def city_name(self, city_id):
+        return self._lookup("city_name", city_id)
+
+    def city_state(self, city_id):
+        """
+        Get the ID of the state of a city, or None if the city does not exist.
+        """
+        return self._lookup("city_state", city_id)
+
+
+refdata = ReferenceData()
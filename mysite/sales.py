@@ -0,0 +1,233 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum, Count, F, Case, When, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Orderitem, Productcategory, Productsales, Categorysales, Dailysales
+
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FIELDS = ['units', 'revenue', 'order_count', 'cancellations']
+
+# For every report: the rollup model and the field it is grouped on (None for the daily totals).
+REPORTS = {
+    "day": (Dailysales, None),
+    "product": (Productsales, 'product_id'),
+    "category": (Categorysales, 'category_id'),
+}
+
+
+def _empty_changes():
+    return {"units": Decimal('0'), "revenue": Decimal('0'), "order_count": 0, "cancellations": 0}
+
+
+def _apply_rollup_changes(model, key_field, day, changes):
+    """
+    Add the changes to the rollup rows of one day, creating the missing rows.
+
+    Args:
+        model (Model): Productsales, Categorysales or Dailysales.
+        key_field (str): 'product_id', 'category_id' or None for the daily totals.
+        day (date): The day of the rows.
+        changes (dict): The changes of every field by product or category ID (None for the daily totals).
+
+    The rows are created if needed with one insert ignoring conflicts, then changed in place with a
+    single 'UPDATE ... SET units = units + CASE product_id WHEN ... END, ...', so an order costs two
+    queries per rollup table and the rows are never read or locked before they are written.
+    """
+    if not changes:
+        return
+    model.objects.bulk_create(
+        [model(day=day, **({key_field: key} if key_field else {})) for key in changes],
+        ignore_conflicts=True
+    )
+    rows = model.objects.filter(day=day)
+    if key_field:
+        rows = rows.filter(**{f"{key_field}__in": list(changes)})
+
+    updates = {}
+    for field in ROLLUP_FIELDS:
+        # Fields that do not change for any row are left out, e.g. the cancellations of a placed order.
+        if not any(row_changes[field] for row_changes in changes.values()):
+            continue
+        output_field = model._meta.get_field(field)
+        if key_field:
+            change = Case(
+                *[When(**{key_field: key}, then=Value(row_changes[field])) for key, row_changes in changes.items()],
+                default=Value(0),
+                output_field=output_field
+            )
+        else:
+            change = Value(changes[None][field], output_field=output_field)
+        updates[field] = F(field) + change
+    rows.update(dateupdate=timezone.now(), **updates)
+
+
+def record_order_sales(order, cancelled=False):
+    """
+    Add a placed order to the sales rollups, or move a cancelled one out of them.
+
+    Args:
+        order (Order): The order that was just placed, or cancelled after being placed.
+        cancelled (bool, optional): If True the order's units, revenue and order count are taken
+                                    out of the rollups of the day it was placed and counted as
+                                    a cancellation instead.
+
+    Categories are those the products are linked to when the order is placed or cancelled.
+
+    The changes are computed inside the order's transaction but written to the rollups in their own
+    short transaction once it commits. Every checkout of a day changes the same Dailysales row, so
+    writing it in the order's transaction would serialize all the checkouts until they commit. The
+    trade-off is that a process dying between the two commits, or the rollup write failing, leaves
+    that order out of the rollups until 'rebuild_sales_rollups' runs. A failed write is logged
+    instead of raised, the order is already committed and its response must not turn into an error.
+    """
+    sign = -1 if cancelled else 1
+    day = timezone.localdate(order.order_date)
+    items = list(Orderitem.objects.filter(order_id=order.id).values('product_id', 'qty', 'total_amount'))
+    categories = {}
+    links = Productcategory.objects.filter(
+        product_id__in=[item['product_id'] for item in items], datedeleted__isnull=True
+    ).values_list('product_id', 'category_id')
+    for product_id, category_id in links:
+        categories.setdefault(product_id, set()).add(category_id)
+
+    product_changes = {}
+    category_changes = {}
+    daily_changes = {None: _empty_changes()}
+    for item in items:
+        rollups = [product_changes.setdefault(item['product_id'], _empty_changes()), daily_changes[None]]
+        for category_id in categories.get(item['product_id'], ()):
+            rollups.append(category_changes.setdefault(category_id, _empty_changes()))
+        for changes in rollups:
+            changes["units"] += sign * item['qty']
+            changes["revenue"] += sign * item['total_amount']
+
+    # An order counts once for every product, category and day it touches.
+    for changes in [*product_changes.values(), *category_changes.values(), *daily_changes.values()]:
+        changes["order_count"] += sign
+        if cancelled:
+            changes["cancellations"] += 1
+
+    def apply_changes():
+        try:
+            with transaction.atomic():
+                _apply_rollup_changes(Productsales, 'product_id', day, product_changes)
+                _apply_rollup_changes(Categorysales, 'category_id', day, category_changes)
+                _apply_rollup_changes(Dailysales, None, day, daily_changes)
+        except Exception:
+            logger.exception(
+                "Could not add order %s to the sales rollups, run 'rebuild_sales_rollups' to repair them.", order.id
+            )
+
+    transaction.on_commit(apply_changes)
+
+
+@transaction.atomic
+def rebuild_sales_rollups():
+    """
+    Recompute all the sales rollups from the orders.
+
+    Returns:
+        dict: The number of product, category and daily rows written.
+
+    Placed and delivered orders give the units, revenue and order counts, cancelled orders that
+    had been placed (they have an order date) give the cancellations. Categories are the current
+    live links of the products.
+    """
+    sold = Orderitem.objects.filter(order__status__in=['Placed', 'Delivered']).annotate(
+        day=TruncDate('order__order_date')
+    )
+    cancelled = Orderitem.objects.filter(order__status='Cancelled', order__order_date__isnull=False).annotate(
+        day=TruncDate('order__order_date')
+    )
+    live_links = {
+        'product__productcategory__datedeleted__isnull': True,
+        'product__productcategory__isnull': False,
+    }
+
+    rollups = {
+        "product": (Productsales, 'product_id', sold, cancelled),
+        "category": (
+            Categorysales, 'category_id',
+            sold.filter(**live_links).annotate(category_id=F('product__productcategory__category_id')),
+            cancelled.filter(**live_links).annotate(category_id=F('product__productcategory__category_id')),
+        ),
+        "day": (Dailysales, None, sold, cancelled),
+    }
+
+    written = {}
+    for name, (model, key_field, sold_items, cancelled_items) in rollups.items():
+        group_fields = ['day', key_field] if key_field else ['day']
+        rows = {}
+        for row in sold_items.values(*group_fields).annotate(
+            units=Sum('qty'), revenue=Sum('total_amount'), order_count=Count('order_id', distinct=True)
+        ).order_by():
+            rows[tuple(row[field] for field in group_fields)] = row
+        for row in cancelled_items.values(*group_fields).annotate(
+            cancellations=Count('order_id', distinct=True)
+        ).order_by():
+            rows.setdefault(tuple(row[field] for field in group_fields), {}).update(row)
+
+        model.objects.all().delete()
+        now = timezone.now()
+        model.objects.bulk_create([
+            model(
+                **{field: row[field] for field in group_fields},
+                units=row.get('units') or 0,
+                revenue=row.get('revenue') or 0,
+                order_count=row.get('order_count', 0),
+                cancellations=row.get('cancellations', 0),
+                dateupdate=now,
+            )
+            for row in rows.values()
+        ], batch_size=1000)
+        written[name] = len(rows)
+    return written
+
+
+def get_sales_report(group, date_from=None, date_to=None):
+    """
+    Get the sales of a date range from the rollups.
+
+    Args:
+        group (str): 'day' for one row per day, 'product' or 'category' for one row per product or
+                     category over the whole range, best selling first.
+        date_from (str, optional): First day of the range (YYYY-MM-DD), SALES_REPORT_DAYS before 'date_to' by default.
+        date_to (str, optional): Last day of the range (YYYY-MM-DD), today by default.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either a dictionary with the
+               range and the report 'rows', or an error message.
+
+    A report reads at most one rollup row per day and product or category, never the orders.
+    """
+    if group not in REPORTS:
+        return (False, f"Unknown report '{group}', choose one of: {', '.join(REPORTS)}.")
+    model, key_field = REPORTS[group]
+
+    try:
+        day_to = parse_date(date_to) if date_to else timezone.localdate()
+        day_from = parse_date(date_from) if date_from else day_to - timedelta(days=settings.SALES_REPORT_DAYS - 1)
+    except (TypeError, ValueError):
+        day_from = day_to = None
+    if day_from is None or day_to is None:
+        return (False, "from and to must be dates (YYYY-MM-DD).")
+
+    rows = model.objects.filter(day__gte=day_from, day__lte=day_to)
+    if key_field:
+        rows = rows.values(key_field).annotate(
+            units=Sum('units'), revenue=Sum('revenue'),
+            order_count=Sum('order_count'), cancellations=Sum('cancellations')
+        ).order_by('-revenue', key_field)
+    else:
+        rows = rows.values('day', *ROLLUP_FIELDS).order_by('day')
+
+    return (True, {"from": day_from, "to": day_to, "rows": list(rows)})
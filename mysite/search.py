@@ -0,0 +1,251 @@
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, Case, When, Value, FloatField, ExpressionWrapper
+
+from .models import Product
+from .catalog_cache import catalog_cache_enabled, get_product_text_version
+from .utils.pagination import get_page_size
+
+
+# The document searched on PostgreSQL. It must stay identical to the expression of the GIN index
+# created in migration 0030_product_search_index, otherwise the planner can not use the index.
+SEARCH_DOCUMENT_SQL = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+# Matches on the name count more than matches on the description, like the 'A'/'B' weights above.
+NAME_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """
+    Split a text into the lowercase terms used by the in-process index.
+    """
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+class InvertedIndex:
+    """
+    In-process inverted index over product names and descriptions.
+
+    Used instead of the PostgreSQL full-text index when the database is not PostgreSQL (e.g. sqlite
+    test runs). Every term maps to the products containing it and the weighted term frequency, and
+    results are ranked with tf-idf. A query matches products containing all of its terms. Prices
+    change with every bulk update, so they are not indexed but read for the returned page only.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.products = {}
+
+    def add(self, product_id, name, description):
+        self.remove(product_id)
+        weights = defaultdict(float)
+        for term in tokenize(name):
+            weights[term] += NAME_WEIGHT
+        for term in tokenize(description):
+            weights[term] += DESCRIPTION_WEIGHT
+        for term, weight in weights.items():
+            self.postings[term][product_id] = weight
+        self.products[product_id] = {
+            "id": product_id,
+            "name": name,
+            "description": description,
+            "terms": tuple(weights),
+        }
+
+    def remove(self, product_id):
+        product = self.products.pop(product_id, None)
+        if product is None:
+            return
+        for term in product["terms"]:
+            postings = self.postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self.postings[term]
+
+    def search(self, query, offset, limit):
+        """
+        Return the ranked products matching all the terms of the query.
+
+        Returns:
+            list: At most 'limit' products starting at 'offset', best match first.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        # Intersect the posting lists starting from the rarest term.
+        postings = sorted((self.postings.get(term, {}) for term in terms), key=len)
+        if not postings[0]:
+            return []
+        matches = set(postings[0])
+        for posting in postings[1:]:
+            matches.intersection_update(posting)
+            if not matches:
+                return []
+
+        total_products = len(self.products)
+        scores = {}
+        for posting in postings:
+            idf = math.log(1 + total_products / len(posting))
+            for product_id in matches:
+                scores[product_id] = scores.get(product_id, 0.0) + posting[product_id] * idf
+
+        ranked = sorted(matches, key=lambda product_id: (-scores[product_id], product_id))
+        results = []
+        for product_id in ranked[offset:offset + limit]:
+            product = self.products[product_id]
+            results.append({
+                "id": product["id"],
+                "name": product["name"],
+                "description": product["description"],
+                "rank": round(scores[product_id], 6),
+            })
+        return results
+
+
+_index = None
+_index_version = None
+_build_lock = threading.Lock()
+
+
+def _get_inverted_index():
+    """
+    Get the in-process index, rebuilding it when the product text version has moved since it
+    was built. Stock and price changes do not move that version, so order traffic does not
+    rebuild the index.
+
+    The new index is built outside of any lock readers wait on and then swapped in. While one
+    thread rebuilds it, the other searches keep using the previous index, only the very first
+    build of the worker is waited for.
+    """
+    global _index, _index_version
+    version = get_product_text_version()
+    if _index is not None and _index_version == version:
+        return _index
+    if not _build_lock.acquire(blocking=_index is None):
+        return _index
+    try:
+        if _index is None or _index_version != version:
+            index = InvertedIndex()
+            live_products = Product.objects.filter(datedeleted__isnull=True).values_list('id', 'name', 'description')
+            for product_id, name, description in live_products.iterator(chunk_size=2000):
+                index.add(product_id, name, description)
+            _index, _index_version = index, version
+    finally:
+        _build_lock.release()
+    return _index
+
+
+def _search_database(query, offset, limit):
+    """
+    Search without the in-process index, with one unindexed query.
+
+    Used when the catalog cache is not shared by the workers: the product text version would only
+    move in the worker that changed a product, and the indexes of the other workers would stay stale.
+    Every term must be found in the name or the description, name matches rank first like in the index.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    products = Product.objects.filter(datedeleted__isnull=True)
+    rank = Value(0.0)
+    for term in terms:
+        products = products.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        rank = rank + Case(When(name__icontains=term, then=Value(NAME_WEIGHT)), default=Value(0.0)) \
+            + Case(When(description__icontains=term, then=Value(DESCRIPTION_WEIGHT)), default=Value(0.0))
+    products = products.annotate(rank=ExpressionWrapper(rank, output_field=FloatField())).order_by('-rank', 'id')
+    return list(products.values('id', 'name', 'description', 'price', 'rank')[offset:offset + limit])
+
+
+def _search_inverted_index(query, offset, limit):
+    results = _get_inverted_index().search(query, offset, limit)
+    # The current prices of the page, in one query.
+    prices = dict(Product.objects.filter(id__in=[result["id"] for result in results]).values_list('id', 'price'))
+    return [
+        {
+            "id": result["id"],
+            "name": result["name"],
+            "description": result["description"],
+            "price": prices.get(result["id"]),
+            "rank": result["rank"],
+        }
+        for result in results
+    ]
+
+
+def _search_postgresql(query, offset, limit):
+    sql = f"""
+        SELECT id, name, description, price, ts_rank_cd({SEARCH_DOCUMENT_SQL}, query) AS rank
+        FROM {Product._meta.db_table}, plainto_tsquery('english', %s) query
+        WHERE ({SEARCH_DOCUMENT_SQL}) @@ query AND datedeleted IS NULL
+        ORDER BY rank DESC, id
+        LIMIT %s OFFSET %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [query, limit, offset])
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def search_products(query, page=None, page_size=None):
+    """
+    Search the live products by name and description.
+
+    Args:
+        query (str): The words to search for.
+        page (str or int, optional): The 1-based page of results wanted.
+        page_size (str or int, optional): The number of results per page.
+
+    Returns:
+        tuple: A tuple containing a boolean indicating success and either the page of ranked
+               results or an error message.
+
+    On PostgreSQL the search runs against the GIN indexed tsvector of the product, anywhere else
+    it is answered from the in-process inverted index, or with a plain query when the catalog
+    cache is not shared and the index could not be kept current.
+    """
+    query = (query or '').strip()
+    if not query:
+        return (False, "Please enter a search term.")
+
+    try:
+        page_size = get_page_size(page_size, settings.CATALOG_PAGE_SIZE, settings.CATALOG_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return (False, str(e))
+
+    try:
+        page = int(page) if page not in (None, '') else 1
+    except ValueError:
+        page = 0
+    if page <= 0:
+        return (False, "page must be a positive integer.")
+
+    try:
+        offset = (page - 1) * page_size
+        # One extra row tells if there is a next page.
+        if connection.vendor == 'postgresql':
+            results = _search_postgresql(query, offset, page_size + 1)
+        elif not catalog_cache_enabled():
+            results = _search_database(query, offset, page_size + 1)
+        else:
+            results = _search_inverted_index(query, offset, page_size + 1)
+
+        return (True, {
+            "results": results[:page_size],
+            "page": page,
+            "has_more": len(results) > page_size,
+        })
+
+    except Exception as e:
+        return (False, f"Error searching products: {e}")
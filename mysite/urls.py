@@ -3,18 +3,30 @@ from . import views
 
 urlpatterns = [
     path('', views.grocery_store, name='grocery_store'),
+    path('products', views.browse_products, name='browse_products'),
+    path('search', views.search, name='search'),
+    path('autocomplete', views.autocomplete, name='autocomplete'),
     path('productview/<int:product_id>/', views.product_view, name='product_view'),
     path('viewcart/', views.view_cart, name='view_cart'),
+    path('orders', views.view_orders, name='view_orders'),
+    path('catalog_cache_stats/', views.catalog_cache_stats, name='catalog_cache_stats'),
     path('viewaddedproducts/', views.view_added_products, name='view_added_products'),
     path('view_product_orders/<str:encoded_product_id>/', views.view_product_orders, name='view_product_orders'),
+    path('stock_history/<int:product_id>/', views.stock_history, name='stock_history'),
+    path('export/<str:kind>/', views.export_data, name='export_data'),
+    path('reports/sales/<str:group>/', views.sales_report, name='sales_report'),
     path('signup', views.signup, name='signup'),
     path('login', views.login, name='login'),
     path('addtocart', views.addtocart, name='addtocart'),
+    path('addtocart_batch', views.addtocart_batch, name='addtocart_batch'),
     path('add_address', views.add_address, name='add_address'),
     path('update_user_info', views.update_user_info, name='update_user_info'),
     path('update_user_address', views.update_user_address, name='update_user_address'),
     path('update_order', views.update_order, name='update_order'),
+    path('checkout_jobs/<str:job_id>/', views.checkout_job_status, name='checkout_job_status'),
     path('update_product', views.update_product, name='update_product'),
+    path('bulk_update_products', views.bulk_update_product, name='bulk_update_products'),
     path('addproduct', views.addproduct, name='addproduct'),
+    path('delete_product/<int:product_id>/', views.remove_product, name='remove_product'),
     # Define other app-specific URL patterns here if needed
 ]
\ No newline at end of file
@@ -6,6 +6,8 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
 from .models import User
+from .authentication import set_role_version
+from .refdata import refdata, invalidate_refdata
 
 
 @transaction.atomic
@@ -42,9 +44,8 @@ def create_user(first_name, middle_name, last_name,email, phone_no, password):
             # Check if the role_id exists in the Role model
 
 
-            try:
-                role = Role.objects.get(name="customer")  # Adjust the criteria as needed
-            except Role.DoesNotExist:
+            role_id = refdata.role_id("customer")  # Adjust the criteria as needed
+            if role_id is None:
                 return (False, "Role for 'customer' does not exist.")
 
             user= User(
@@ -53,7 +54,7 @@ def create_user(first_name, middle_name, last_name,email, phone_no, password):
                 last_name=last_name,
                 email=email.lower(),
                 phone_no=phone_no,
-                role =role ,
+                role_id =role_id ,
                 password=make_password(password),
             )
 
@@ -112,6 +113,7 @@ def create_role(role_name):
     try:
         role_name = role_name.lower()
         role = Role.objects.create(name=role_name, datecreate=timezone.now())
+        invalidate_refdata()
         print(f"Role created with roleid: {role.id}, rolename: {role.name}")
         return (True, role.id, role.name)
 
@@ -131,13 +133,14 @@ def create_country(country_name):
             normalized_country_name = country_name.lower()
 
             # Check if a category with the same name already exists.
-            if Country.objects.filter(name__iexact=normalized_country_name).exists():
+            if refdata.country_id(normalized_country_name) is not None:
                 error_message = "Country with the same name already exists."
                 return (False, error_message)
 
             # Create the category and save it to the database.
             country = Country(name=country_name)
             country.save()
+            invalidate_refdata()
             return (True, country.id)
 
     except Exception as e:
@@ -153,20 +156,20 @@ def create_state(state_name, country_name):
             normalized_country_name = country_name.lower()
 
             # Check if a country with the same name exists.
-            try:
-                country = Country.objects.get(name__iexact=normalized_country_name)
-            except Country.DoesNotExist:
+            country_id = refdata.country_id(normalized_country_name)
+            if country_id is None:
                 error_message = "Country does not exist in the database."
                 return (False, error_message)
 
             # Check if a category with the same name already exists.
-            if State.objects.filter(name__iexact=normalized_state_name).exists():
+            if refdata.state_id(normalized_state_name) is not None:
                 error_message = "State with the same name already exists."
                 return (False, error_message)
 
             # Create the category and save it to the database.
-            state = State(name=state_name, country=country)
+            state = State(name=state_name, country_id=country_id)
             state.save()
+            invalidate_refdata()
             return (True, state.id)
 
     except Exception as e:
@@ -181,41 +184,145 @@ def create_city(city_name, state_name):
             normalized_state_name = state_name.lower()
 
             # Check if a state with the same name exists.
-            try:
-                state = State.objects.get(name__iexact=normalized_state_name)
-                print(state)
-                
-            except State.DoesNotExist:
+            state_id = refdata.state_id(normalized_state_name)
+            if state_id is None:
                 error_message = "State does not exist in the database."
                 return (False, error_message)
 
-            # Check if a city with the same name already exists in the database.
-            existing_city = City.objects.filter(name__iexact=normalized_city_name,state__name__iexact=normalized_state_name)
-            print(existing_city )
-            city_with_same_name = existing_city.first() # Get the first matching city
-
-            if city_with_same_name:
-                # Check if the existing city has a different state.
-                if city_with_same_name.state != state:
-                    # If the city with the same name has a different state, create a new city.
-                    city = City(name=city_name, state=state)
-                    city.save()
-                    return (True, city.id)
-                else:
-                    error_message = "City with the same name already exists for the same state."
-                    return (False, error_message)
+            # Cities with the same name may exist in other states, but only once per state.
+            if refdata.city_id(normalized_city_name, state_id) is not None:
+                error_message = "City with the same name already exists for the same state."
+                return (False, error_message)
 
-            else:            
-                # Create the city and associate it with the state.
-                city = City(name=city_name, state=state)
-                city.save()
-                return (True, city.id)
+            # Create the city and associate it with the state.
+            city = City(name=city_name, state_id=state_id)
+            city.save()
+            invalidate_refdata()
+            return (True, city.id)
 
     except Exception as e:
         error_message = f"Error: {e}"
         return (False, error_message)        
 
 
+def _existing_ids(model, parent_field, keys):
+    """
+    Map the (parent id, lowercase name) keys that already exist in a geography table to their IDs.
+
+    Args:
+        model (Model): Country, State or City.
+        parent_field (str): 'country_id' for states, 'state_id' for cities, None for countries.
+        keys (set): The (parent id, lowercase name) keys wanted, parent id is None for countries.
+
+    States and cities are read with one query on their parents (an indexed foreign key), the
+    names are compared in Python so the case folding is the same on every database backend.
+    """
+    rows = model.objects.order_by('id')
+    if parent_field:
+        rows = rows.filter(**{f"{parent_field}__in": {parent_id for parent_id, _ in keys}})
+    existing = {}
+    for row in rows.values('id', 'name', *([parent_field] if parent_field else [])):
+        key = (row[parent_field] if parent_field else None, row['name'].lower())
+        if key in keys:
+            existing.setdefault(key, row['id'])
+    return existing
+
+
+def _insert_missing(model, parent_field, names, known_ids):
+    """
+    Insert the rows of a geography table that do not exist yet and add all their IDs to 'known_ids'.
+
+    Args:
+        names (dict): The name to store for every (parent id, lowercase name) key.
+        known_ids (dict): The IDs already known by key, updated in place.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    keys = {key for key in names if key not in known_ids}
+    if not keys:
+        return 0
+    known_ids.update(_existing_ids(model, parent_field, keys))
+    missing = [key for key in keys if key not in known_ids]
+    if not missing:
+        return 0
+    model.objects.bulk_create(
+        [model(name=names[key], **({parent_field: key[0]} if parent_field else {})) for key in missing],
+        batch_size=1000
+    )
+    # Read the new IDs back, bulk_create does not return them on every database backend.
+    known_ids.update(_existing_ids(model, parent_field, set(missing)))
+    return len(missing)
+
+
+def bulk_load_geography(rows, known_ids=None):
+    """
+    Insert the countries, states and cities of a chunk of rows that do not exist yet, in a single transaction.
+
+    Args:
+        rows (list): (row number, row) pairs, every row holding a 'country', 'state' and 'city' name.
+        known_ids (dict, optional): IDs already resolved by earlier chunks, keyed by 'country' and
+                                    'state' (updated in place), so they are not looked up again.
+
+    Returns:
+        tuple: A dictionary with the number of countries, states and cities inserted, and a list of
+               (row number, error message) pairs for the rows that were skipped.
+
+    Names are matched case-insensitively, states within their country and cities within their
+    state, and a name is stored as it is first seen. Every level costs at most three queries per
+    chunk: one to find the existing rows, one bulk insert of the missing ones and one to read
+    their IDs back, instead of several queries per row. There is no unique constraint on the
+    names, so loads must not run concurrently with each other.
+    """
+    if known_ids is None:
+        known_ids = {}
+    countries = known_ids.setdefault('country', {})
+    states = known_ids.setdefault('state', {})
+
+    max_lengths = {field: model._meta.get_field('name').max_length for field, model in (('country', Country), ('state', State), ('city', City))}
+    errors = []
+    cleaned_rows = []
+    for row_number, row in rows:
+        names = {field: (row.get(field) or '').strip() for field in ('country', 'state', 'city')}
+        empty_fields = [field for field, name in names.items() if not name]
+        long_fields = [field for field, name in names.items() if len(name) > max_lengths[field]]
+        if empty_fields:
+            errors.append((row_number, f"Missing {', '.join(empty_fields)}."))
+        elif long_fields:
+            errors.append((row_number, f"The {long_fields[0]} name is longer than {max_lengths[long_fields[0]]} characters."))
+        else:
+            cleaned_rows.append(names)
+
+    inserted = {"countries": 0, "states": 0, "cities": 0}
+    if not cleaned_rows:
+        return (inserted, errors)
+
+    with transaction.atomic():
+        country_names = {}
+        for names in cleaned_rows:
+            country_names.setdefault((None, names['country'].lower()), names['country'])
+        inserted["countries"] = _insert_missing(Country, None, country_names, countries)
+
+        state_names = {}
+        for names in cleaned_rows:
+            country_id = countries[(None, names['country'].lower())]
+            state_names.setdefault((country_id, names['state'].lower()), names['state'])
+        inserted["states"] = _insert_missing(State, 'country_id', state_names, states)
+
+        # Cities are not kept between chunks, a national dataset has too many of them.
+        city_names = {}
+        for names in cleaned_rows:
+            country_id = countries[(None, names['country'].lower())]
+            state_id = states[(country_id, names['state'].lower())]
+            city_names.setdefault((state_id, names['city'].lower()), names['city'])
+        inserted["cities"] = _insert_missing(City, 'state_id', city_names, {})
+
+        if any(inserted.values()):
+            invalidate_refdata()
+
+    return (inserted, errors)
+
+
 
 def update_user(user_id, **kwargs):
     """
@@ -294,27 +401,42 @@ def update_user(user_id, **kwargs):
         error_message = f"Error updating user data: {e}"
         return (False, error_message)
 
+@transaction.atomic
 def update_role(user_id, new_role_id):
     try:
-        # Retrieve the user by user_id
-        user = User.objects.get(pk=user_id)
+        # Retrieve the user by user_id, locked so concurrent role changes get distinct versions
+        user = User.objects.select_for_update().get(pk=user_id)
 
-        try:
-            # Retrieve the new role by role_id
-            new_role = Role.objects.get(id=new_role_id)
+        # Check the new role exists
+        if refdata.role_name(new_role_id) is None:
+            return (False, 'Role does not exist.')  # Role with the given ID does not exist
 
-            # Update the user's role
-            user.role = new_role
+        # Update the user's role, the new version makes the tokens issued with the old role stale
+        user.role_id = new_role_id
+        user.role_version += 1
 
-            # Save the updated user
-            user.save()
+        # Save the updated user
+        user.save()
+        transaction.on_commit(lambda: set_role_version(user.id, user.role_version))
 
-            return (True, "Role updated.")  # Role updated successfully
-        except Role.DoesNotExist:
-            return (False, 'Role does not exist.')  # Role with the given ID does not exist
+        return (True, "Role updated.")  # Role updated successfully
     except User.DoesNotExist:
         return (False, 'User does not exist.')  # User with the given ID does not exist
 
+def _parse_isdefault(value):
+    """
+    Read the 'isdefault' flag of an address, sent as a boolean or as "true"/"false".
+
+    Returns:
+        bool or None: The flag, or None if the value is not a boolean.
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        return value.strip().lower() == "true"
+    return None
+
+
 def create_address(user_id, country_id, state_id, city_id, pincode, address, isdefault):
     """
     Create a new address entry in the 'Address' model.
@@ -326,63 +448,53 @@ def create_address(user_id, country_id, state_id, city_id, pincode, address, isd
         city_id (int): The ID of the city for the address.
         pincode (str): The pincode of the address.
         address (str): The detailed address information.
-        isdefault (bool): Indicates whether the address is the default address for the user.
+        isdefault (bool or str): Indicates whether the address is the default address for the user.
 
     Returns:
         tuple: A tuple containing a boolean indicating success and a message.
 
-    This function inserts a new address entry into the 'Address' model with the specified details,
-    including the associated user, country, state, city, pincode, and address information.
-    It also handles updating the default address flag if necessary and checks for errors,
-    including foreign key constraint violations. If the address is created successfully,
-    it returns the address ID, otherwise, it returns None.
+    The country, state and city are checked against each other from the in-memory geography of the
+    reference data registry, so adding an address costs one query to check the user exists, one
+    UPDATE to unset the previous default address when the new one is the default, and the insert.
     """
+    isdefault = _parse_isdefault(isdefault)
+    if isdefault is None:
+        return (False, "isdefault must be true or false.")
 
-
+    # Check the country, state and city exist and belong together
     try:
-        with transaction.atomic():
-        # Check if there is already any default address in the table for the user
-            if isdefault:
-                existing_default_address = Address.objects.filter(user__id=user_id, isdefault=True).first()
-                if existing_default_address:
-                    # Update the existing default address to set isdefault to False
-                    existing_default_address.isdefault = False
-                    existing_default_address.save()
+        country_id, state_id, city_id = int(country_id), int(state_id), int(city_id)
+    except (TypeError, ValueError):
+        country_id = state_id = city_id = None
+    if refdata.country_name(country_id) is None or refdata.state_country(state_id) is None or refdata.city_state(city_id) is None:
+        error_message = f"Any of the ids that you have mentioned for for city, state and country do not exists. Please try again."
+        return (False, error_message)
 
+    if refdata.state_country(state_id) != country_id:
+        # Handle the case where the state with the specified id does not exist for the specified country
+        error_message = "The state with the specified id does not exist for the specified country."
+        return (False, error_message)
 
-            # Retrieve the related objects using their IDs
-            try:
-                user = User.objects.get(id=user_id)
-                country = Country.objects.get(id=country_id)
-                state = State.objects.get(id=state_id)
-                city = City.objects.get(id=city_id)
-            except ObjectDoesNotExist as e:
-                # Handle the case where the related objects do not exist
-                error_message = f"Any of the ids that you have mentioned for for city, state and country do not exists. Please try again."
-                return (False, error_message)
+    if refdata.city_state(city_id) != state_id:
+        # Handle the case where the city with the specified id does not exist for the specified state
+        error_message = "The city with the specified id does not exist for the specified State."
+        return (False, error_message)
 
-            # Check if the specified country_id matches the country_id in the State table
-            try:
-                state = State.objects.get(id=state_id, country=country)
-            except State.DoesNotExist:
-                # Handle the case where the state with the specified id does not exist for the specified country
-                error_message = "The state with the specified id does not exist for the specified country."
-                return (False, error_message)
+    try:
+        with transaction.atomic():
+            if not User.objects.filter(id=user_id).exists():
+                return (False, "User does not exist.")
+
+            # Unset the user's current default address, if any, with a single UPDATE
+            if isdefault:
+                Address.objects.filter(user_id=user_id, isdefault=True).update(isdefault=False, dateupdate=timezone.now())
 
-            # Check if the specified country_id matches the country_id in the State table
-            try:
-                city = City.objects.get(id=city_id, state=state)
-            except City.DoesNotExist:
-                # Handle the case where the state with the specified id does not exist for the specified country
-                error_message = "The city with the specified id does not exist for the specified State."
-                return (False, error_message)                
-            
             # Create a new Address object with related objects
             new_address = Address(
-                user=user,
-                country=country,
-                state=state,
-                city=city,
+                user_id=user_id,
+                country_id=country_id,
+                state_id=state_id,
+                city_id=city_id,
                 pincode=pincode,
                 address=address,
                 isdefault=isdefault,
@@ -425,6 +537,7 @@ def update_address(user_id, address_id, **kwargs):
     Update address information in the 'Address' model.
 
     Args:
+        user_id (int): The ID of the user the address must belong to.
         address_id (int): The ID of the address to be updated.
         **kwargs: Keyword arguments representing fields to update and their new values.
 
@@ -432,60 +545,41 @@ def update_address(user_id, address_id, **kwargs):
         Fields to update and their new values. Possible fields include:
         - pincode (str): The postal code or PIN code of the address.
         - address (str): The street address or location.
-        - isdefault (bool): Whether the address should be set as the default address for the user.
+        - isdefault (bool or str): Whether the address should be set as the default address for the user.
 
     Returns:
         tuple: A tuple containing a boolean indicating success and a message.
 
-    This function allows for the update of various address information fields in the 'Address' model.
-    It supports updating the country ID, state ID, city ID, pincode, address, and isdefault flag.
-    If the 'isdefault' flag is set to True, it will update the default address for the user.
-    The function returns a tuple indicating whether the update was successful and a message.
+    The country, state and city can not be changed, a new address has to be made instead. The
+    address is updated with one UPDATE that also checks it belongs to the user, and making it the
+    default address unsets the previous default with one more conditional UPDATE.
     """
+    changes = {}
+    for field, value in kwargs.items():
+        if field == 'isdefault':
+            changes['isdefault'] = _parse_isdefault(value)
+            if changes['isdefault'] is None:
+                return (False, "isdefault must be true or false.")
+        elif field in ('pincode', 'address'):
+            changes[field] = value
+        else:
+            return (False, "Sorry! You can not update state, city or country. Please make a new address.")
+
     try:
-        #breakpoint()
         with transaction.atomic():
-        
-        # Check if the address exists and is associated with the user
-            address = Address.objects.get(id=address_id, user__id=user_id)
+            now = timezone.now()
 
-            # Update address fields based on keyword arguments
-            for field, value in kwargs.items():
+            # Update the address only if it is associated with the user
+            if not Address.objects.filter(id=address_id, user_id=user_id).update(dateupdate=now, **changes):
+                error_message = f"Address with ID {address_id} does not exist or is not associated with the user."
+                return (False, error_message)
 
-                #if field == "state_id" or field == "city_id" or field == "country_id":
-                    #return(False, "Sorry! You can not update state, city or country. Please make a new address.")
-                if field == 'isdefault':
-                    print("is default wala block")
-                    if value == "True":
-                        existing_default_address = Address.objects.filter(user__id=user_id, isdefault=True).exclude(id=address_id).first()
-                        print("existing default address",existing_default_address )
-                        if existing_default_address:
-                            print("is existing default address wala block")
-                            if existing_default_address.id != address_id:
-                                print("is existing default address wala block 2")
-                                # Update the existing default address to set isdefault to False
-                                existing_default_address.isdefault = False
-                                existing_default_address.save()
-                        address.isdefault = True
-                        print("make address default true")
-                        address.save()
-                                
-                    # If the user wants to make this address as not a default address.
-                    else:
-                        # Make the address isdefault value False.
-                        address.isdefault = False
-                        
-                else:
-                    setattr(address, field, value)
+            # Unset any other default address of the user
+            if changes.get('isdefault'):
+                Address.objects.filter(user_id=user_id, isdefault=True).exclude(id=address_id).update(isdefault=False, dateupdate=now)
 
-            address.dateupdate = timezone.now()
-            address.save()
             return (True, 'Address info is updated.')
 
-    except Address.DoesNotExist:
-        error_message = f"Address with ID {address_id} does not exist or is not associated with the user."
-        return (False, error_message)
-
     except Exception as e:
         error_message = f"Error updating address data: {e}"
         return (False, error_message)        
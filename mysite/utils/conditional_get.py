@@ -0,0 +1,55 @@
+import hashlib
+import json
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """
+    Build a strong ETag from the values that identify one representation of a resource.
+
+    Args:
+        *parts: The values the response body depends on, e.g. a catalog version and the page parameters.
+
+    Returns:
+        str: A quoted ETag.
+    """
+    raw = json.dumps(parts, default=str, separators=(',', ':'))
+    return '"%s"' % hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def set_validators(response, etag, last_modified=None):
+    """
+    Set the ETag and Last-Modified headers of a response.
+
+    Args:
+        response (HttpResponse): The response to update.
+        etag (str): The ETag of the response body, or None to only send Last-Modified.
+        last_modified (datetime, optional): When the resource last changed.
+    """
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def not_modified_response(request, etag, last_modified=None):
+    """
+    Check the conditional headers of a GET request against the current validators of the resource.
+
+    Args:
+        request (HttpRequest): The request carrying If-None-Match / If-Modified-Since headers.
+        etag (str): The current ETag of the resource, or None if only its last modification is known.
+        last_modified (datetime, optional): When the resource last changed.
+
+    Returns:
+        HttpResponse or None: A 304 (or 412) response when the client's copy can be reused,
+                              otherwise None and the full response has to be built.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
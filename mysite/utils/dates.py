@@ -0,0 +1,31 @@
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def parse_date_filter(value, name, end_of_day=False):
+    """
+    Parse a date filter sent by a client, a date (YYYY-MM-DD) or an ISO datetime.
+
+    Args:
+        value (str): The value sent by the client.
+        name (str): The name of the parameter, used in the error message.
+        end_of_day (bool, optional): If True a plain date stands for the last instant of that day,
+                                     so an inclusive upper bound covers the whole day.
+
+    Returns:
+        datetime: An aware datetime, naive values are taken as UTC.
+
+    Raises:
+        ValueError: If the value is neither a date nor a datetime.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"{name} must be a date (YYYY-MM-DD) or an ISO datetime.")
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
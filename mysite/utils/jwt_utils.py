@@ -17,19 +17,23 @@ def generate_jwt_token(user_id):
     except Exception as e:
         return (False, f"Token generation failed: {e}")'''
 
-def verify_jwt_token(token):
+def verify_jwt_claims(token):
     try:
         # Decode the JWT token to get the claims
         claims = jwt_decode_handler(token) #extracted decoded payload 
 
-        # Extract the user_id from the claims
-        user_id = claims.get('user_id') #extracted user id from payload 
-
         # Ensure user_id is an integer
-        if isinstance(user_id, int):
-            return (True, user_id)
+        if isinstance(claims.get('user_id'), int):
+            return (True, claims)
         else:
             return (False, "Invalid user ID in the token.")
 
     except Exception as e:
-        return (False, f"Token verification failed: {e}")
\ No newline at end of file
+        return (False, f"Token verification failed: {e}")
+
+def verify_jwt_token(token):
+    # Verify the token and extract the user_id from the claims
+    token_info = verify_jwt_claims(token)
+    if token_info[0]:
+        return (True, token_info[1]['user_id'])
+    return token_info
\ No newline at end of file
@@ -0,0 +1,97 @@
+import base64
+import json
+
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(values):
+    """
+    Encode the keyset position of the last row of a page into an opaque cursor token.
+
+    Args:
+        values (dict): The ordering column values of the last row returned. Datetimes are stored
+                       in ISO format and can be restored with 'cursor_datetime'.
+
+    Returns:
+        str: A URL safe token the client sends back to fetch the next page.
+    """
+    payload = {
+        key: value.isoformat() if hasattr(value, 'isoformat') else value
+        for key, value in values.items()
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor token produced by 'encode_cursor'.
+
+    Args:
+        token (str): The opaque cursor sent by the client.
+
+    Returns:
+        dict: The keyset values stored in the cursor.
+
+    Raises:
+        ValueError: If the token is malformed or has been tampered with.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor.")
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid cursor.")
+    return payload
+
+
+def cursor_datetime(value):
+    """
+    Restore a datetime stored inside a cursor.
+
+    Raises:
+        ValueError: If the value is not an ISO formatted datetime.
+    """
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise ValueError("Invalid cursor.")
+    return parsed
+
+
+def cursor_int(value):
+    """
+    Restore an integer id stored inside a cursor.
+
+    Raises:
+        ValueError: If the value is not an integer.
+    """
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError("Invalid cursor.")
+    return value
+
+
+def get_page_size(requested, default, maximum):
+    """
+    Resolve the page size asked for by a client.
+
+    Args:
+        requested (str or int or None): The page size sent by the client, if any.
+        default (int): The page size used when the client does not send one.
+        maximum (int): The largest page size a client may ask for.
+
+    Returns:
+        int: The page size to use, capped at 'maximum'.
+
+    Raises:
+        ValueError: If the requested page size is not a positive integer.
+    """
+    if requested in (None, ''):
+        return default
+    try:
+        page_size = int(requested)
+    except (TypeError, ValueError):
+        raise ValueError("page_size must be a positive integer.")
+    if page_size <= 0:
+        raise ValueError("page_size must be a positive integer.")
+    return min(page_size, maximum)
@@ -4,9 +4,24 @@ from .models import *
 from .products import *
 from .orders import *
 from .users import *
-from django.http import JsonResponse
+from .search import search_products
+from .exports import get_export_rows
+from .order_history import get_order_history
+from .sales import get_sales_report
+from .checkout_queue import queued_checkout_enabled, checkout_queue, get_checkout_job
+from .idempotency import idempotent
+from .inventory import get_stock_history
+from .autocomplete import get_autocomplete_suggestions
+from .cart_store import persist_cart
+from .catalog_cache import get_catalog_page, catalog_page_response, get_catalog_cache_stats
+from .catalog_cache import catalog_cache_enabled, get_catalog_version, get_catalog_last_modified
+from .utils.conditional_get import make_etag, not_modified_response, set_validators
+from django.utils.cache import patch_vary_headers
+from django.http import JsonResponse, StreamingHttpResponse
 from .utils.jwt_utils import *
+from .authentication import token_required, is_admin, add_role_claims
 from django.views.decorators.csrf import csrf_exempt
+from django.db import DatabaseError
 from django.contrib.auth import authenticate
 import json
 from rest_framework_jwt.settings import api_settings
@@ -17,29 +32,76 @@ from rest_framework import status
 #Shows the list of all the products 
 def grocery_store(request):
     if request.method == 'GET':
-        product_list = get_added_products()  
-        response_data = {
-            "message": "Welcome to the Grocery Store.",
-            "instructions": "You can view our products here.",
-            "products": product_list[1]
-        }
-        return JsonResponse(response_data)
+        # The catalog is returned one page at a time, pass the next_cursor back to get the next page.
+        cursor = request.GET.get('cursor')
+        page_size = request.GET.get('page_size')
+
+        # The validators only depend on the catalog version, so repeat polls are answered with
+        # a 304 without touching the database or the page cache. The version is only trusted
+        # when the catalog cache is shared by all the workers.
+        caching = catalog_cache_enabled()
+        if caching:
+            accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+            etag = make_etag('catalog', get_catalog_version(), cursor, page_size, accepts_gzip)
+            last_modified = get_catalog_last_modified()
+            not_modified = not_modified_response(request, etag, last_modified)
+            if not_modified is not None:
+                patch_vary_headers(not_modified, ('Accept-Encoding',))
+                return not_modified
+
+        def build_response_data():
+            product_list = get_added_products(cursor=cursor, page_size=page_size)
+            if not product_list[0]:
+                return product_list
+
+            response_data = {
+                "message": "Welcome to the Grocery Store.",
+                "instructions": "You can view our products here.",
+                "products": product_list[1]["products"],
+                "next_cursor": product_list[1]["next_cursor"]
+            }
+            return (True, response_data)
+
+        # Pages are served pre-serialized from the catalog cache and only built on a miss.
+        catalog_page = get_catalog_page((cursor, page_size), build_response_data)
+        if not catalog_page[0]:
+            return JsonResponse({"message": catalog_page[1]}, status=400)
+
+        response = catalog_page_response(request, catalog_page[1])
+        if caching:
+            set_validators(response, etag, last_modified)
+        return response
 
 #Detailed view of a particular product.
 def product_view(request, product_id):
     if request.method == 'GET':
 
+        # Any change to a product moves the catalog version, so a client sending back the ETag
+        # of its copy gets a 304 without the product being read from the database. The version is
+        # only trusted when the catalog cache is shared, Last-Modified is always sent.
+        etag = None
+        if catalog_cache_enabled():
+            etag = make_etag('product', product_id, get_catalog_version())
+            not_modified = not_modified_response(request, etag)
+            if not_modified is not None:
+                return not_modified
+
         #calling function view product to view all the details of product.
         product = view_product(product_id)
 
         #if function return True.
-        if product:
+        if product[0]:
+            last_modified = product[1].pop("last_modified")
+            not_modified = not_modified_response(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+
             response_data = {
                 "message": "Product Details",
                 "instructions": "You can view your product details here. Select quantity and click on add to cart to buy.",
                 "product": product[1]
             }
-            return JsonResponse(response_data)
+            return set_validators(JsonResponse(response_data), etag, last_modified)
         else:
             # Handle the case where the product doesn't exist
             return JsonResponse({"message": "Product not found."}, status=404)
@@ -47,108 +109,229 @@ def product_view(request, product_id):
 
 
 #function to view cart of a existing user.
+@token_required
 def view_cart(request):
     if request.method == 'GET':
-        # Extract the token from the request headers
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
+        # The token was verified by token_required, request.grocery_user_id contains the user_id
+        user_id = request.grocery_user_id
+
+        cart_items_for_user = get_cart_items(user_id)  # Function to return cart items
 
-            # Verify the token
-            token_info = verify_jwt_token(token)
-            if token_info[0]:
-                # Token is valid, and token_info[1] contains the user_id
-                user_id = token_info[1]
+        if cart_items_for_user[0] == True:
+            cart = cart_items_for_user[1]
+            response_data = {
+                "message": "Shopping Cart",
+                "instructions": "View the items in your cart.",
+                "order_id": cart["order_id"],
+                "total_amount": cart["total_amount"],
+                "cart_items": cart["items"]
+            }
+            return JsonResponse(response_data, status=200)
+        else:
+            # Handle the case where there are no cart items
+            response_data = {
+                "message": cart_items_for_user[1]
+            }
+            return JsonResponse(response_data, status=200)
 
-                cart_items_for_user = get_cart_items(user_id)  # Function to return cart items
+#Function to view The list of all added products by admins
+@token_required
+def view_added_products(request):
+    if request.method == 'GET':
+        # Check if the user's role matches the admin role
+        if not is_admin(request):
+            return JsonResponse({"message": "You do not have permission for this activity."}, status=403)
 
-                if cart_items_for_user[0] == True:
-                    response_data = {
-                        "message": "Shopping Cart",
-                        "instructions": "View the items in your cart.",
-                        "cart_items": cart_items_for_user[1]
-                    }
-                    return JsonResponse(response_data, status=200)
-                else:
-                    # Handle the case where there are no cart items
-                    response_data = {
-                        "message": cart_items_for_user[1]
-                    }
-                    return JsonResponse(response_data, status=200)
+        cursor = request.GET.get('cursor')
+        page_size = request.GET.get('page_size')
+        added_products = get_added_products(admin=True, cursor=cursor, page_size=page_size)
 
-            else:
-                # Token is invalid
-                response_data = {
-                    "message": token_info[1]
-                }
-                return JsonResponse(response_data, status=401)
+        if added_products[0]:
+            response_data = {
+                "message": "List of added products",
+                "products": added_products[1]["products"],
+                "next_cursor": added_products[1]["next_cursor"]
+            }
+            return JsonResponse(response_data, status=200)
+        else:
+            return JsonResponse({"message": added_products[1]}, status=400)
 
+#Browse the products of a category together with the number of products in every category.
+#Does not require any authentication.
+def browse_products(request):
+    if request.method == 'GET':
+        category = request.GET.get('category')
+        cursor = request.GET.get('cursor')
+        page_size = request.GET.get('page_size')
+
+        product_page = get_products_by_category(category, cursor, page_size)
+        if product_page[0]:
+            response_data = {
+                "message": "Products",
+                "products": product_page[1]["products"],
+                "next_cursor": product_page[1]["next_cursor"],
+                "facets": product_page[1]["facets"]
+            }
+            return JsonResponse(response_data, status=200)
         else:
-            # No token provided in the header
+            return JsonResponse({"message": product_page[1]}, status=400)
+
+#Search the products by name and description. Does not require any authentication.
+def search(request):
+    if request.method == 'GET':
+        query = request.GET.get('q', '')
+        page = request.GET.get('page')
+        page_size = request.GET.get('page_size')
+
+        search_result = search_products(query, page, page_size)
+        if search_result[0]:
             response_data = {
-                "message": "Unauthorized"
+                "message": f"Search results for '{query}'",
+                "results": search_result[1]["results"],
+                "page": search_result[1]["page"],
+                "has_more": search_result[1]["has_more"]
             }
-            return JsonResponse(response_data, status=401)
+            return JsonResponse(response_data, status=200)
+        else:
+            return JsonResponse({"message": search_result[1]}, status=400)
 
-#Function to view The list of all added products by admins
-def view_added_products(request):
+#Suggest product names for a partially typed name. Answered from memory, does not require any authentication.
+def autocomplete(request):
     if request.method == 'GET':
-        # Extract the token from the request headers
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-
-            # Verify the token
-            token_info = verify_jwt_token(token)
-            #if token verification is successful.
-            if token_info[0]:
-                user_id = token_info[1]
-                added_products = get_added_products(user_id)
-
-                if added_products[0]:
-                    response_data = {
-                        "message": "List of added products",
-                        "products": added_products[1]
-                    }
-                    return JsonResponse(response_data, status=200)
-                else:
-                    return JsonResponse({"message": added_products[1]}, status=401)
+        suggestions = get_autocomplete_suggestions(request.GET.get('q'), request.GET.get('limit'))
+        if suggestions[0]:
+            return JsonResponse({"suggestions": suggestions[1]}, status=200)
+        else:
+            return JsonResponse({"message": suggestions[1]}, status=400)
+
+#function to view the order history of the logged in user, newest first.
+@token_required
+def view_orders(request):
+    if request.method == 'GET':
+        order_history = get_order_history(
+            request.grocery_user_id, cursor=request.GET.get('cursor'), page_size=request.GET.get('page_size')
+        )
+
+        if order_history[0]:
+            response_data = {
+                "message": "Your orders",
+                "orders": order_history[1]["orders"],
+                "next_cursor": order_history[1]["next_cursor"]
+            }
+            return JsonResponse(response_data, status=200)
+        else:
+            return JsonResponse({"message": order_history[1]}, status=400)
+    return JsonResponse({"message": "Method not allowed"}, status=405)
+
+#function to view the stock movements of a product from the inventory ledger, for admins only.
+@token_required
+def stock_history(request, product_id):
+    if request.method == 'GET':
+        # Check if the user's role matches the admin role
+        if is_admin(request):
+            history = get_stock_history(
+                product_id, cursor=request.GET.get('cursor'), page_size=request.GET.get('page_size')
+            )
+            if history[0]:
+                response_data = {
+                    "message": f"Stock history of product ID {product_id}",
+                    "stock_count": history[1]["stock_count"],
+                    "movements": history[1]["movements"],
+                    "next_cursor": history[1]["next_cursor"]
+                }
+                return JsonResponse(response_data, status=200)
+            elif history[1] == "Product not found.":
+                return JsonResponse({"message": history[1]}, status=404)
             else:
-                return JsonResponse({"message": token_info[1]}, status=401)
+                return JsonResponse({"message": history[1]}, status=400)
         else:
-            return JsonResponse({"message": "Unauthorized"}, status=401)
+            return JsonResponse({"message": "You do not have permission for this activity."}, status=403)
+    return JsonResponse({"message": "Method not allowed"}, status=405)
 
 #function to view all the orders of a particular product.
+@token_required
 def view_product_orders(request, encoded_product_id):
     #breakpoint()
     if request.method == 'GET':
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
+        # Check if the user's role matches the admin role
+        if not is_admin(request):
+            return JsonResponse({"message": "You do not have permission for this activity."}, status=403)
+
+        # Fetch one page of orders, optionally filtered on the order date and status
+        orders = get_orders_for_product(
+            encoded_product_id,
+            date_from=request.GET.get('from'),
+            date_to=request.GET.get('to'),
+            statuses=request.GET.getlist('status'),
+            cursor=request.GET.get('cursor'),
+            page_size=request.GET.get('page_size')
+        )
+
+        #if there are existing orders for a product
+        if orders[0]:
+            response_data = {
+                "message": f"Orders for product ID {encoded_product_id}",
+                "orders": orders[1]["orders"],
+                "next_cursor": orders[1]["next_cursor"]
+            }
+            return JsonResponse(response_data, status=200)
+        elif orders[1] == "Product not found.":
+            return JsonResponse({"message": orders[1]}, status=404)
+        else:
+            return JsonResponse({"message": str(orders[1])}, status=400)
+          
+            
 
-            # Verify the token
-            token_info = verify_jwt_token(token)
-            if token_info[0]:
-                user_id = token_info[1]
+#function to view the hit and miss counters of the catalog cache, for admins only.
+@token_required
+def catalog_cache_stats(request):
+    if request.method == 'GET':
+        # Check if the user's role matches the admin role
+        if is_admin(request):
+            response_data = {
+                "message": "Catalog cache statistics",
+                "stats": get_catalog_cache_stats()
+            }
+            return JsonResponse(response_data, status=200)
+        else:
+            return JsonResponse({"message": "You do not have permission for this activity."}, status=403)
 
-                # Fetch orders using a function, passing user_id and product_id
-                orders = get_orders_for_product(user_id, encoded_product_id)
+#function to report the sales of a date range by day, product or category, for admins only.
+@token_required
+def sales_report(request, group):
+    if request.method == 'GET':
+        # Check if the user's role matches the admin role
+        if is_admin(request):
+            report = get_sales_report(group, date_from=request.GET.get('from'), date_to=request.GET.get('to'))
+            if report[0]:
+                response_data = {
+                    "message": f"Sales by {group}",
+                    "from": report[1]["from"],
+                    "to": report[1]["to"],
+                    "sales": report[1]["rows"]
+                }
+                return JsonResponse(response_data, status=200)
+            else:
+                return JsonResponse({"message": report[1]}, status=400)
+        else:
+            return JsonResponse({"message": "You do not have permission for this activity."}, status=403)
+    return JsonResponse({"message": "Method not allowed"}, status=405)
 
-                #if there are existing orders for a product
-                if orders[0]:
-                    response_data = {
-                        "message": f"Orders for product ID {encoded_product_id}",
-                        "orders": orders[1]
-                    }
-                    return JsonResponse(response_data, status=200)
-                else:
-                    return JsonResponse({"message": str(orders[1])}, status=401)
+#function to stream products, orders or order items as NDJSON, for admins only.
+@token_required
+def export_data(request, kind):
+    if request.method == 'GET':
+        # Check if the user's role matches the admin role
+        if is_admin(request):
+            export_rows = get_export_rows(kind, request.GET.get('since'))
+            if export_rows[0]:
+                response = StreamingHttpResponse(export_rows[1], content_type='application/x-ndjson')
+                response['Content-Disposition'] = f'attachment; filename="{kind}.ndjson"'
+                return response
             else:
-                return JsonResponse({"message": token_info[1]}, status=401)
+                return JsonResponse({"message": export_rows[1]}, status=400)
         else:
-            return JsonResponse({"message": "Unauthorized"}, status=401)
-          
-            
+            return JsonResponse({"message": "You do not have permission for this activity."}, status=403)
 
 #To handle other requests.
 def custom_404_view(request, exception=None):
@@ -234,7 +417,8 @@ def login(request):
                 jwt_payload_handler = api_settings.JWT_PAYLOAD_HANDLER
                 jwt_encode_handler = api_settings.JWT_ENCODE_HANDLER
 
-                payload = jwt_payload_handler(user)
+                # The role and its version go in the token so admin checks do not need the database
+                payload = add_role_claims(jwt_payload_handler(user), user)
                 print("payload",payload )
                 token = jwt_encode_handler(payload)
                 print("token:",token)
@@ -247,54 +431,45 @@ def login(request):
     return JsonResponse({"message": "Method not allowed"}, status=405)
 
 @csrf_exempt
+@idempotent
+@token_required
 def addtocart(request):
     #breakpoint()
     if request.method == 'POST':
         try:
             # Parse the JSON data from the request body
             user_data = json.loads(request.body.decode('utf-8'))
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-
-                # Verify the token
-                token_info = verify_jwt_token(token)
-                if token_info[0]:
-                    user_id = token_info[1]
+            user_id = request.grocery_user_id
 
-                    # Define the required fields for adding to the cart
-                    required_fields = ["product_id", "qty"]
+            # Define the required fields for adding to the cart
+            required_fields = ["product_id", "qty"]
 
-                    validation_error = validate_required_fields(user_data, required_fields)
+            validation_error = validate_required_fields(user_data, required_fields)
 
-                    if validation_error:
-                        return JsonResponse({"error": validation_error}, status=400)
+            if validation_error:
+                return JsonResponse({"error": validation_error}, status=400)
 
-                    product_id = user_data.get('product_id')
-                    qty = user_data.get('qty')    
+            product_id = user_data.get('product_id')
+            qty = user_data.get('qty')    
 
-                    # Check if the product with the given product_id exists
-                    # Try to fetch the product with the given product_id
-                    try:
-                        product = Product.objects.get(id=product_id)
-                    except Product.DoesNotExist:
-                        return JsonResponse({"message": "Product does not exist"}, status=404)
+            # Check if the product with the given product_id exists
+            # Try to fetch the product with the given product_id
+            try:
+                product = Product.objects.get(id=product_id)
+            except Product.DoesNotExist:
+                return JsonResponse({"message": "Product does not exist"}, status=404)
 
 
-                    order_details = add_or_update_order_item(user_id, product_id, qty)  
+            order_details = add_or_update_order_item(user_id, product_id, qty)  
 
-                    if order_details[0]:
-                        response_data = {
-                            "message": order_details[1]
-                            
-                        }
-                        return JsonResponse(response_data, status=201)
-                    else:
-                        return JsonResponse({"message": order_details[1]}, status=400)
-                else:
-                    return JsonResponse({"message": token_info[1]}, status=401)
+            if order_details[0]:
+                response_data = {
+                    "message": order_details[1]
+                    
+                }
+                return JsonResponse(response_data, status=201)
             else:
-                return JsonResponse({"message": "Unauthorized"}, status=401)
+                return JsonResponse({"message": order_details[1]}, status=400)
 
         except json.JSONDecodeError:
             return JsonResponse({"message": "Invalid JSON data"}, status=400)
@@ -302,67 +477,80 @@ def addtocart(request):
     return JsonResponse({"message": "Method not allowed"}, status=405)              
 
 
+#to add many products to the cart in a single request.
 @csrf_exempt
+@idempotent
+@token_required
+def addtocart_batch(request):
+    if request.method == 'POST':
+        try:
+            # Parse the JSON data from the request body
+            cart_data = json.loads(request.body.decode('utf-8'))
+            if not isinstance(cart_data, dict) or "items" not in cart_data:
+                return JsonResponse({"message": "Missing 'items' field"}, status=400)
+
+            cart_result = add_items_to_cart(request.grocery_user_id, cart_data['items'])
+
+            if cart_result[0]:
+                results = cart_result[1]["results"]
+                added = sum(1 for result in results if result["status"] != "error")
+                response_data = {
+                    "message": f"{added} of {len(results)} item(s) added to the cart.",
+                    "order_id": cart_result[1]["order_id"],
+                    "results": results
+                }
+                return JsonResponse(response_data, status=201 if added else 400)
+            else:
+                return JsonResponse({"message": cart_result[1]}, status=400)
+
+        except json.JSONDecodeError:
+            return JsonResponse({"message": "Invalid JSON data"}, status=400)
+
+    return JsonResponse({"message": "Method not allowed"}, status=405)
+
+
+@csrf_exempt
+@token_required
 def addproduct(request):
     #breakpoint()
     if request.method == 'POST':
         try:
             # Parse the JSON data from the request body
             product_data = json.loads(request.body.decode('utf-8'))
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-
-                # Verify the token
-                token_info = verify_jwt_token(token)
-                if token_info[0]:
-                    user_id_from_token = token_info[1]
-                    # Define the required fields for adding a product
-                    required_fields = ["name", "description", "price", "stock_count", "category_ids"]
-
-                    validation_error = validate_required_fields(product_data, required_fields)
-
-                    if validation_error:
-                        return JsonResponse({"error": validation_error}, status=400)
-
-                # Fetch the user
-                    #try:
-                    user = User.objects.get(id=user_id_from_token)
-
-                    # Fetch the role of the user
-                    user_role = user.role  
-
-                    # Fetch the role ID of the admin (You may need to adjust this query)
-                    admin_role_id = Role.objects.get(name='admin').id 
-
-                    # Check if the user's role matches the admin role
-                    if user_role.id == admin_role_id: 
-                        name = product_data.get('name')
-                        description = product_data.get('description')        
-                        price = product_data.get('price')
-                        stock_count = product_data.get('stock_count')     
-                        category_ids = product_data.get('category_ids')
-
-                        product_create_result= create_product(user_id_from_token, name, description, price, stock_count, category_ids)         
-                        if product_create_result[0]:
-                            response_data = {
-                                "message": product_create_result[1]
-                                
-                            }
-                            return JsonResponse(response_data, status=201)
-                        else:
-                            return JsonResponse({"message": product_create_result[1]}, status=400)
-                    #when users role id is not same as admin's role id.        
-                    else:
-                        # User does not have permission to update this product
-                        response_data = {
-                            "message": "You are not authorized to add product."
-                        }
-                        return JsonResponse(response_data, status=403)
+            user_id_from_token = request.grocery_user_id
+
+            # Define the required fields for adding a product
+            required_fields = ["name", "description", "price", "stock_count", "category_ids"]
+
+            validation_error = validate_required_fields(product_data, required_fields)
+
+            if validation_error:
+                return JsonResponse({"error": validation_error}, status=400)
+
+            # Check if the user's role matches the admin role, the user and its role are loaded once for the request
+            if is_admin(request):
+                name = product_data.get('name')
+                description = product_data.get('description')        
+                price = product_data.get('price')
+                stock_count = product_data.get('stock_count')     
+                category_ids = product_data.get('category_ids')
+
+                product_create_result= create_product(user_id_from_token, name, description, price, stock_count, category_ids)         
+                if product_create_result[0]:
+                    response_data = {
+                        "message": product_create_result[1]
+                        
+                    }
+                    return JsonResponse(response_data, status=201)
                 else:
-                    return JsonResponse({"message": token_info[1]}, status=401)
+                    return JsonResponse({"message": product_create_result[1]}, status=400)
+            #when users role id is not same as admin's role id.        
             else:
-                return JsonResponse({"message": "Unauthorized"}, status=401)
+                # User does not have permission to update this product
+                response_data = {
+                    "message": "You are not authorized to add product."
+                }
+                return JsonResponse(response_data, status=403)
 
         except json.JSONDecodeError:
             return JsonResponse({"message": "Invalid JSON data"}, status=400)
@@ -371,45 +559,37 @@ def addproduct(request):
 
 
 @csrf_exempt
+@token_required
 def add_address(request):
     if request.method == 'POST':
         try:
             # Decompose the request data
             
             address_data = json.loads(request.body.decode('utf-8'))
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-
-                # Verify the token
-                token_info = verify_jwt_token(token)
-                if token_info[0]:
-                    user_id = token_info[1]
-                    #to verify if all the fields are present or not.
-                    required_fields = ["country_id", "state_id", "city_id", "pincode", "address", "isdefault"]
-
-                    validation_error = validate_required_fields(address_data, required_fields)
-
-                    if validation_error:
-                        return JsonResponse({"error": validation_error}, status=400)                    
-                    country_id = address_data.get('country_id')
-                    state_id = address_data.get('state_id')
-                    city_id = address_data.get('city_id')
-                    pincode = address_data.get('pincode')
-                    address = address_data.get('address')
-                    isdefault = address_data.get('isdefault')
-
-                    # Call a function to create an address entry for the user
-                    address_details = create_address(user_id, country_id, state_id, city_id, pincode, address, isdefault)
-
-                    if address_details[0]:
-                        return JsonResponse({"message": address_details[1]}, status=201)
-                    else:
-                        return JsonResponse({"message": address_details[1]}, status=400)
-                else:
-                    return JsonResponse({"message": token_info[1]}, status=401)
+            user_id = request.grocery_user_id
+            #to verify if all the fields are present or not, isdefault may be false.
+            required_fields = ["country_id", "state_id", "city_id", "pincode", "address"]
+
+            validation_error = validate_required_fields(address_data, required_fields)
+            if not validation_error and "isdefault" not in address_data:
+                validation_error = "Missing required field(s): isdefault"
+
+            if validation_error:
+                return JsonResponse({"error": validation_error}, status=400)                    
+            country_id = address_data.get('country_id')
+            state_id = address_data.get('state_id')
+            city_id = address_data.get('city_id')
+            pincode = address_data.get('pincode')
+            address = address_data.get('address')
+            isdefault = address_data.get('isdefault')
+
+            # Call a function to create an address entry for the user
+            address_details = create_address(user_id, country_id, state_id, city_id, pincode, address, isdefault)
+
+            if address_details[0]:
+                return JsonResponse({"message": address_details[1]}, status=201)
             else:
-                return JsonResponse({"message": "Unauthorized"}, status=401)
+                return JsonResponse({"message": address_details[1]}, status=400)
 
         except json.JSONDecodeError:
             return JsonResponse({"message": "Invalid JSON data"}, status=400)
@@ -419,6 +599,7 @@ def add_address(request):
 
 
 @csrf_exempt
+@token_required
 def update_user_info(request):
     #breakpoint()
     if request.method == 'PUT':
@@ -426,59 +607,48 @@ def update_user_info(request):
             # Decompose the request data
             user_data = json.loads(request.body.decode('utf-8'))
 
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-
-                # Verify the token
-                token_info = verify_jwt_token(token)
-                if token_info[0]:
-                    user_id = token_info[1]
+            user_id = request.grocery_user_id
 
-                    # Define the allowed fields
-                    allowed_fields = ['first_name', 'middle_name', 'last_name', 'phone_no', 'password', 'role_id', 'email']
+            # Define the allowed fields
+            allowed_fields = ['first_name', 'middle_name', 'last_name', 'phone_no', 'password', 'role_id', 'email']
 
-                    # Check if any disallowed fields are present in user_data
-                    disallowed_fields = [field for field in user_data if field not in allowed_fields]
+            # Check if any disallowed fields are present in user_data
+            disallowed_fields = [field for field in user_data if field not in allowed_fields]
 
-                    if disallowed_fields:
-                        # Disallowed fields are present in user_data
-                        # Print a message and return a response indicating that it's an invalid argument
-                        invalid_fields = ", ".join(disallowed_fields)
-                        print(f"Invalid argument(s): {invalid_fields}")
-                        response_data = {'error': f'Invalid argument(s): {invalid_fields}'}
-                        return JsonResponse(response_data, status=400)    
+            if disallowed_fields:
+                # Disallowed fields are present in user_data
+                # Print a message and return a response indicating that it's an invalid argument
+                invalid_fields = ", ".join(disallowed_fields)
+                print(f"Invalid argument(s): {invalid_fields}")
+                response_data = {'error': f'Invalid argument(s): {invalid_fields}'}
+                return JsonResponse(response_data, status=400)    
 
-                    # Either 'email' or 'role_id' is present in user_data
-                    if 'email' in user_data or 'role_id' in user_data:                    
-                        response_data = {'error': 'Cannot update email or role_id'}
-                        return JsonResponse(response_data, status=400)    
+            # Either 'email' or 'role_id' is present in user_data
+            if 'email' in user_data or 'role_id' in user_data:                    
+                response_data = {'error': 'Cannot update email or role_id'}
+                return JsonResponse(response_data, status=400)    
 
             # Fetch user's old information (You might need to implement this function)
-                    old_user_data = get_user_info(user_id)
-                    
-                    # Creating a dictionary with user's new information for each field (if provided)
-                    update_kwargs = {
-                        "first_name": user_data.get('first_name', old_user_data['first_name']),
-                        "middle_name": user_data.get('middle_name', old_user_data['middle_name']),
-                        "last_name": user_data.get('last_name', old_user_data['last_name']),
-                        #"email": user_data.get('email', old_user_data['email']),
-                        "phone_no": user_data.get('phone_no', old_user_data['phone_no']),
-                        "password": user_data.get('password', old_user_data['password']),
-                        #"role_id": user_data.get('role_id', old_user_data['role_id'])
-                    }
+            old_user_data = get_user_info(user_id)
+            
+            # Creating a dictionary with user's new information for each field (if provided)
+            update_kwargs = {
+                "first_name": user_data.get('first_name', old_user_data['first_name']),
+                "middle_name": user_data.get('middle_name', old_user_data['middle_name']),
+                "last_name": user_data.get('last_name', old_user_data['last_name']),
+                #"email": user_data.get('email', old_user_data['email']),
+                "phone_no": user_data.get('phone_no', old_user_data['phone_no']),
+                "password": user_data.get('password', old_user_data['password']),
+                #"role_id": user_data.get('role_id', old_user_data['role_id'])
+            }
 
-                    # Call a function to update user's info, with user_id and update_kwargs
-                    updated_user_result = update_user(user_id, **update_kwargs)
+            # Call a function to update user's info, with user_id and update_kwargs
+            updated_user_result = update_user(user_id, **update_kwargs)
 
-                    if updated_user_result[0]:
-                        return JsonResponse({"message": updated_user_result[1]}, status=201)
-                    else:
-                        return JsonResponse({"message": updated_user_result[1]}, status=400)
-                else:
-                    return JsonResponse({"message": token_info[1]}, status=401)
+            if updated_user_result[0]:
+                return JsonResponse({"message": updated_user_result[1]}, status=201)
             else:
-                return JsonResponse({"message": "Unauthorized"}, status=401)
+                return JsonResponse({"message": updated_user_result[1]}, status=400)
 
         except json.JSONDecodeError:
             return JsonResponse({"message": "Invalid JSON data"}, status=400)
@@ -486,6 +656,7 @@ def update_user_info(request):
     return JsonResponse({"message": "Method not allowed"}, status=405)      
 
 @csrf_exempt
+@token_required
 def update_user_address(request):
     #breakpoint()
     if request.method == 'PUT':    
@@ -493,70 +664,44 @@ def update_user_address(request):
             # Extract user_id from the authenticated user
             address_data= json.loads(request.body.decode('utf-8'))
 
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-
-                # Verify the token
-                token_info = verify_jwt_token(token)
-                if token_info[0]:
-                    user_id = token_info[1]    
-
-                    # Define the allowed fields
-                    allowed_fields = ['address_id', 'pincode', 'address', 'isdefault', 'city_id', 'state_id', 'country_id']
-
-                    # Check if any disallowed fields are present in user_data
-                    disallowed_fields = [field for field in address_data if field not in allowed_fields]
-
-                    if disallowed_fields:
-                        # Disallowed fields are present in user_data
-                        # Print a message and return a response indicating that it's an invalid argument
-                        invalid_fields = ", ".join(disallowed_fields)
-                        print(f"Invalid argument(s): {invalid_fields}")
-                        response_data = {'error': f'Invalid argument(s): {invalid_fields}'}
-                        return JsonResponse(response_data, status=400)    
-
-
-                    # Either 'email' or 'role_id' is present in user_data
-                    if 'state_id' in address_data or 'city_id' in address_data or 'country_id' in address_data:                    
-                        response_data = {'error': 'Cannot update country, state or city'}
-                        return JsonResponse(response_data, status=400) 
-
-
-                # Fetch address_id from the request data
-                    address_id = address_data.get('address_id')                  
-
-                    # Fetch the initial info of the address (you can replace this with your own logic)
-                    old_address_data_tuple = get_address_info(address_id)
-                    if old_address_data_tuple[0]==True:
-                        old_address_data = old_address_data_tuple[1]
-                        if old_address_data['user_id'] == user_id:
-                            # Create a dictionary with the updated info for each column (if provided)
-                            update_kwargs = {
-                                #"country_id": address_data.get('country_id', old_address_data.get('country_id')),
-                                #"state_id": address_data.get('state_id', old_address_data.get('state_id')),
-                                #"city_id": address_data.get('city_id', old_address_data.get('city_id')),
-                                "pincode": address_data.get('pincode', old_address_data.get('pincode')),
-                                "address": address_data.get('address', old_address_data.get('address')),
-                                "isdefault": address_data.get('isdefault', old_address_data.get('isdefault'))
-                            }
-
-                            # Call a function to update the address info
-                            updated_address_result = update_address(user_id, address_id, **update_kwargs)
-
-                            if updated_address_result[0]:
-                                return JsonResponse({"message": updated_address_result[1]}, status=status.HTTP_201_CREATED)
-                            else:
-                                return JsonResponse({"message": updated_address_result[1]}, status=status.HTTP_400_BAD_REQUEST)
-                        else:
-                            return JsonResponse({"message": "You are not authorized to update this address."}, status=status.HTTP_400_BAD_REQUEST)
+            user_id = request.grocery_user_id
 
-                    else:
-                        return JsonResponse({"message": "Address does not exists."}, status=status.HTTP_400_BAD_REQUEST )  
-                else:
-                    return JsonResponse({"message": token_info[1]}, status=401)
+            # Define the allowed fields
+            allowed_fields = ['address_id', 'pincode', 'address', 'isdefault', 'city_id', 'state_id', 'country_id']
+
+            # Check if any disallowed fields are present in user_data
+            disallowed_fields = [field for field in address_data if field not in allowed_fields]
+
+            if disallowed_fields:
+                # Disallowed fields are present in user_data
+                # Print a message and return a response indicating that it's an invalid argument
+                invalid_fields = ", ".join(disallowed_fields)
+                print(f"Invalid argument(s): {invalid_fields}")
+                response_data = {'error': f'Invalid argument(s): {invalid_fields}'}
+                return JsonResponse(response_data, status=400)    
+
+
+            # Either 'email' or 'role_id' is present in user_data
+            if 'state_id' in address_data or 'city_id' in address_data or 'country_id' in address_data:                    
+                response_data = {'error': 'Cannot update country, state or city'}
+                return JsonResponse(response_data, status=400) 
+
+
+            # Fetch address_id from the request data
+            address_id = address_data.get('address_id')                  
+
+            # Only the fields sent are updated, update_address checks the address belongs to the user
+            update_kwargs = {
+                field: address_data[field] for field in ('pincode', 'address', 'isdefault') if field in address_data
+            }
+
+            # Call a function to update the address info
+            updated_address_result = update_address(user_id, address_id, **update_kwargs)
+
+            if updated_address_result[0]:
+                return JsonResponse({"message": updated_address_result[1]}, status=status.HTTP_201_CREATED)
             else:
-                return JsonResponse({"message": "Unauthorized"}, status=401)
+                return JsonResponse({"message": updated_address_result[1]}, status=status.HTTP_400_BAD_REQUEST)
 
         except json.JSONDecodeError:
             return JsonResponse({"message": "Invalid JSON data"}, status=400)
@@ -565,57 +710,72 @@ def update_user_address(request):
 
 
 @csrf_exempt
+@idempotent
+@token_required
 def update_order(request):
     #breakpoint()
     if request.method == 'PUT':
         try:
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-
-                token_info = verify_jwt_token(token)  # Implement this function to verify the token
-                if token_info[0]:
-                    user_id_from_token = token_info[1]
-                    print("token wala blok")
-
-                    # Fetch the most recent order for the user
-                    try:
-                        order = Order.objects.filter(user_id=user_id_from_token, status__in=['In Cart', 'Placed']).latest('id')
-                        order_id_from_token = order.id
-                        #fecth the data in request body
-                        order_data = json.loads(request.body.decode('utf-8'))
-                        #print("oder id", order_id_from_token)
-
-                        # Ensure that the "status" field is present
-                        if "status" not in order_data:
-                            return JsonResponse({"message": "Missing 'status' field"}, status=400)
-
-                        # Rest of your logic here...
-                        # Decompose the request data for status, address_id, and use_default_address
-                        #order_data = json.loads(request.body.decode('utf-8'))
-                        status = order_data['status']
-                        address_id = order_data.get('address_id', None)
-                        use_default_address = order_data.get('use_default_address', False)
-
-                        # Calling function to update your order status to place order or cancel order
-                        updated_order_result = update_orders(order_id_from_token, status, address_id, use_default_address)
-                        print("updte orders",updated_order_result )
-
-                        if updated_order_result[0]:
-                            print("print wala block")
-                            return JsonResponse({"message": updated_order_result[1]}, status=201)
-                        else:
-                            print("else wala block")
-                            return JsonResponse({"message": updated_order_result[1]}, status=400)
-
-                    except Order.DoesNotExist:
-                        return JsonResponse({"message": "No Order found."}, status=404)
+            user_id_from_token = request.grocery_user_id
+            print("token wala blok")
+
+            # Write a cart kept in the cache store to the database before it is checked out.
+            try:
+                persist_cart(user_id_from_token)
+            except DatabaseError:
+                return JsonResponse({"message": "Your cart could not be saved, please check its quantities and try again."}, status=400)
+
+            # Fetch the order picked from the order history, or the most recent order for the user
+            try:
+                #fecth the data in request body
+                order_data = json.loads(request.body.decode('utf-8'))
+                open_orders = Order.objects.filter(user_id=user_id_from_token, status__in=['In Cart', 'Placed'])
+                if order_data.get('order_id') is not None:
+                    order = open_orders.get(id=order_data['order_id'])
+                else:
+                    order = open_orders.latest('id')
+                order_id_from_token = order.id
+                #print("oder id", order_id_from_token)
+
+                # Ensure that the "status" field is present
+                if "status" not in order_data:
+                    return JsonResponse({"message": "Missing 'status' field"}, status=400)
+
+                # Rest of your logic here...
+                # Decompose the request data for status, address_id, and use_default_address
+                #order_data = json.loads(request.body.decode('utf-8'))
+                status = order_data['status']
+                address_id = order_data.get('address_id', None)
+                use_default_address = order_data.get('use_default_address', False)
+
+                # In queued checkout mode the order is placed by a checkout worker and the client polls the job.
+                if status == "place order" and queued_checkout_enabled():
+                    queued_job = checkout_queue.submit(user_id_from_token, order_id_from_token, address_id, use_default_address)
+                    if queued_job[0]:
+                        response_data = {
+                            "message": "Your order is being placed.",
+                            "job_id": queued_job[1]["id"],
+                            "status": queued_job[1]["status"]
+                        }
+                        return JsonResponse(response_data, status=202)
+                    else:
+                        response = JsonResponse({"message": queued_job[1]}, status=503)
+                        response['Retry-After'] = '5'
+                        return response
+
+                # Calling function to update your order status to place order or cancel order
+                updated_order_result = update_orders(order_id_from_token, status, address_id, use_default_address)
+                print("updte orders",updated_order_result )
 
+                if updated_order_result[0]:
+                    print("print wala block")
+                    return JsonResponse({"message": updated_order_result[1]}, status=201)
                 else:
-                    return JsonResponse({"message": token_info[1]}, status=401)
+                    print("else wala block")
+                    return JsonResponse({"message": updated_order_result[1]}, status=400)
 
-            else:
-                return JsonResponse({"message": "Unauthorized"}, status=401)
+            except Order.DoesNotExist:
+                return JsonResponse({"message": "No Order found."}, status=404)
 
         except json.JSONDecodeError:
             return JsonResponse({"message": "Invalid JSON data"}, status=400)
@@ -624,8 +784,29 @@ def update_order(request):
     # Handle other HTTP methods if needed
     return JsonResponse({"message": "Method not allowed"}, status=405)
 
+#function to poll the result of a queued order placement, '?wait=<seconds>' waits for it to finish.
+@token_required
+def checkout_job_status(request, job_id):
+    if request.method == 'GET':
+        checkout_job = get_checkout_job(request.grocery_user_id, job_id, request.GET.get('wait'))
+
+        if checkout_job[0]:
+            response_data = {
+                "job_id": job_id,
+                "order_id": checkout_job[1]["order_id"],
+                "status": checkout_job[1]["status"],
+                "message": checkout_job[1]["message"]
+            }
+            return JsonResponse(response_data, status=200)
+        elif checkout_job[1] == "Checkout job not found.":
+            return JsonResponse({"message": checkout_job[1]}, status=404)
+        else:
+            return JsonResponse({"message": checkout_job[1]}, status=400)
+    return JsonResponse({"message": "Method not allowed"}, status=405)
+
 #to update info of a product.
 @csrf_exempt
+@token_required
 def update_product(request):
     #breakpoint()
     if request.method == 'PUT':    
@@ -633,92 +814,121 @@ def update_product(request):
             # Extract user_id from the authenticated user
             product_data= json.loads(request.body.decode('utf-8'))
 
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-
-                # Verify the token
-                token_info = verify_jwt_token(token)
-                if token_info[0]:
-                    user_id_from_token = token_info[1] 
-                # Fetch the user
-                    #try:
-                    user = User.objects.get(id=user_id_from_token)
-
-                    # Fetch the role of the user
-                    user_role = user.role  
-
-                    # Fetch the role ID of the admin (You may need to adjust this query)
-                    admin_role_id = Role.objects.get(name='admin').id 
-
-                    # Check if the user's role matches the admin role
-                    if user_role.id == admin_role_id: 
-                        #check if request has product id field or not.
-                        if "product_id" not in product_data:
-                            return JsonResponse({"message": "Missing 'product_id' field"}, status=400)    
-
-                     # Fetch initial product data
-                        product_id = product_data.get('product_id')                  
-                        old_product_data_tuple = get_product_info(product_id)
-                        print("old product data ", old_product_data_tuple)
-
-                        #if product found in the database
-                        if old_product_data_tuple[0]==True:
-                            old_product_data = old_product_data_tuple[1]
-
-                            #extract the list of categories of the product.
-                            category_ids = Productcategory.objects.filter(product_id =product_id).values_list('category_id', flat=True)
-                            old_product_data['category_ids'] = list(category_ids)
-                            
-                            print("category ids:",list(category_ids) )
-                            print("category ids without list", category_ids)
-                            print("category new wali", product_data['category_ids'])
-
-                            # Create a dictionary with the updated info for each column 
-                            update_kwargs = {
-                                "description": product_data.get('description', old_product_data.get('description')),
-                                "price": product_data.get('price', old_product_data.get('price')),
-                                "stock_count": product_data.get('stock_count', old_product_data.get('stock_count')),
-                                "category_ids": product_data.get('category_ids', old_product_data.get('category_ids'))
-                                
-                            }
-                            print("update_kwards:", update_kwargs)
-
-                            # Call a function to update the address info
-                            updated_product_result = update_products_info(user_id_from_token, product_id, **update_kwargs)
-                            print("result:", updated_product_result)
-
-                            if updated_product_result[0]:
-                                return JsonResponse({"message": updated_product_result[1]}, status=status.HTTP_201_CREATED)
-                            else:
-                                return JsonResponse({"message": updated_product_result[1]}, status=status.HTTP_400_BAD_REQUEST)
-
-                        else:
-                            return JsonResponse({"message": old_product_data_tuple[1]}, status=status.HTTP_400_BAD_REQUEST )  
-
-                    #when users role id is not same as admin's role id.        
-                    else:
-                        # User does not have permission to update this product
-                        response_data = {
-                            "message": "You are not authorized to update this product."
-                        }
-                        return JsonResponse(response_data, status=403)
+            user_id_from_token = request.grocery_user_id
+            # Check if the user's role matches the admin role, the user and its role are loaded once for the request
+            if is_admin(request):
+                #check if request has product id field or not.
+                if "product_id" not in product_data:
+                    return JsonResponse({"message": "Missing 'product_id' field"}, status=400)    
+
+                # Fetch initial product data
+                product_id = product_data.get('product_id')                  
+                old_product_data_tuple = get_product_info(product_id)
+                print("old product data ", old_product_data_tuple)
+
+                #if product found in the database
+                if old_product_data_tuple[0]==True:
+                    old_product_data = old_product_data_tuple[1]
+
+                    #extract the list of categories of the product.
+                    category_ids = Productcategory.objects.filter(product_id =product_id, datedeleted__isnull=True).values_list('category_id', flat=True)
+                    old_product_data['category_ids'] = list(category_ids)
+                    
+                    print("category ids:",list(category_ids) )
+                    print("category ids without list", category_ids)
+                    print("category new wali", product_data['category_ids'])
+
+                    # Create a dictionary with the updated info for each column 
+                    update_kwargs = {
+                        "description": product_data.get('description', old_product_data.get('description')),
+                        "price": product_data.get('price', old_product_data.get('price')),
+                        "category_ids": product_data.get('category_ids', old_product_data.get('category_ids'))
+                        
+                    }
+                    # The stock is only set when asked for, writing back the count read above would undo concurrent sales.
+                    if 'stock_count' in product_data:
+                        update_kwargs["stock_count"] = product_data['stock_count']
+                    print("update_kwards:", update_kwargs)
 
-                    #except User.DoesNotExist:
-                        #return JsonResponse({"message": "No User found."}, status=status.HTTP_404_NOT_FOUND)                            
+                    # Call a function to update the address info
+                    updated_product_result = update_products_info(user_id_from_token, product_id, **update_kwargs)
+                    print("result:", updated_product_result)
 
+                    if updated_product_result[0]:
+                        return JsonResponse({"message": updated_product_result[1]}, status=status.HTTP_201_CREATED)
+                    else:
+                        return JsonResponse({"message": updated_product_result[1]}, status=status.HTTP_400_BAD_REQUEST)
 
-                #when token verification fails.           
                 else:
-                    return JsonResponse({"message": token_info[1]}, status=401)
+                    return JsonResponse({"message": old_product_data_tuple[1]}, status=status.HTTP_400_BAD_REQUEST )  
+
+            #when users role id is not same as admin's role id.        
             else:
-                return JsonResponse({"message": "Unauthorized"}, status=401)
+                # User does not have permission to update this product
+                response_data = {
+                    "message": "You are not authorized to update this product."
+                }
+                return JsonResponse(response_data, status=403)
+
+            #except User.DoesNotExist:
+                #return JsonResponse({"message": "No User found."}, status=status.HTTP_404_NOT_FOUND)                            
 
         except json.JSONDecodeError:
             return JsonResponse({"message": "Invalid JSON data"}, status=400)
 
     return JsonResponse({"message": "Method not allowed"}, status=405)      
 
+#to update the price and stock count of many products at once.
+@csrf_exempt
+@token_required
+def bulk_update_product(request):
+    if request.method == 'PUT':
+        try:
+            product_data = json.loads(request.body.decode('utf-8'))
+
+            # Check if the user's role matches the admin role
+            if not is_admin(request):
+                return JsonResponse({"message": "You do not have permission to update a product."}, status=403)
+
+            if not isinstance(product_data, dict) or "products" not in product_data:
+                return JsonResponse({"message": "Missing 'products' field"}, status=400)
+
+            updated_products_result = bulk_update_products(request.grocery_user_id, product_data['products'])
+
+            if updated_products_result[0]:
+                results = updated_products_result[1]
+                response_data = {
+                    "message": "Products updated.",
+                    "updated": sum(1 for result in results if result["status"] == "updated"),
+                    "results": results
+                }
+                return JsonResponse(response_data, status=200)
+            else:
+                return JsonResponse({"message": updated_products_result[1]}, status=400)
+
+        except json.JSONDecodeError:
+            return JsonResponse({"message": "Invalid JSON data"}, status=400)
+
+    return JsonResponse({"message": "Method not allowed"}, status=405)
+
+#to soft delete a product.
+@csrf_exempt
+@token_required
+def remove_product(request, product_id):
+    if request.method == 'DELETE':
+        # Check if the user's role matches the admin role
+        if not is_admin(request):
+            return JsonResponse({"message": "You do not have permission to delete a product."}, status=403)
+
+        deleted_product_result = delete_product(request.grocery_user_id, product_id)
+
+        if deleted_product_result[0]:
+            return JsonResponse({"message": deleted_product_result[1]}, status=200)
+        else:
+            return JsonResponse({"message": deleted_product_result[1]}, status=400)
+
+    return JsonResponse({"message": "Method not allowed"}, status=405)
+
 ####helper 
 def check_allowed_fields(data, allowed_fields):
     # Check if any disallowed fields are present in data